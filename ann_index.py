@@ -0,0 +1,656 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def normalize_rows(vectors):
+    """L2 正規化每一列，讓內積等於 cosine 相似度"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# 向量的儲存格式：float32（原始）、float16（一半空間）、int8（四分之一空間，每列另存一個 scale）
+VECTOR_STORAGES = {'float32': np.float32, 'float16': np.float16, 'int8': np.int8}
+
+
+def quantize_rows(vectors, storage):
+    """
+    將正規化後的向量轉成儲存格式
+
+    Returns:
+        tuple: (data, scales)；只有 int8 有 scales（每列的縮放係數），其餘為 None
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if storage == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.empty(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        data = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return data, scales.astype(np.float32)
+    return vectors.astype(VECTOR_STORAGES[storage]), None
+
+
+class MappedMatrix:
+    """
+    唯讀的壓縮向量矩陣（通常是 memory map），多個程序可共用同一份分頁快取
+
+    以切片或索引取列時，只把取出的列轉回 float32；分塊計算相似度時不會複製整個矩陣。
+    """
+
+    def __init__(self, data, scales=None):
+        self.data = data
+        self.scales = scales
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __getitem__(self, key):
+        rows = np.asarray(self.data[key], dtype=np.float32)
+        if self.scales is not None:
+            rows *= np.asarray(self.scales[key], dtype=np.float32)[..., None]
+        return rows
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self[:]
+        return rows if dtype is None else rows.astype(dtype, copy=False)
+
+    def dot(self, query, block_size=65536):
+        """
+        整個矩陣與查詢向量的內積，逐塊轉換，暫存記憶體只有 block_size 列
+
+        Args:
+            query (np.ndarray): (dim,) 或 (dim x k)
+
+        Returns:
+            np.ndarray: (N,) 或 (N x k)
+        """
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty((len(self),) + query.shape[1:], dtype=np.float32)
+        for start in range(0, len(self), block_size):
+            scores[start:start + block_size] = self[start:start + block_size] @ query
+        return scores
+
+
+# numpy 2.0 以前沒有 bitwise_count，改以查表計算每個位元組的 1 的個數
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def pack_sign_bits(vectors):
+    """
+    將向量每一維的正負號壓成位元，每 64 維一個 uint64
+
+    Args:
+        vectors (np.ndarray): (N x dim) 向量
+
+    Returns:
+        np.ndarray: (N x ceil(dim / 64)) 的 uint64
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    packed = np.packbits(vectors > 0, axis=1, bitorder='little')
+    pad = (-packed.shape[1]) % 8
+    if pad:
+        packed = np.pad(packed, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def hamming_distances(query_code, codes):
+    """
+    查詢碼與每一列的 Hamming 距離（不同正負號的維度數）
+
+    Args:
+        query_code (np.ndarray): (words,) 的 uint64
+        codes (np.ndarray): (N x words) 的 uint64
+
+    Returns:
+        np.ndarray: (N,) 的距離
+    """
+    diff = np.bitwise_xor(codes, query_code)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT_TABLE[np.ascontiguousarray(diff).view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+def _spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0, block_size=8192):
+    """
+    在單位球面上做 k-means（以內積作為相似度），回傳正規化的中心點
+
+    Args:
+        vectors (np.ndarray): 已正規化的向量 (N x dim)
+        n_clusters (int): 中心點數量
+        n_iter (int): 迭代次數
+        seed (int): 亂數種子
+        block_size (int): 分塊計算指派，避免 N x n_clusters 的矩陣過大
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _assign(vectors, centroids, block_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=n_clusters)
+        # 空的群集重新隨機挑一個點，避免中心點消失
+        empty = np.where(counts == 0)[0]
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def _assign(vectors, centroids, block_size=8192):
+    """將每個向量指派到內積最大的中心點"""
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        assign[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+class IVFIndex:
+    """
+    純 CPU 的 IVF（倒排檔）近似最近鄰索引
+
+    - 向量數量少於 min_train_size 時直接做精確搜尋
+    - 達到門檻後以 k-means 建立 nlist 個群集，搜尋時只掃描最接近的 nprobe 個群集，
+      掃描量約為 N * nprobe / nlist，不隨目錄線性成長
+    - 新增向量時直接指派到最近的群集；資料量比上次訓練成長 retrain_factor 倍時重新訓練
+
+    向量需事先正規化，分數即為 cosine 相似度。向量以 storage 指定的格式（float32 / float16 / int8）保存，
+    另存成 .npy 檔並以唯讀 memory map 載入，多個 worker 共用同一份分頁快取；
+    相似度逐塊計算，不會把整個目錄轉回 float32。
+
+    另外保存每個向量的正負號位元碼（每 64 維一個 uint64）。binary_shortlist > 0 時，
+    先以 Hamming 距離從候選中挑出 binary_shortlist 筆，再只對這些向量計算精確的 cosine。
+    """
+
+    def __init__(self, path=None, nprobe=8, min_train_size=1024, retrain_factor=4, storage='float32',
+                 binary_shortlist=0):
+        """
+        Args:
+            path (str): 索引檔案路徑（.npz），None 表示只存在記憶體
+            nprobe (int): 搜尋時掃描的群集數
+            min_train_size (int): 開始建立群集所需的最少向量數
+            retrain_factor (int): 資料量成長幾倍後重新訓練群集
+            storage (str): 向量儲存格式（float32 / float16 / int8）
+            binary_shortlist (int): 位元碼預篩後保留幾筆做精確計算，0 表示不預篩
+        """
+        if storage not in VECTOR_STORAGES:
+            raise ValueError(f"未知的向量儲存格式: {storage}（可用: {', '.join(VECTOR_STORAGES)}）")
+        self.path = path
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+        self.storage = storage
+        self.binary_shortlist = binary_shortlist
+        self.model_id = None
+        self._lock = threading.Lock()
+        self._clear()
+
+        if path and os.path.exists(path):
+            self._load()
+
+    def _clear(self):
+        self._vectors = np.empty((0, 0), dtype=VECTOR_STORAGES[self.storage])
+        self._scales = np.empty(0, dtype=np.float32)
+        self._codes = np.empty((0, 0), dtype=np.uint64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self._id_set = set()
+        self._centroids = None
+        self._assign = np.empty(0, dtype=np.int64)
+        self._trained_size = 0
+        self._members = None  # 群集 -> 向量列號，搜尋時才建立
+
+    def __len__(self):
+        return self._size
+
+    def _vector_paths(self):
+        return self.path + '.vectors.npy', self.path + '.scales.npy', self.path + '.codes.npy'
+
+    def _matrix(self):
+        """目前的向量（不複製），取列時才轉回 float32"""
+        scales = self._scales[:self._size] if self.storage == 'int8' else None
+        return MappedMatrix(self._vectors[:self._size], scales)
+
+    def _load(self):
+        data = np.load(self.path, allow_pickle=False)
+        self._ids = data['ids']
+        self._size = len(self._ids)
+        self._id_set = set(self._ids.tolist())
+        self._assign = data['assign']
+        self._centroids = data['centroids'] if len(data['centroids']) else None
+        self._trained_size = int(data['trained_size'])
+        self.model_id = str(data['model_id']) or None
+
+        if 'vectors' in data.files:
+            # 舊版索引把 float32 向量存在 npz 中
+            stored = 'float32'
+            vectors, scales = data['vectors'], None
+        else:
+            stored = str(data['storage'])
+            vec_path, scale_path, _ = self._vector_paths()
+            vectors = np.load(vec_path, mmap_mode='r')
+            scales = np.load(scale_path, mmap_mode='r') if stored == 'int8' else None
+
+        codes_path = self._vector_paths()[2]
+        if os.path.exists(codes_path):
+            self._codes = np.load(codes_path, mmap_mode='r')
+        else:
+            # 舊版索引沒有位元碼，逐塊計算
+            matrix = MappedMatrix(vectors, scales)
+            self._codes = np.concatenate(
+                [pack_sign_bits(matrix[start:start + 65536]) for start in range(0, len(matrix), 65536)]
+            ) if len(matrix) else np.empty((0, 0), dtype=np.uint64)
+
+        if stored != self.storage:
+            print(f"ANN 索引的向量格式由 {stored} 轉換為 {self.storage}")
+            vectors, scales = quantize_rows(MappedMatrix(vectors, scales)[:], self.storage)
+        self._vectors = vectors
+        self._scales = scales if scales is not None else np.empty(0, dtype=np.float32)
+
+    def save(self):
+        """將索引寫入磁碟（先寫暫存檔再取代，避免中斷時留下損毀檔案）"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp.npz'
+        vec_path, scale_path, codes_path = self._vector_paths()
+        with self._lock:
+            # 向量另存成 .npy，載入時可以 memory map
+            np.save(vec_path + '.tmp.npy', self._vectors[:self._size])
+            os.replace(vec_path + '.tmp.npy', vec_path)
+            np.save(codes_path + '.tmp.npy', self._codes[:self._size])
+            os.replace(codes_path + '.tmp.npy', codes_path)
+            if self.storage == 'int8':
+                np.save(scale_path + '.tmp.npy', self._scales[:self._size])
+                os.replace(scale_path + '.tmp.npy', scale_path)
+            np.savez(
+                tmp_path,
+                ids=self._ids[:self._size],
+                assign=self._assign[:self._size],
+                centroids=self._centroids if self._centroids is not None else np.empty((0, 0), dtype=np.float32),
+                trained_size=self._trained_size,
+                model_id=self.model_id or '',
+                storage=self.storage,
+            )
+        os.replace(tmp_path, self.path)
+
+    def reset(self, model_id=None):
+        """清空索引（例如更換模型時）"""
+        with self._lock:
+            self._clear()
+            self.model_id = model_id
+
+    def snapshot(self):
+        """
+        目前所有向量（不複製，取列時才轉回 float32），供批次比對使用
+
+        Returns:
+            tuple: (ids, MappedMatrix)
+        """
+        with self._lock:
+            return self._ids[:self._size].copy(), self._matrix()
+
+    def vectors_of(self, ids):
+        """
+        取出指定 id 的向量（轉回 float32），不在索引中的 id 會被略過
+
+        Returns:
+            tuple: (ids, np.ndarray)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            rows = self._rows_of(ids)
+            found = rows >= 0
+            return ids[found], self._matrix()[rows[found]]
+
+    def contains(self, row_id):
+        return int(row_id) in self._id_set
+
+    def add(self, ids, vectors):
+        """
+        增量加入向量，已存在的 id 會被略過
+
+        Args:
+            ids (array-like): 商品 id
+            vectors (np.ndarray): 已正規化的向量 (N x dim)
+
+        Returns:
+            int: 實際加入的數量
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        keep = np.array([int(i) not in self._id_set for i in ids], dtype=bool)
+        if not keep.any():
+            return 0
+        # 先篩選再轉換，vectors 為 MappedMatrix 時只轉換新加入的列
+        ids, vectors = ids[keep], np.asarray(vectors[keep], dtype=np.float32)
+        data, scales = quantize_rows(vectors, self.storage)
+
+        with self._lock:
+            self._reserve(self._size + len(ids), vectors.shape[1])
+            start, end = self._size, self._size + len(ids)
+            self._vectors[start:end] = data
+            if scales is not None:
+                self._scales[start:end] = scales
+            self._codes[start:end] = pack_sign_bits(vectors)
+            self._ids[start:end] = ids
+            self._assign[start:end] = _assign(vectors, self._centroids) if self._centroids is not None else 0
+            self._size = end
+            self._id_set.update(ids.tolist())
+            self._members = None
+
+            # 第一次達到門檻，或資料量比上次訓練成長太多時，重新訓練群集
+            if self._size >= self.min_train_size and (
+                self._centroids is None or self._size >= self._trained_size * self.retrain_factor
+            ):
+                self._train()
+        return len(ids)
+
+    def _rows_of(self, ids):
+        """id -> 列號，不存在的 id 為 -1"""
+        current = self._ids[:self._size]
+        if len(current) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        order = np.argsort(current, kind='stable')
+        pos = np.clip(np.searchsorted(current[order], ids), 0, len(current) - 1)
+        return np.where(current[order][pos] == ids, order[pos], -1)
+
+    def update(self, ids, vectors):
+        """
+        以新的向量取代已存在的 id（例如同一 SKU 的標題被更新），不存在的 id 直接加入
+
+        Args:
+            ids (array-like): 商品 id
+            vectors (np.ndarray): 已正規化的向量 (N x dim)
+
+        Returns:
+            int: 取代的數量
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(ids) == 0:
+            return 0
+        with self._lock:
+            rows = self._rows_of(ids)
+            found = rows >= 0
+            if found.any():
+                rows, replaced = rows[found], vectors[found]
+                data, scales = quantize_rows(replaced, self.storage)
+                self._reserve(self._size, replaced.shape[1])
+                self._vectors[rows] = data
+                if scales is not None:
+                    self._scales[rows] = scales
+                self._codes[rows] = pack_sign_bits(replaced)
+                self._assign[rows] = _assign(replaced, self._centroids) if self._centroids is not None else 0
+                self._members = None
+        if not found.all():
+            self.add(ids[~found], vectors[~found])
+        return int(found.sum())
+
+    def remove(self, ids):
+        """
+        移除指定的 id（例如覆蓋模式寫入後已不在目錄中的商品）
+
+        Returns:
+            int: 移除的數量
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            drop = np.isin(self._ids[:self._size], ids)
+            if not drop.any():
+                return 0
+            keep = np.flatnonzero(~drop)
+            # 以列號取出會複製成可寫入的陣列（memory map 載入的陣列是唯讀的）
+            self._vectors = self._vectors[keep]
+            if self.storage == 'int8':
+                self._scales = self._scales[keep]
+            self._codes = self._codes[keep]
+            self._ids = self._ids[keep]
+            self._assign = self._assign[keep]
+            self._size = len(keep)
+            self._id_set = set(self._ids.tolist())
+            self._members = None
+        return int(drop.sum())
+
+    def _reserve(self, capacity, dim):
+        """
+        以倍增方式擴充底層陣列，讓逐批新增的攤銷成本為 O(batch)
+
+        從磁碟 memory map 載入的陣列是唯讀的，第一次新增時會複製到可寫入的陣列。
+        """
+        dtype = VECTOR_STORAGES[self.storage]
+        if self._vectors.shape[1] == 0:
+            self._vectors = np.empty((0, dim), dtype=dtype)
+        writeable = self._vectors.flags.writeable and self._codes.flags.writeable and (
+            self.storage != 'int8' or self._scales.flags.writeable
+        )
+        if capacity <= len(self._vectors) and writeable:
+            return
+        new_capacity = max(capacity, 2 * len(self._vectors), 64)
+        vectors = np.empty((new_capacity, dim), dtype=dtype)
+        vectors[:self._size] = self._vectors[:self._size]
+        scales = np.ones(new_capacity, dtype=np.float32)
+        if self.storage == 'int8':
+            scales[:self._size] = self._scales[:self._size]
+        codes = np.zeros((new_capacity, (dim + 63) // 64), dtype=np.uint64)
+        if self._size:
+            codes[:self._size] = self._codes[:self._size]
+        ids = np.empty(new_capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        assign = np.zeros(new_capacity, dtype=np.int64)
+        assign[:self._size] = self._assign[:self._size]
+        self._vectors, self._scales, self._codes, self._ids, self._assign = vectors, scales, codes, ids, assign
+
+    def _train(self):
+        vectors = self._matrix()
+        nlist = int(min(4096, max(8, 4 * np.sqrt(self._size))))
+        # 以抽樣資料訓練中心點，控制大型目錄的訓練時間
+        rng = np.random.default_rng(0)
+        sample_size = min(self._size, nlist * 64)
+        sample = vectors[rng.choice(self._size, sample_size, replace=False)]
+        print(f"訓練 IVF 索引：{self._size} 筆向量，{nlist} 個群集")
+        self._centroids = _spherical_kmeans(sample, nlist)
+        self._assign[:self._size] = _assign(vectors, self._centroids)
+        self._trained_size = self._size
+        self._members = None
+
+    def _build_members(self):
+        order = np.argsort(self._assign[:self._size], kind='stable')
+        counts = np.bincount(self._assign[:self._size], minlength=len(self._centroids))
+        self._members = np.split(order, np.cumsum(counts)[:-1])
+
+    def candidate_count(self, query):
+        """一筆查詢在位元碼預篩之前要比對的向量數（沒有分群時為整個索引，否則為探查群集的成員數）"""
+        with self._lock:
+            if self._centroids is None:
+                return self._size
+            if self._members is None:
+                self._build_members()
+            probe = np.argsort(-(self._centroids @ np.asarray(query, dtype=np.float32)))[:self.nprobe]
+            return int(sum(len(self._members[c]) for c in probe))
+
+    def search(self, query, top_k=50, threshold=None):
+        """
+        搜尋最相似的向量
+
+        Args:
+            query (np.ndarray): 已正規化的查詢向量 (dim,)
+            top_k (int): 最多回傳幾筆
+            threshold (float): 相似度下限，None 表示不過濾
+
+        Returns:
+            list: [(id, similarity), ...]，依相似度由高到低排序
+        """
+        if self._size == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+
+        with self._lock:
+            matrix = self._matrix()
+            rows = None
+            if self._centroids is not None:
+                if self._members is None:
+                    self._build_members()
+                probe = np.argsort(-(self._centroids @ query))[:self.nprobe]
+                rows = np.concatenate([self._members[c] for c in probe])
+
+            candidates = self._size if rows is None else len(rows)
+            if self.binary_shortlist and candidates > self.binary_shortlist:
+                # 以位元碼的 Hamming 距離挑出候選，只對這些向量計算精確的 cosine
+                codes = self._codes[:self._size] if rows is None else self._codes[rows]
+                distances = hamming_distances(pack_sign_bits(query[None])[0], codes)
+                shortlist = np.argpartition(distances, self.binary_shortlist - 1)[:self.binary_shortlist]
+                rows = shortlist if rows is None else rows[shortlist]
+
+            if rows is None:
+                # 精確搜尋：逐塊計算，不把整個矩陣轉回 float32
+                scores = matrix.dot(query)
+                ids = self._ids[:self._size]
+            else:
+                scores = matrix[rows] @ query
+                ids = self._ids[rows]
+
+        if threshold is not None:
+            mask = scores >= threshold
+            scores, ids = scores[mask], ids[mask]
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k)[:top_k]
+            scores, ids = scores[top], ids[top]
+        order = np.argsort(-scores)
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def stage1_recall(reference, candidate, queries, top_k=50, threshold=None):
+    """
+    比較兩個索引第一階段的搜尋結果
+
+    Args:
+        reference (IVFIndex): 作為標準答案的索引（通常是精確搜尋）
+        candidate (IVFIndex): 要評估的索引（例如開啟位元碼預篩）
+        queries (np.ndarray): 已正規化的查詢向量 (N x dim)
+
+    Returns:
+        dict: recall（標準答案中被找回的比例）、完全相同的查詢比例，以及兩者每筆查詢的平均毫秒數
+    """
+    found = expected = identical = 0
+    ref_seconds = cand_seconds = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        ref_ids = {row_id for row_id, _ in reference.search(query, top_k=top_k, threshold=threshold)}
+        ref_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        cand_ids = {row_id for row_id, _ in candidate.search(query, top_k=top_k, threshold=threshold)}
+        cand_seconds += time.perf_counter() - start
+
+        found += len(ref_ids & cand_ids)
+        expected += len(ref_ids)
+        identical += ref_ids == cand_ids
+
+    n = max(len(queries), 1)
+    return {
+        'queries': len(queries),
+        'expected': expected,
+        'recall': found / expected if expected else 1.0,
+        'identical': identical / n,
+        'reference_ms': ref_seconds / n * 1000,
+        'candidate_ms': cand_seconds / n * 1000,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from catalog_store import read_catalog_csv
+    from embedding_backend import MODEL_BACKENDS, backend_model_id, load_sentence_transformer
+    from embedding_cache import EmbeddingCache, local_model_id
+
+    parser = argparse.ArgumentParser(description="比較位元碼預篩與精確搜尋的第一階段結果（recall 與速度）")
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', os.path.join("models", "models20-multilingual-e5-large_fold_1")),
+                        help="本地模型路徑或 Hugging Face 模型名稱")
+    parser.add_argument('--backend', choices=MODEL_BACKENDS, default=os.getenv('MODEL_BACKEND', 'torch').lower())
+    parser.add_argument('--momo', default='momo.csv', help="MOMO CSV 路徑（查詢）")
+    parser.add_argument('--pchome', default='pchome.csv', help="PChome CSV 路徑（被搜尋的目錄）")
+    parser.add_argument('--cache', default=os.getenv('EMBEDDING_CACHE_PATH', os.path.join("cache", "embeddings.sqlite")),
+                        help="向量快取路徑（與 matcher_app 共用，已編碼過的標題不需重新推論）")
+    parser.add_argument('--storage', choices=list(VECTOR_STORAGES), default=os.getenv('EMBEDDING_STORAGE', 'float16').lower())
+    parser.add_argument('--shortlists', type=int, nargs='+',
+                        help="要評估的預篩保留筆數；預設為每筆查詢候選數的 5%%、10%%、25%%")
+    parser.add_argument('--ivf', action='store_true', help="預篩前先以 IVF 群集縮小範圍（與 matcher_app 相同）")
+    parser.add_argument('--nprobe', type=int, default=int(os.getenv('ANN_NPROBE', '8')))
+    parser.add_argument('--top-k', type=int, default=int(os.getenv('ANN_TOP_K', '50')))
+    parser.add_argument('--threshold', type=float, default=0.739465, help="與 matcher_app 相同的相似度門檻")
+    args = parser.parse_args()
+
+    momo_titles = [t for t in read_catalog_csv(args.momo)['title'].tolist() if t]
+    pchome_df = read_catalog_csv(args.pchome)
+    pchome_df = pchome_df[pchome_df['title'] != '']
+    if not momo_titles or pchome_df.empty:
+        parser.error("CSV 中沒有任何標題")
+
+    source_id = local_model_id(args.model) if os.path.exists(args.model) else f"hf:{args.model}"
+    model_id = backend_model_id(source_id, args.backend)
+    cache = EmbeddingCache(args.cache)
+    model = None
+
+    def encode(texts):
+        # 與 matcher_app.get_batch_embeddings 相同：先查向量快取，只編碼未命中的文字
+        global model
+        vectors = cache.get_many(model_id, texts)
+        missing = [text for i, text in enumerate(texts) if i not in vectors]
+        if missing:
+            if model is None:
+                model = load_sentence_transformer(args.model, args.backend)
+            encoded = np.asarray(model.encode(missing, convert_to_numpy=True), dtype=np.float32)
+            cache.put_many(model_id, missing, encoded)
+            encoded = dict(zip(missing, encoded))
+            for i, text in enumerate(texts):
+                if i not in vectors:
+                    vectors[i] = encoded[text]
+        return normalize_rows(np.stack([vectors[i] for i in range(len(texts))]))
+
+    queries = encode(["query: " + t for t in momo_titles])
+    catalog = encode(["passage: " + t for t in pchome_df['title'].tolist()])
+    # 只比較找到的是哪幾列，以列號作為 id
+    ids = np.arange(len(catalog))
+
+    # 標準答案：float32、不分群的精確搜尋
+    reference = IVFIndex(storage='float32', min_train_size=len(catalog) + 1)
+    reference.add(ids, catalog)
+    candidate = IVFIndex(storage=args.storage, nprobe=args.nprobe,
+                         min_train_size=1024 if args.ivf else len(catalog) + 1)
+    candidate.add(ids, catalog)
+
+    # 保留筆數不小於候選數時 search 不會預篩，比較結果沒有意義
+    scanned = int(np.median([candidate.candidate_count(q) for q in queries]))
+    if args.shortlists:
+        shortlists = sorted({s for s in args.shortlists if s < scanned})
+        skipped = sorted(set(args.shortlists) - set(shortlists))
+        if skipped:
+            print(f"⚠️ 預篩保留筆數 {skipped} 不小於每筆查詢的候選數（約 {scanned} 筆），預篩不會啟動，略過")
+    else:
+        shortlists = sorted({max(int(scanned * f), args.top_k) for f in (0.05, 0.10, 0.25)})
+        shortlists = [s for s in shortlists if s < scanned]
+    if not shortlists:
+        parser.error(f"每筆查詢只有約 {scanned} 筆候選（目錄 {len(catalog)} 筆），不大於 top-k {args.top_k} 或指定的保留筆數，"
+                     f"無法評估預篩；請使用更大的目錄")
+
+    print(f"查詢 {len(queries)} 筆 MOMO 標題，目錄 {len(catalog)} 筆 PChome 標題，每筆查詢約 {scanned} 筆候選"
+          f"（{args.storage}{'，IVF nprobe=' + str(args.nprobe) if args.ivf else ''}，門檻 {args.threshold}）")
+    for shortlist in [0] + shortlists:
+        candidate.binary_shortlist = shortlist
+        r = stage1_recall(reference, candidate, queries, args.top_k, args.threshold)
+        label = f"預篩保留 {shortlist} 筆" if shortlist else "不預篩"
+        print(f"{label}: recall {r['recall']:.2%}（標準答案共 {r['expected']} 筆），結果完全相同 {r['identical']:.2%}，"
+              f"每筆 {r['candidate_ms']:.2f} ms（精確 {r['reference_ms']:.2f} ms）")
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def blocked_top_k(queries, targets, top_k, row_block=256, col_block=4096):
+    """
+    分塊計算 queries x targets 的相似度，只保留每列的前 top_k 名
+
+    記憶體用量受 row_block x col_block 限制，不會產生完整的相似度矩陣。
+
+    Args:
+        queries (np.ndarray): 已正規化的查詢向量 (Nq x dim)
+        targets (np.ndarray): 已正規化的目標向量 (Nt x dim)
+        top_k (int): 每個查詢保留的鄰居數
+        row_block (int): 每次處理的查詢列數
+        col_block (int): 每次處理的目標列數
+
+    Returns:
+        tuple: (indices, scores)，皆為 (Nq x k) 且依相似度由高到低排序
+    """
+    n_queries, n_targets = len(queries), len(targets)
+    k = min(top_k, n_targets)
+    all_idx = np.empty((n_queries, k), dtype=np.int64)
+    all_scores = np.empty((n_queries, k), dtype=np.float32)
+    if k == 0:
+        return all_idx, all_scores
+
+    for r0 in range(0, n_queries, row_block):
+        block = queries[r0:r0 + row_block]
+        best_scores = np.empty((len(block), 0), dtype=np.float32)
+        best_idx = np.empty((len(block), 0), dtype=np.int64)
+
+        for c0 in range(0, n_targets, col_block):
+            scores = block @ targets[c0:c0 + col_block].T
+            idx = np.broadcast_to(np.arange(c0, c0 + scores.shape[1]), scores.shape)
+            # 與目前的前 k 名合併後重新挑選
+            cand_scores = np.concatenate([best_scores, scores], axis=1)
+            cand_idx = np.concatenate([best_idx, idx], axis=1)
+            if cand_scores.shape[1] > k:
+                keep = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+                cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+                cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+            best_scores, best_idx = cand_scores, cand_idx
+
+        order = np.argsort(-best_scores, axis=1)
+        all_scores[r0:r0 + len(block)] = np.take_along_axis(best_scores, order, axis=1)
+        all_idx[r0:r0 + len(block)] = np.take_along_axis(best_idx, order, axis=1)
+
+    return all_idx, all_scores
+
+
+def compute_neighbor_table(momo_ids, momo_matrix, pchome_ids, pchome_matrix, top_k=20, **block_kwargs):
+    """
+    為每個 MOMO 商品計算前 top_k 個最相似的 PChome 商品
+
+    Returns:
+        pd.DataFrame: 欄位為 momo_id, rank, pchome_id, similarity
+    """
+    idx, scores = blocked_top_k(momo_matrix, pchome_matrix, top_k, **block_kwargs)
+    k = idx.shape[1]
+    return pd.DataFrame({
+        'momo_id': np.repeat(np.asarray(momo_ids, dtype=np.int64), k),
+        'rank': np.tile(np.arange(1, k + 1), len(momo_ids)),
+        'pchome_id': np.asarray(pchome_ids, dtype=np.int64)[idx.ravel()],
+        'similarity': scores.ravel(),
+    })
+
+
+def merge_neighbor_tables(tables, top_k):
+    """
+    合併多份鄰居表（例如既有的鄰居表與新商品的增量結果），每件 MOMO 商品重新取前 top_k 名
+
+    同一組 (momo_id, pchome_id) 出現多次時以較後面的表為準。
+
+    Returns:
+        pd.DataFrame: 欄位為 momo_id, rank, pchome_id, similarity
+    """
+    table = pd.concat([t for t in tables if t is not None and not t.empty], ignore_index=True)
+    if table.empty:
+        return pd.DataFrame(columns=['momo_id', 'rank', 'pchome_id', 'similarity'])
+    table = table.drop_duplicates(subset=['momo_id', 'pchome_id'], keep='last')
+    table = table.sort_values(['momo_id', 'similarity'], ascending=[True, False], kind='stable')
+    table = table.groupby('momo_id', sort=False).head(top_k).copy()
+    table['rank'] = table.groupby('momo_id', sort=False).cumcount() + 1
+    return table[['momo_id', 'rank', 'pchome_id', 'similarity']].reset_index(drop=True)
+
+
+def catalog_digest(df):
+    """
+    商品目錄內容的雜湊（id 與標題，與列的順序無關）
+
+    鄰居表以此判斷建表後資料是否變動；覆蓋後再追加、或同一 id 的標題被改寫時商品數不變，但雜湊會改變。
+    """
+    if df is None or df.empty:
+        return hashlib.sha1(b'').hexdigest()
+    frame = pd.DataFrame({'id': df['id'].astype(np.int64).to_numpy(), 'title': df['title'].astype(str).to_numpy()})
+    hashed = np.sort(pd.util.hash_pandas_object(frame, index=False).to_numpy())
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+class NeighborTableStore:
+    """
+    各類別預先計算好的 MOMO -> PChome 鄰居表
+
+    鄰居表存成 CSV，中繼資料記錄建表時的模型與商品目錄雜湊，
+    資料有變動時 lookup 會回傳 None，由呼叫端改走即時比對。
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        self._loaded = {}  # query -> (mtime, meta, {momo_id: [(pchome_id, similarity), ...]})
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _paths(self, query):
+        safe = re.sub(r'[^\w\-]+', '_', str(query)).strip('_') or 'query'
+        digest = hashlib.sha1(str(query).encode('utf-8')).hexdigest()[:8]
+        base = os.path.join(self.root_dir, f"{safe}_{digest}")
+        return base + ".csv", base + ".json"
+
+    def save(self, query, table, meta):
+        """
+        寫入鄰居表
+
+        Args:
+            query (str): 商品類別
+            table (pd.DataFrame): compute_neighbor_table 的結果
+            meta (dict): 建表條件（模型識別、商品目錄雜湊等），lookup 時用來判斷是否過期
+        """
+        csv_path, meta_path = self._paths(query)
+        with self._lock:
+            table.to_csv(csv_path + '.tmp', index=False)
+            os.replace(csv_path + '.tmp', csv_path)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'query': query, **meta}, f, ensure_ascii=False)
+            self._loaded.pop(query, None)
+        print(f"✅ 類別 {query} 的鄰居表已更新（{table['momo_id'].nunique()} 件 MOMO 商品）")
+
+    def _load(self, query):
+        csv_path, meta_path = self._paths(query)
+        if not (os.path.exists(csv_path) and os.path.exists(meta_path)):
+            return None
+        mtime = os.path.getmtime(csv_path)
+        cached = self._loaded.get(query)
+        if cached and cached[0] == mtime:
+            return cached
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        table = pd.read_csv(csv_path).sort_values(['momo_id', 'rank'])
+        neighbors = {
+            int(momo_id): list(zip(group['pchome_id'].tolist(), group['similarity'].tolist()))
+            for momo_id, group in table.groupby('momo_id')
+        }
+        with self._lock:
+            self._loaded[query] = (mtime, meta, neighbors)
+        return self._loaded[query]
+
+    def load_table(self, query):
+        """
+        讀取某個類別的完整鄰居表（增量更新時使用）
+
+        Returns:
+            tuple | None: (meta, table)；沒有鄰居表時回傳 None
+        """
+        csv_path, meta_path = self._paths(query)
+        if not (os.path.exists(csv_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta, pd.read_csv(csv_path)
+
+    def queries(self):
+        """
+        已儲存鄰居表的商品類別
+
+        Returns:
+            list: 類別名稱（取自各鄰居表的中繼資料）
+        """
+        queries = []
+        for name in sorted(os.listdir(self.root_dir)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root_dir, name), 'r', encoding='utf-8') as f:
+                    queries.append(json.load(f)['query'])
+            except (OSError, ValueError, KeyError):
+                continue
+        return queries
+
+    def lookup(self, query, momo_id, expected_meta):
+        """
+        查詢某個 MOMO 商品的鄰居
+
+        Args:
+            query (str): 商品類別
+            momo_id (int): MOMO 商品 id
+            expected_meta (dict): 目前的建表條件，與儲存的不一致時視為過期
+
+        Returns:
+            list | None: [(pchome_id, similarity), ...]；沒有可用的鄰居表時回傳 None
+        """
+        loaded = self._load(query)
+        if loaded is None:
+            return None
+        _, meta, neighbors = loaded
+        if any(meta.get(key) != value for key, value in expected_meta.items()):
+            return None
+        return neighbors.get(int(momo_id))
@@ -0,0 +1,245 @@
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+
+# 與 momo.csv / pchome.csv 相同的欄位順序
+CATALOG_COLUMNS = [
+    'id', 'sku', 'title', 'image', 'url', 'platform',
+    'connect', 'price', 'uncertainty_problem', 'query',
+    'annotator', 'created_at', 'updated_at'
+]
+
+
+def read_catalog_csv(csv_path):
+    """
+    以字串讀取 momo.csv / pchome.csv（相容有表頭與沒有表頭的檔案），欄位補齊為 CATALOG_COLUMNS
+
+    Returns:
+        pd.DataFrame: 檔案不存在或為空時回傳空的 DataFrame
+    """
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        return pd.DataFrame(columns=CATALOG_COLUMNS)
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        first_line = f.readline().strip()
+    has_header = first_line.startswith('id,') or first_line.startswith('"id"')
+    df = pd.read_csv(
+        csv_path, dtype=str, keep_default_na=False,
+        **({} if has_header else {'names': CATALOG_COLUMNS, 'header': None})
+    )
+    return df.reindex(columns=CATALOG_COLUMNS, fill_value='')
+
+
+class CatalogStore:
+    """
+    以 SQLite 儲存的商品目錄，取代 momo.csv / pchome.csv
+
+    - (platform, id) 為主鍵，新增時取最大 id 是索引查詢，不需讀整個檔案
+    - (platform, query) 與 sku 建有索引，讀取單一類別不需掃描全部商品
+    - 同一類別同一 SKU 再次寫入時更新價格等欄位，不會重複新增
+    - 每次寫入為單一交易，中途失敗不會留下一半的資料
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                platform TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                sku TEXT NOT NULL DEFAULT '',
+                title TEXT NOT NULL,
+                image TEXT NOT NULL DEFAULT '',
+                url TEXT NOT NULL DEFAULT '',
+                connect TEXT NOT NULL DEFAULT '',
+                price REAL,
+                uncertainty_problem TEXT NOT NULL DEFAULT '0',
+                query TEXT NOT NULL,
+                annotator TEXT NOT NULL DEFAULT '',
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (platform, id)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products (platform, query)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_products_sku ON products (sku)")
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def count(self, platform):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products WHERE platform = ?", (platform,)).fetchone()[0]
+
+    def upsert_products(self, platform, products, query_keyword, replace=False):
+        """
+        寫入爬蟲抓到的商品（格式同 fetch_products_for_* 的回傳值）
+
+        Args:
+            platform (str): 平台名稱
+            products (list): 商品列表，需有 sku, title, image_url, url, price
+            query_keyword (str): 商品類別
+            replace (bool): True 時先刪除該平台所有商品（對應 CSV 的覆蓋模式）
+
+        Returns:
+            list: 新增或更新的資料列（欄位同 CSV，含 id），供後續建立向量索引使用
+        """
+        if not products:
+            return []
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        rows = []
+
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM products WHERE platform = ?", (platform,))
+            next_id = (self._conn.execute(
+                "SELECT MAX(id) FROM products WHERE platform = ?", (platform,)
+            ).fetchone()[0] or 0) + 1
+
+            # 以 (platform, query) 索引找出這一批中已存在的 SKU
+            skus = list({str(p['sku']) for p in products if p.get('sku')})
+            existing = {}
+            for start in range(0, len(skus), 500):
+                chunk = skus[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for sku, row_id, created_at in self._conn.execute(
+                    f"SELECT sku, id, created_at FROM products "
+                    f"WHERE platform = ? AND query = ? AND sku IN ({placeholders})",
+                    (platform, query_keyword, *chunk)
+                ):
+                    existing[sku] = (row_id, created_at)
+
+            inserts, updates = [], []
+            for product in products:
+                sku = str(product.get('sku') or '')
+                row = {
+                    'sku': sku,
+                    'title': product['title'],
+                    'image': product.get('image_url', '') or '',
+                    'url': product.get('url', '') or '',
+                    'platform': platform,
+                    'connect': '',
+                    'price': float(product['price']),
+                    'uncertainty_problem': '0',
+                    'query': query_keyword,
+                    'annotator': 'model_prediction',
+                    'updated_at': now,
+                }
+                if sku and sku in existing:
+                    row_id, created_at = existing[sku]
+                    row.update(id=row_id, created_at=created_at)
+                    updates.append(row)
+                else:
+                    row.update(id=next_id, created_at=now)
+                    next_id += 1
+                    if sku:
+                        existing[sku] = (row['id'], now)
+                    inserts.append(row)
+                rows.append(row)
+
+            self._conn.executemany(
+                f"INSERT INTO products ({', '.join(CATALOG_COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in CATALOG_COLUMNS)})",
+                inserts
+            )
+            self._conn.executemany(
+                "UPDATE products SET title = :title, image = :image, url = :url, price = :price, "
+                "updated_at = :updated_at WHERE platform = :platform AND id = :id",
+                updates
+            )
+
+        print(f"✅ {platform} 目錄：新增 {len(inserts)} 筆、更新 {len(updates)} 筆（類別 {query_keyword}）")
+        return rows
+
+    def load(self, platform, query_keyword=None):
+        """
+        讀取商品目錄
+
+        Args:
+            platform (str): 平台名稱
+            query_keyword (str): 只讀取此類別，None 表示全部
+
+        Returns:
+            pd.DataFrame: 欄位與 CSV 相同，依 id 排序
+        """
+        sql = f"SELECT {', '.join(CATALOG_COLUMNS)} FROM products WHERE platform = ?"
+        params = [platform]
+        if query_keyword is not None:
+            sql += " AND query = ?"
+            params.append(query_keyword)
+        with self._lock:
+            return pd.read_sql_query(sql + " ORDER BY id", self._conn, params=params)
+
+    def known_skus(self, platform, query_keyword):
+        """某個類別已存在的 SKU"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sku FROM products WHERE platform = ? AND query = ? AND sku != ''",
+                (platform, query_keyword)
+            ).fetchall()
+        return {sku for (sku,) in rows}
+
+    def import_csv(self, csv_path, platform):
+        """
+        匯入既有的 momo.csv / pchome.csv（保留原本的 id，已存在的 id 會被覆寫）
+
+        Returns:
+            int: 匯入的筆數
+        """
+        df = read_catalog_csv(csv_path)
+        if df.empty:
+            return 0
+        df['platform'] = platform
+        df['id'] = pd.to_numeric(df['id'], errors='coerce')
+        df['price'] = pd.to_numeric(df['price'], errors='coerce')
+        df = df.dropna(subset=['id'])
+        df['id'] = df['id'].astype(int)
+
+        records = df.to_dict('records')
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO products ({', '.join(CATALOG_COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in CATALOG_COLUMNS)})",
+                records
+            )
+        print(f"✅ 已從 {csv_path} 匯入 {len(records)} 筆 {platform} 商品")
+        return len(records)
+
+    def export_csv(self, platform, csv_path):
+        """匯出成與原本相同格式的 CSV，回傳筆數"""
+        df = self.load(platform)
+        df['price'] = df['price'].map(lambda p: '' if pd.isna(p) else f"{p:.2f}")
+        df.to_csv(csv_path, index=False, columns=CATALOG_COLUMNS, quoting=csv.QUOTE_MINIMAL)
+        print(f"✅ 已匯出 {len(df)} 筆 {platform} 商品至 {csv_path}")
+        return len(df)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="商品目錄與 CSV 互相轉換")
+    parser.add_argument('action', choices=['import', 'export'], help="import: CSV -> SQLite；export: SQLite -> CSV")
+    parser.add_argument('--db', default=os.getenv('CATALOG_DB_PATH', 'catalog.sqlite'), help="SQLite 檔案路徑")
+    parser.add_argument('--momo', default='momo.csv', help="MOMO CSV 路徑")
+    parser.add_argument('--pchome', default='pchome.csv', help="PChome CSV 路徑")
+    args = parser.parse_args()
+
+    store = CatalogStore(args.db)
+    for platform, path in (('momo', args.momo), ('pchome', args.pchome)):
+        if args.action == 'import':
+            store.import_csv(path, platform)
+        else:
+            store.export_csv(platform, path)
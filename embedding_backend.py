@@ -0,0 +1,137 @@
+import os
+import time
+
+import numpy as np
+
+from catalog_store import read_catalog_csv
+
+
+# torch：原始 fp32 模型
+# int8：Linear 層做動態 int8 量化（只在 CPU 上執行）
+# onnx：匯出成 ONNX 以 onnxruntime 執行（需要 pip install "sentence-transformers[onnx]"）
+MODEL_BACKENDS = ('torch', 'int8', 'onnx')
+
+
+def load_sentence_transformer(source, backend='torch'):
+    """
+    以指定的推論後端載入 Sentence Transformer 模型
+
+    三種後端都回傳 SentenceTransformer，encode 的用法與輸出維度相同。
+
+    Args:
+        source (str): 本地模型路徑或 Hugging Face 模型名稱
+        backend (str): MODEL_BACKENDS 其中之一
+
+    Returns:
+        SentenceTransformer
+    """
+    # torch 與 sentence_transformers 匯入需要數秒，延到真正載入模型時才匯入
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"未知的模型後端: {backend}（可用: {', '.join(MODEL_BACKENDS)}）")
+    if backend == 'onnx':
+        # 模型目錄沒有 onnx/model.onnx 時 sentence-transformers 會在載入時匯出
+        return SentenceTransformer(source, backend='onnx', device='cpu')
+
+    if backend == 'torch':
+        return SentenceTransformer(source)
+    model = SentenceTransformer(source, device='cpu')
+    return quantize_int8(model)
+
+
+def quantize_int8(model):
+    """將模型中的 Linear 層換成動態 int8 量化版本（權重 int8，激活值在推論時量化）"""
+    import torch
+
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def backend_model_id(model_id, backend):
+    """向量快取的模型識別：不同後端的向量有誤差，不可共用快取（torch 保持原本的識別）"""
+    return model_id if backend == 'torch' else f"{model_id}#{backend}"
+
+
+def load_parity_texts(momo_path, pchome_path, limit=None):
+    """讀取 momo.csv / pchome.csv 的標題，加上與比對時相同的 query / passage 前綴"""
+    texts = []
+    for path, prefix in ((momo_path, "query: "), (pchome_path, "passage: ")):
+        titles = [t for t in read_catalog_csv(path)['title'].tolist() if t]
+        if limit:
+            titles = titles[:limit]
+        texts.extend(prefix + t for t in titles)
+    return texts
+
+
+def measure_throughput(model, texts, batch_size=32):
+    """
+    編碼所有文字並計時
+
+    Returns:
+        tuple: (正規化後的向量, 每秒編碼筆數)
+    """
+    # 先編碼一個批次暖機，避免把第一次呼叫的初始化時間算進去
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+    elapsed = time.perf_counter() - start
+    return np.asarray(vectors, dtype=np.float32), len(texts) / max(elapsed, 1e-9)
+
+
+def parity_report(source, backend, texts, batch_size=32):
+    """
+    比較指定後端與 fp32 模型的向量差異與速度
+
+    Returns:
+        dict: cosine 相似度的平均 / 最小 / 第 1 百分位、
+              每筆文字的最近鄰是否一致，以及兩者每秒編碼筆數
+    """
+    reference = load_sentence_transformer(source, 'torch').to('cpu')
+    ref_vectors, ref_rate = measure_throughput(reference, texts, batch_size)
+    del reference
+
+    candidate = load_sentence_transformer(source, backend)
+    vectors, rate = measure_throughput(candidate, texts, batch_size)
+
+    cosine = np.sum(ref_vectors * vectors, axis=1)
+    # 最近鄰一致率：排除自己後，兩個模型找到的最相似文字是否相同
+    ref_sim, sim = ref_vectors @ ref_vectors.T, vectors @ vectors.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(sim, -np.inf)
+    top1_agreement = float(np.mean(ref_sim.argmax(axis=1) == sim.argmax(axis=1))) if len(texts) > 1 else 1.0
+
+    return {
+        'backend': backend,
+        'texts': len(texts),
+        'cosine_mean': float(cosine.mean()),
+        'cosine_min': float(cosine.min()),
+        'cosine_p1': float(np.percentile(cosine, 1)),
+        'top1_agreement': top1_agreement,
+        'fp32_per_sec': ref_rate,
+        'backend_per_sec': rate,
+        'speedup': rate / ref_rate,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="比較量化 / ONNX 後端與 fp32 模型的向量差異與速度")
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', os.path.join("models", "models20-multilingual-e5-large_fold_1")),
+                        help="本地模型路徑或 Hugging Face 模型名稱")
+    parser.add_argument('--backend', choices=[b for b in MODEL_BACKENDS if b != 'torch'], default='int8')
+    parser.add_argument('--momo', default='momo.csv', help="MOMO CSV 路徑")
+    parser.add_argument('--pchome', default='pchome.csv', help="PChome CSV 路徑")
+    parser.add_argument('--limit', type=int, default=500, help="每個平台最多取幾筆標題，0 表示全部")
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    texts = load_parity_texts(args.momo, args.pchome, args.limit or None)
+    if not texts:
+        parser.error("CSV 中沒有任何標題")
+    r = parity_report(args.model, args.backend, texts, args.batch_size)
+    print(f"後端 {r['backend']}，共 {r['texts']} 筆標題")
+    print(f"與 fp32 的 cosine 相似度：平均 {r['cosine_mean']:.5f}、最小 {r['cosine_min']:.5f}、第 1 百分位 {r['cosine_p1']:.5f}")
+    print(f"最近鄰一致率：{r['top1_agreement']:.2%}")
+    print(f"速度：fp32 {r['fp32_per_sec']:.1f} 筆/秒，{r['backend']} {r['backend_per_sec']:.1f} 筆/秒（{r['speedup']:.2f}x）")
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# prepare_text 使用的前綴（e5 模型需要區分 query / passage）
+TEXT_PREFIXES = ("query: ", "passage: ")
+
+
+def local_model_id(path):
+    """
+    本地模型的識別：路徑加上模型檔案大小與修改時間的指紋
+
+    原地替換權重後識別隨之改變，不會沿用舊模型算出的向量。
+    只讀取檔案屬性，不需要雜湊數 GB 的權重。
+    """
+    path = os.path.abspath(path)
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if d != '.cache')
+            for name in sorted(filenames):
+                file_path = os.path.join(dirpath, name)
+                stat = os.stat(file_path)
+                digest.update(f"{os.path.relpath(file_path, path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    else:
+        stat = os.stat(path)
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return f"local:{path}@{digest.hexdigest()[:12]}"
+
+
+def split_prefix(text):
+    """
+    將 prepare_text 產生的文字拆成 (前綴, 標題)
+
+    Args:
+        text (str): 含前綴的文字，例如 "passage: Dyson V8"
+
+    Returns:
+        tuple: (prefix, title)，沒有已知前綴時 prefix 為空字串
+    """
+    for prefix in TEXT_PREFIXES:
+        if text.startswith(prefix):
+            return prefix, text[len(prefix):]
+    return "", text
+
+
+def hash_title(title):
+    """計算標題的 SHA-1 雜湊，作為快取鍵的一部分"""
+    return hashlib.sha1(title.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    持久化的向量快取（SQLite）
+
+    以 (模型識別, prepare_text 前綴, 標題雜湊) 為鍵儲存 float32 向量，
+    跨 rerun、session 與程序重啟都能重複使用。超過 max_entries 時
+    依最後使用時間淘汰最舊的項目。
+    """
+
+    # SQLite 單一查詢的參數數量有上限，分批查詢
+    _CHUNK_SIZE = 500
+
+    def __init__(self, db_path, max_entries=200000):
+        """
+        Args:
+            db_path (str): SQLite 檔案路徑
+            max_entries (int): 快取項目上限，超過時淘汰最久未使用的項目
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # Streamlit 會在不同執行緒執行 session，因此關閉同執行緒檢查並自行加鎖
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_id TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                title_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_id, prefix, title_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, model_id, texts):
+        """
+        查詢多筆文字的快取向量
+
+        Args:
+            model_id (str): 模型識別字串
+            texts (list): 含前綴的文字列表
+
+        Returns:
+            dict: {texts 中的索引: np.ndarray}，只包含命中的項目
+        """
+        # 依前綴分組，同一前綴的標題一起查詢
+        groups = {}
+        for i, text in enumerate(texts):
+            prefix, title = split_prefix(text)
+            groups.setdefault(prefix, {}).setdefault(hash_title(title), []).append(i)
+
+        found = {}
+        now = time.time()
+        with self._lock:
+            for prefix, by_hash in groups.items():
+                hashes = list(by_hash.keys())
+                for start in range(0, len(hashes), self._CHUNK_SIZE):
+                    chunk = hashes[start:start + self._CHUNK_SIZE]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT title_hash, dim, vector FROM embeddings "
+                        f"WHERE model_id = ? AND prefix = ? AND title_hash IN ({placeholders})",
+                        [model_id, prefix, *chunk]
+                    ).fetchall()
+
+                    hit_hashes = []
+                    for title_hash, dim, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                        for i in by_hash[title_hash]:
+                            found[i] = vector
+                        hit_hashes.append(title_hash)
+
+                    # 更新最後使用時間，讓常用的向量不會被淘汰
+                    if hit_hashes:
+                        self._conn.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE model_id = ? AND prefix = ? AND title_hash = ?",
+                            [(now, model_id, prefix, h) for h in hit_hashes]
+                        )
+            self._conn.commit()
+        return found
+
+    def put_many(self, model_id, texts, vectors):
+        """
+        寫入多筆向量
+
+        Args:
+            model_id (str): 模型識別字串
+            texts (list): 含前綴的文字列表
+            vectors (array-like): 與 texts 對應的向量（N x dim）
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            prefix, title = split_prefix(text)
+            rows.append((model_id, prefix, hash_title(title), int(vector.shape[0]), vector.tobytes(), now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model_id, prefix, title_hash, dim, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict_if_needed()
+            self._conn.commit()
+
+    def _evict_if_needed(self):
+        """超過上限時淘汰最久未使用的項目（多淘汰 10%，避免每次寫入都觸發）"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        to_remove = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (to_remove,)
+        )
+        print(f"向量快取超過上限 {self.max_entries}，已淘汰 {to_remove} 筆")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
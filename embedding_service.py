@@ -0,0 +1,305 @@
+import base64
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+class _EncodeRequest:
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    將多個呼叫端的編碼請求合併成一批送進模型
+
+    第一個請求到達後最多再等 max_wait 秒收集其他請求（或累積到 max_batch_size 筆文字），
+    去除重複文字後一次編碼，再把結果分回各請求。併發的小請求因此共用一次模型推論。
+    """
+
+    def __init__(self, encode_fn, max_batch_size=64, max_wait=0.01):
+        """
+        Args:
+            encode_fn (function): 接收文字列表，回傳 (N x dim) 的 np.ndarray
+            max_batch_size (int): 一批最多幾筆文字（單一請求超過時仍整批編碼）
+            max_wait (float): 收到第一個請求後最多等待幾秒再開始編碼
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'batches': 0, 'texts': 0, 'encoded': 0}
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, texts, timeout=None):
+        """
+        編碼文字（會阻塞到所屬批次完成）
+
+        Returns:
+            np.ndarray: (N x dim)，順序與 texts 相同
+        """
+        request = _EncodeRequest(list(texts))
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("向量編碼逾時")
+        if request.error is not None:
+            raise request.error
+        return request.vectors
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['avg_batch_texts'] = stats['texts'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request in batch for text in request.texts]
+            unique = list(dict.fromkeys(texts))
+            try:
+                vectors = np.asarray(self.encode_fn(unique), dtype=np.float32) if unique else None
+                position = {text: i for i, text in enumerate(unique)}
+                for request in batch:
+                    if request.texts:
+                        request.vectors = vectors[[position[t] for t in request.texts]]
+                    else:
+                        request.vectors = np.empty((0, 0), dtype=np.float32)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+            with self._stats_lock:
+                self._stats['requests'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['texts'] += len(texts)
+                self._stats['encoded'] += len(unique)
+
+
+def encode_vectors(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return {'shape': list(vectors.shape), 'data': base64.b64encode(vectors.tobytes()).decode('ascii')}
+
+
+def decode_vectors(payload):
+    return np.frombuffer(base64.b64decode(payload['data']), dtype=np.float32).reshape(payload['shape'])
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health  -> {"model_id": ..., "stats": {...}}
+    POST /encode  {"texts": [...]} -> {"model_id": ..., "vectors": {"shape": [...], "data": base64 float32}}
+    """
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error': 'not found'})
+            return
+        self._send_json(200, {'model_id': self.server.model_id, 'stats': self.server.batcher.stats()})
+
+    def do_POST(self):
+        if self.path != '/encode':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            texts = json.loads(self.rfile.read(length))['texts']
+            vectors = self.server.batcher.encode(texts, timeout=self.server.request_timeout)
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'model_id': self.server.model_id, 'vectors': encode_vectors(vectors)})
+
+    def address_string(self):
+        # Unix socket 的 client_address 是空字串
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class EmbeddingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batcher, model_id, request_timeout=60):
+        self.batcher = batcher
+        self.model_id = model_id
+        self.request_timeout = request_timeout
+        super().__init__(address, _ServiceHandler)
+
+
+class UnixEmbeddingHTTPServer(EmbeddingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind 會把位址當成 (host, port)，Unix socket 只需要綁定檔案路徑
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EmbeddingServiceClient:
+    """
+    本地向量服務的用戶端，提供與 SentenceTransformer.encode 相容的介面
+
+    URL 可以是 http://127.0.0.1:8765 或 unix:///tmp/embedding.sock。
+    每個 Streamlit 程序不必各自載入模型，所有 session 的請求由服務合併成批次編碼。
+    """
+
+    def __init__(self, url, timeout=60):
+        self.url = url
+        self.timeout = timeout
+        parts = urlsplit(url)
+        self._socket_path = parts.path if parts.scheme == 'unix' else None
+        self._host, self._port = parts.hostname, parts.port
+        self.matcher_model_id = None
+
+    def _request(self, method, path, payload=None):
+        if self._socket_path:
+            conn = _UnixHTTPConnection(self._socket_path, self.timeout)
+        else:
+            conn = http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+        try:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else None
+            conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            data = json.loads(response.read())
+            if response.status != 200:
+                raise RuntimeError(f"向量服務錯誤（HTTP {response.status}）: {data.get('error')}")
+            return data
+        finally:
+            conn.close()
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def connect(self, wait=120, poll_interval=1.0):
+        """
+        等待服務可用（服務啟動時需要先載入模型），並取得服務端的模型識別
+
+        Returns:
+            str: 模型識別（與直接載入模型時相同，向量快取可以共用）
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                self.matcher_model_id = self.health()['model_id']
+                return self.matcher_model_id
+            except (OSError, http.client.HTTPException):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(poll_interval)
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        """與 SentenceTransformer.encode 相同的呼叫方式，回傳 (N x dim) 的 np.ndarray"""
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        data = self._request('POST', '/encode', {'texts': list(texts)})
+        return decode_vectors(data['vectors'])
+
+
+def serve(source, backend='torch', url='http://127.0.0.1:8765', max_batch_size=64, max_wait=0.01, encode_batch_size=32):
+    """載入模型並啟動向量服務（阻塞直到中斷）"""
+    from embedding_backend import backend_model_id, load_sentence_transformer
+    from embedding_cache import local_model_id
+
+    # 本地模型的識別與 matcher_app 直接載入時相同，兩種模式共用同一份向量快取
+    if os.path.exists(source):
+        model_id = backend_model_id(local_model_id(source), backend)
+    else:
+        model_id = backend_model_id(f"hf:{source}", backend)
+    print(f"📦 載入模型: {source}（後端 {backend}）")
+    model = load_sentence_transformer(source, backend)
+    batcher = MicroBatcher(
+        lambda texts: model.encode(texts, batch_size=encode_batch_size, convert_to_numpy=True),
+        max_batch_size=max_batch_size,
+        max_wait=max_wait,
+    )
+
+    parts = urlsplit(url)
+    if parts.scheme == 'unix':
+        server = UnixEmbeddingHTTPServer(parts.path, batcher, model_id)
+    else:
+        server = EmbeddingHTTPServer((parts.hostname, parts.port), batcher, model_id)
+    print(f"✅ 向量服務已啟動: {url}（每批最多 {max_batch_size} 筆，最多等待 {max_wait * 1000:.0f} ms）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"向量服務已停止，統計: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地向量服務：所有 Streamlit 程序共用一個模型，並將請求合併成批次")
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', os.path.join("models", "models20-multilingual-e5-large_fold_1")),
+                        help="本地模型路徑或 Hugging Face 模型名稱")
+    parser.add_argument('--backend', default=os.getenv('MODEL_BACKEND', 'torch').lower(), help="torch / int8 / onnx")
+    parser.add_argument('--url', default=os.getenv('EMBEDDING_SERVICE_URL', 'http://127.0.0.1:8765'),
+                        help="監聽位址，例如 http://127.0.0.1:8765 或 unix:///tmp/embedding.sock")
+    parser.add_argument('--max-batch-size', type=int, default=64, help="一批最多幾筆文字")
+    parser.add_argument('--max-wait-ms', type=float, default=10, help="收到第一個請求後最多等待幾毫秒收集同一批")
+    parser.add_argument('--encode-batch-size', type=int, default=32, help="模型內部的 batch size")
+    args = parser.parse_args()
+
+    serve(args.model, args.backend, args.url, args.max_batch_size, args.max_wait_ms / 1000, args.encode_batch_size)
@@ -0,0 +1,433 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from verdict_cache import hash_prompt
+
+# Gemini 判斷規則（單筆與批次 prompt 共用）
+MATCH_RULES = """請嚴格依照以下規則判斷：
+
+**核心匹配規則**：
+1. **品牌與型號**：必須完全一致（注意：不同語言的品牌名稱，如 "Logitech" 和 "羅技" 是同一品牌）。
+2. **規格變體**：主要規格（如容量 128G vs 256G）不同視為「不同商品」。
+3. **顏色差異**：**相同產品的不同顏色，一律視為「相同商品」**（例如：黑色 iPhone 和白色 iPhone 視為同一商品，請忽略顏色差異）。
+
+**嚴格排除規則（以下情況視為不同商品，絕對不可匹配）**：
+1. **組合包 vs 單品**：
+   - 單品 ≠ 組合包/套組/多入組
+   - 關鍵字識別：「組合」「套組」「×2」「×3」「多入」「+」「贈」「送」
+2. **原廠 vs 副廠/相容配件**：
+   - 原廠商品 ≠ 副廠/相容/通用商品
+   - 關鍵字識別：「副廠」「相容」「適用」「通用」「compatible」
+3. **限量/特殊版本 vs 一般版本**：
+   - 一般商品 ≠ 限量/福利品/特殊版本
+   - 即使兩邊都是福利品，也建議視為不同商品（狀況可能不同）
+"""
+
+# 單筆驗證 prompt 模板；修改內容會改變 PROMPT_HASH，舊的快取判斷隨之失效
+VERIFY_PROMPT = """你是一個電商產品匹配專家。請判斷以下兩個商品是否為同一個產品。
+
+商品 A (Momo)：{momo_title}
+商品 B (PChome)：{pchome_title}
+第一階段相似度：{similarity_score:.4f}
+
+""" + MATCH_RULES + """
+請回傳純 JSON 格式：
+{{
+    "is_match": true 或 false,
+    "confidence": "high" 或 "medium" 或 "low",
+    "reasoning": "請用繁體中文簡述判斷理由 (30字以內)"
+}}
+"""
+
+# 批次驗證：一次送出一個 MOMO 商品與多個 PChome 候選，規則只需傳送一次
+BATCH_VERIFY_PROMPT = """你是一個電商產品匹配專家。請逐一判斷商品 A 與下列每個候選商品是否為同一個產品。
+
+商品 A (Momo)：{momo_title}
+
+候選商品 (PChome)：
+{candidate_lines}
+
+""" + MATCH_RULES + """
+請回傳純 JSON 陣列，每個候選商品一個物件，依編號排列：
+[
+    {{
+        "index": 候選商品編號,
+        "is_match": true 或 false,
+        "confidence": "high" 或 "medium" 或 "low",
+        "reasoning": "請用繁體中文簡述判斷理由 (30字以內)"
+    }}
+]
+"""
+
+PROMPT_HASH = hash_prompt(VERIFY_PROMPT + BATCH_VERIFY_PROMPT)
+
+# Gemini 結構化輸出的 JSON schema（OpenAPI 子集）
+VERDICT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "is_match": {"type": "BOOLEAN"},
+        "confidence": {"type": "STRING"},
+        "reasoning": {"type": "STRING"},
+    },
+    "required": ["is_match", "confidence", "reasoning"],
+}
+
+BATCH_VERDICT_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "index": {"type": "INTEGER"},
+            **VERDICT_SCHEMA["properties"],
+        },
+        "required": ["index", "is_match", "confidence", "reasoning"],
+    },
+}
+
+
+def api_error_result(error):
+    """API 呼叫失敗時的判斷結果"""
+    return {"is_match": False, "confidence": "low", "reasoning": f"API 錯誤: {str(error)}"}
+
+
+def extract_json_text(text):
+    """移除回應中可能包住 JSON 的 code fence"""
+    text = text.strip()
+    if '```json' in text:
+        text = text.split('```json')[1].split('```')[0].strip()
+    elif '```' in text:
+        text = text.split('```')[1].split('```')[0].strip()
+    return text
+
+
+class GeminiBackend:
+    """
+    Google Gemini 後端：建立一次 GenerativeModel 並重複使用，
+    要求以 JSON schema 約束的結構化輸出
+    """
+
+    def __init__(self, model_name, api_key=None):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._genai = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _ensure_model(self):
+        """第一次呼叫時才匯入 google.generativeai 並建立模型（匯入需要數秒，不拖慢啟動）"""
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                if self._api_key:
+                    genai.configure(api_key=self._api_key)
+                self._genai = genai
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt, schema, timeout):
+        """
+        Returns:
+            tuple: (回應文字, 輸入 token 數, 輸出 token 數)
+        """
+        response = self._ensure_model().generate_content(
+            prompt,
+            generation_config=self._genai.GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=schema,
+            ),
+            request_options={"timeout": timeout},
+        )
+        usage = getattr(response, 'usage_metadata', None)
+        input_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        return response.text, input_tokens, output_tokens
+
+
+class StubBackend:
+    """
+    離線後端：不呼叫任何 API，依 responder 產生回應，供測試或沒有 API Key 時使用
+
+    預設 responder 一律回傳「未配對」，token 數以字元數粗估。
+    """
+
+    model_name = "stub"
+
+    def __init__(self, responder=None, latency=0.0):
+        """
+        Args:
+            responder (function): 接收 (prompt, schema)，回傳 Python 物件或 JSON 字串
+            latency (float): 模擬的回應延遲（秒）
+        """
+        self.responder = responder or self._default_responder
+        self.latency = latency
+        self.prompts = []
+
+    @staticmethod
+    def _default_responder(prompt, schema):
+        verdict = {"is_match": False, "confidence": "low", "reasoning": "離線模式，未實際判斷"}
+        if schema.get("type") == "ARRAY":
+            count = len(re.findall(r'^\[(\d+)\]', prompt, flags=re.MULTILINE))
+            return [{"index": i, **verdict} for i in range(1, count + 1)]
+        return verdict
+
+    def generate(self, prompt, schema, timeout):
+        self.prompts.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        output = self.responder(prompt, schema)
+        text = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False)
+        return text, len(prompt) // 4, len(text) // 4
+
+
+class GeminiVerifier:
+    """
+    長期存在的商品比對驗證器
+
+    重複使用同一個後端連線，記錄每次呼叫的延遲、token 數與費用，
+    並提供累計統計，用於估算配額與找出慢速呼叫。
+    """
+
+    def __init__(self, backend, verdict_cache=None, timeout=30.0, max_retries=2, retry_backoff=1.0,
+                 max_workers=4, batch_size=8, input_price_per_million=0.0, output_price_per_million=0.0,
+                 history_size=200):
+        """
+        Args:
+            backend: GeminiBackend 或 StubBackend
+            verdict_cache (VerdictCache): 判斷快取，None 表示不快取
+            timeout (float): 單次請求逾時（秒）
+            max_retries (int): 失敗後重試次數
+            retry_backoff (float): 第一次重試前等待秒數，之後每次加倍
+            max_workers (int): 同時進行的請求數
+            batch_size (int): 每個批次請求包含的候選數，1 表示逐筆驗證
+            input_price_per_million (float): 每百萬輸入 token 的費用（美元）
+            output_price_per_million (float): 每百萬輸出 token 的費用（美元）
+            history_size (int): 保留最近幾次呼叫的明細
+        """
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.verdict_cache = verdict_cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.input_price_per_million = input_price_per_million
+        self.output_price_per_million = output_price_per_million
+
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._totals = {
+            'calls': 0,
+            'errors': 0,
+            'cache_hits': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cost': 0.0,
+            'latency': 0.0,
+        }
+
+    # ---------- 呼叫與統計 ----------
+
+    def _record(self, kind, latency, input_tokens=0, output_tokens=0, error=None):
+        cost = (input_tokens * self.input_price_per_million
+                + output_tokens * self.output_price_per_million) / 1_000_000
+        with self._lock:
+            self._totals['calls'] += 1
+            self._totals['errors'] += 1 if error else 0
+            self._totals['input_tokens'] += input_tokens
+            self._totals['output_tokens'] += output_tokens
+            self._totals['cost'] += cost
+            self._totals['latency'] += latency
+            self._history.append({
+                'kind': kind,
+                'latency': latency,
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'cost': cost,
+                'error': str(error) if error else None,
+                'at': time.time(),
+            })
+
+    def _generate(self, kind, prompt, schema):
+        """呼叫後端並在失敗時以指數退避重試，最後一次仍失敗則拋出例外"""
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                text, input_tokens, output_tokens = self.backend.generate(prompt, schema, self.timeout)
+                self._record(kind, time.perf_counter() - started, input_tokens, output_tokens)
+                return text
+            except Exception as e:
+                self._record(kind, time.perf_counter() - started, error=e)
+                if attempt >= self.max_retries:
+                    raise
+                # 指數退避加上隨機抖動，避免同時重試撞上速率限制
+                time.sleep(self.retry_backoff * (2 ** attempt) + random.uniform(0, 0.5))
+
+    def stats(self):
+        """
+        累計統計
+
+        Returns:
+            dict: calls, errors, cache_hits, input_tokens, output_tokens, cost,
+                  avg_latency, slowest（最近呼叫中最慢的一筆）
+        """
+        with self._lock:
+            totals = dict(self._totals)
+            history = list(self._history)
+        totals['avg_latency'] = totals['latency'] / totals['calls'] if totals['calls'] else 0.0
+        totals['slowest'] = max(history, key=lambda item: item['latency']) if history else None
+        return totals
+
+    def recent_calls(self):
+        with self._lock:
+            return list(self._history)
+
+    # ---------- 快取 ----------
+
+    def _cached(self, momo_title, pchome_title):
+        if self.verdict_cache is None:
+            return None
+        result = self.verdict_cache.get(self.model_name, PROMPT_HASH, momo_title, pchome_title)
+        if result is not None:
+            with self._lock:
+                self._totals['cache_hits'] += 1
+        return result
+
+    def _store(self, momo_title, pchome_title, result):
+        if self.verdict_cache is not None:
+            self.verdict_cache.put(self.model_name, PROMPT_HASH, momo_title, pchome_title, result)
+
+    # ---------- 驗證 ----------
+
+    def verify(self, momo_title, pchome_title, similarity_score):
+        """
+        驗證單一商品組合
+
+        Returns:
+            dict: is_match, confidence, reasoning；API 失敗時回傳 is_match=False 與錯誤原因
+        """
+        cached = self._cached(momo_title, pchome_title)
+        if cached is not None:
+            return cached
+
+        prompt = VERIFY_PROMPT.format(
+            momo_title=momo_title, pchome_title=pchome_title, similarity_score=similarity_score
+        )
+        last_error = None
+        for _ in range(self.max_retries + 1):
+            try:
+                result = json.loads(extract_json_text(self._generate('single', prompt, VERDICT_SCHEMA)))
+                self._store(momo_title, pchome_title, result)
+                return result
+            except json.JSONDecodeError as e:
+                # 回應格式錯誤時重新請求
+                last_error = e
+            except Exception as e:
+                last_error = e
+                break
+        return api_error_result(last_error)
+
+    def verify_batch(self, momo_title, candidates):
+        """
+        以單一請求驗證一個 MOMO 商品與多個 PChome 候選
+
+        Args:
+            momo_title (str): MOMO 商品標題
+            candidates (list): [(pchome_title, similarity_score), ...]
+
+        Returns:
+            list: 與 candidates 對應的判斷結果；回應中缺少或無法解析的項目為 None，
+                  API 重試後仍失敗時每一項都是 api_error_result
+        """
+        candidate_lines = "\n".join(
+            f"[{i}] {title}（第一階段相似度：{similarity:.4f}）"
+            for i, (title, similarity) in enumerate(candidates, start=1)
+        )
+        prompt = BATCH_VERIFY_PROMPT.format(momo_title=momo_title, candidate_lines=candidate_lines)
+
+        results = [None] * len(candidates)
+        try:
+            text = self._generate('batch', prompt, BATCH_VERDICT_SCHEMA)
+        except Exception as e:
+            # _generate 已重試過，逐筆呼叫只會以更多請求撞上同樣的錯誤
+            print(f"批次驗證失敗: {e}")
+            return [api_error_result(e) for _ in candidates]
+        try:
+            parsed = json.loads(extract_json_text(text))
+        except json.JSONDecodeError as e:
+            print(f"批次驗證回應無法解析，改為逐筆驗證: {e}")
+            return results
+
+        if isinstance(parsed, dict):
+            parsed = parsed.get('results', [])
+        if not isinstance(parsed, list):
+            return results
+
+        for item in parsed:
+            if not isinstance(item, dict) or not isinstance(item.get('is_match'), bool):
+                continue
+            try:
+                index = int(item.get('index')) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < len(candidates) and results[index] is None:
+                result = {key: item[key] for key in ('is_match', 'confidence', 'reasoning') if key in item}
+                results[index] = result
+                self._store(momo_title, candidates[index][0], result)
+        return results
+
+    def _verify_chunk(self, momo_title, chunk):
+        """驗證一批候選：先送批次請求，回應中缺少或無法解析的項目再逐筆呼叫（API 失敗時不逐筆重試）"""
+        if len(chunk) == 1:
+            position, title, similarity = chunk[0]
+            return [(position, self.verify(momo_title, title, similarity))]
+
+        batch_results = self.verify_batch(momo_title, [(title, similarity) for _, title, similarity in chunk])
+        output = []
+        for (position, title, similarity), result in zip(chunk, batch_results):
+            if result is None:
+                result = self.verify(momo_title, title, similarity)
+            output.append((position, result))
+        return output
+
+    def verify_many(self, momo_title, candidates):
+        """
+        以有上限的執行緒池同時驗證多個候選
+
+        已快取的組合直接回傳；其餘每 batch_size 個候選合併成一個批次請求。
+
+        Args:
+            momo_title (str): MOMO 商品標題
+            candidates (list): [(pchome_title, similarity_score), ...]
+
+        Yields:
+            tuple: (候選在 candidates 中的位置, 驗證結果)，依完成順序回傳
+        """
+        pending = []
+        for position, (title, similarity) in enumerate(candidates):
+            cached = self._cached(momo_title, title)
+            if cached is not None:
+                yield position, cached
+            else:
+                pending.append((position, title, similarity))
+
+        if not pending:
+            return
+
+        batch_size = max(1, self.batch_size)
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers))
+        try:
+            futures = [executor.submit(self._verify_chunk, momo_title, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                for position, result in future.result():
+                    yield position, result
+        finally:
+            # 呼叫端中斷時（例如 Streamlit rerun），未開始的請求直接取消
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,30 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import torch
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
 import os
-import json
 import time
-import sys
-from product_scraper import fetch_products_for_momo, fetch_products_for_pchome, save_to_csv
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from catalog_store import CatalogStore, read_catalog_csv
+from parquet_catalog import ParquetCatalog
+from product_scraper import (
+    clear_scrape_checkpoint,
+    fetch_products_for_momo,
+    fetch_products_for_pchome,
+    load_known_skus,
+    save_to_csv,
+)
+from embedding_cache import EmbeddingCache, local_model_id
+from embedding_backend import backend_model_id, load_sentence_transformer
+from embedding_service import EmbeddingServiceClient
+from startup_warmup import BackgroundLoader, StartupTimer
+from model_cache import ModelArtifactCache
+from ann_index import IVFIndex, normalize_rows
+from title_blocking import TitleBlockIndex
+from batch_matcher import NeighborTableStore, catalog_digest, compute_neighbor_table, merge_neighbor_tables
+from verdict_cache import VerdictCache
+from gemini_verifier import GeminiBackend, GeminiVerifier, StubBackend, PROMPT_HASH
 from dotenv import load_dotenv
 
 # 載入環境變數
@@ -187,16 +203,58 @@ def get_api_key():
 
 GEMINI_API_KEY = get_api_key()
 GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+# 第二階段 Gemini 驗證：同時進行的請求數、單次請求逾時（秒）與重試次數
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', '4'))
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '30'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+GEMINI_RETRY_BACKOFF = float(os.getenv('GEMINI_RETRY_BACKOFF', '1.0'))
+# 批次驗證：每個請求包含的候選數（1 表示逐筆驗證）
+GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '8'))
+# Gemini 後端：gemini（預設）或 stub（離線測試，不呼叫 API）
+GEMINI_BACKEND = os.getenv('GEMINI_BACKEND', 'gemini').lower()
+# 每百萬 token 的費用（美元），用於估算成本
+GEMINI_INPUT_PRICE_PER_M = float(os.getenv('GEMINI_INPUT_PRICE_PER_M', '0.30'))
+GEMINI_OUTPUT_PRICE_PER_M = float(os.getenv('GEMINI_OUTPUT_PRICE_PER_M', '2.50'))
+# Gemini 判斷快取：相同商品組合不重複呼叫 API
+VERDICT_CACHE_PATH = os.getenv('VERDICT_CACHE_PATH', os.path.join("cache", "verdicts.sqlite"))
+VERDICT_CACHE_TTL_DAYS = float(os.getenv('VERDICT_CACHE_TTL_DAYS', '30'))
 
 # 模型路徑：優先使用本地模型，如果不存在則從 Hugging Face 下載
 MODEL_PATH = os.getenv('MODEL_PATH', os.path.join("models", "models20-multilingual-e5-large_fold_1"))
+# 推論後端：torch（fp32）、int8（動態量化）或 onnx（onnxruntime）；採用前可先以 embedding_backend.py 比對誤差與速度
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'torch').lower()
+# 本地向量服務（python embedding_service.py）；設定後不在本程序載入模型，改由服務合併所有 session 的請求
+EMBEDDING_SERVICE_URL = os.getenv('EMBEDDING_SERVICE_URL', None)
 # 您的 Hugging Face 模型
 HUGGINGFACE_MODEL_NAME = os.getenv('HUGGINGFACE_MODEL_NAME', 'leochuang/multilingual-e5-large-custom')
 # 如果模型在 Google Drive，提供分享連結（選用）
 GDRIVE_MODEL_URL = os.getenv('GDRIVE_MODEL_URL', None)
+# 下載的模型存放在本地快取（以內容雜湊定址），之後啟動不必重新下載；可指定壓縮檔的 sha256 驗證
+MODEL_CACHE_DIR = os.getenv('MODEL_CACHE_DIR', os.path.join("cache", "models"))
+GDRIVE_MODEL_SHA256 = os.getenv('GDRIVE_MODEL_SHA256', None)
+# 向量快取：重複出現的商品標題不需要重新編碼
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join("cache", "embeddings.sqlite"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+# 全目錄 PChome 近似最近鄰索引（第一階段跨類別搜尋）
+ANN_INDEX_PATH = os.getenv('ANN_INDEX_PATH', os.path.join("cache", "pchome_ann.npz"))
+ANN_TOP_K = int(os.getenv('ANN_TOP_K', '50'))
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', '8'))
+# 位元碼預篩：先以正負號位元的 Hamming 距離保留這麼多筆，再計算精確 cosine（0 表示不預篩）
+ANN_BINARY_SHORTLIST = int(os.getenv('ANN_BINARY_SHORTLIST', '0'))
+# 第一階段先以標題中的品牌、型號與容量縮小 PChome 候選範圍（預設關閉；開啟前先以 python title_blocking.py 量測召回率）
+TITLE_BLOCKING = os.getenv('TITLE_BLOCKING', '0') == '1'
+# ANN 索引的向量儲存格式：float16（預設，一半空間）、int8（四分之一空間）或 float32
+EMBEDDING_STORAGE = os.getenv('EMBEDDING_STORAGE', 'float16').lower()
+# 商品目錄儲存方式：csv（momo.csv / pchome.csv）、sqlite 或 parquet（後兩者首次使用時自動匯入既有 CSV）
+CATALOG_BACKEND = os.getenv('CATALOG_BACKEND', 'csv').lower()
+CATALOG_DB_PATH = os.getenv('CATALOG_DB_PATH', 'catalog.sqlite')
+PARQUET_CATALOG_DIR = os.getenv('PARQUET_CATALOG_DIR', 'catalog_parquet')
+# 批次比對：每個類別預先計算的 MOMO -> PChome 鄰居表
+NEIGHBOR_TABLE_DIR = os.getenv('NEIGHBOR_TABLE_DIR', os.path.join("cache", "neighbors"))
+NEIGHBOR_TOP_K = int(os.getenv('NEIGHBOR_TOP_K', '20'))
 
-# 如果沒有 API Key，顯示警告並要求輸入
-if not GEMINI_API_KEY:
+# 如果沒有 API Key，顯示警告並要求輸入（離線 stub 後端不需要）
+if not GEMINI_API_KEY and GEMINI_BACKEND != 'stub':
     st.sidebar.warning("⚠️ 未設定 Gemini API Key")
     GEMINI_API_KEY = st.sidebar.text_input(
         "請輸入 Gemini API Key", 
@@ -213,83 +271,255 @@ if not GEMINI_API_KEY:
         """)
         st.stop()
 
-genai.configure(api_key=GEMINI_API_KEY)
+def _tag_model(model, model_id, backend='torch'):
+    """在模型上記錄來源與推論後端識別，供向量快取區分不同模型"""
+    model.matcher_model_id = backend_model_id(model_id, backend)
+    return model
+
+def get_model_identity(model):
+    return getattr(model, 'matcher_model_id', None) or type(model).__name__
+
+@st.cache_resource
+def get_catalog_store():
+    """SQLite 商品目錄；資料庫是空的時先匯入既有的 CSV"""
+    store = CatalogStore(CATALOG_DB_PATH)
+    if len(store) == 0:
+        momo_path, pchome_path = find_catalog_csvs()
+        store.import_csv(momo_path, 'momo')
+        store.import_csv(pchome_path, 'pchome')
+    return store
+
+@st.cache_resource
+def get_parquet_catalog():
+    """Parquet 商品目錄（需要 pyarrow）；目錄是空的時先匯入既有的 CSV"""
+    catalog = ParquetCatalog(PARQUET_CATALOG_DIR)
+    if not catalog.queries('momo') and not catalog.queries('pchome'):
+        momo_path, pchome_path = find_catalog_csvs()
+        catalog.import_frame(read_catalog_csv(momo_path), 'momo')
+        catalog.import_frame(read_catalog_csv(pchome_path), 'pchome')
+    return catalog
+
+@st.cache_resource
+def get_embedding_cache():
+    """整個程序共用一個向量快取（跨 session 與 rerun）"""
+    return EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+
+@st.cache_resource
+def get_ann_index():
+    return IVFIndex(ANN_INDEX_PATH, nprobe=ANN_NPROBE, storage=EMBEDDING_STORAGE, binary_shortlist=ANN_BINARY_SHORTLIST)
+
+@st.cache_resource
+def get_title_block_index():
+    """品牌 / 型號倒排索引，載入目錄與爬蟲寫入後以 sync_title_block_index 同步"""
+    return TitleBlockIndex()
+
+@st.cache_resource
+def get_neighbor_store():
+    return NeighborTableStore(NEIGHBOR_TABLE_DIR)
+
+@st.cache_resource
+def get_verdict_cache(prompt_hash):
+    """整個程序共用的 Gemini 判斷快取；啟動時清除舊版 prompt 產生的判斷"""
+    cache = VerdictCache(VERDICT_CACHE_PATH, ttl_seconds=VERDICT_CACHE_TTL_DAYS * 24 * 3600)
+    removed = cache.invalidate_other_prompts(prompt_hash) + cache.purge_expired()
+    if removed:
+        print(f"已清除 {removed} 筆過期或舊版 prompt 的判斷快取")
+    return cache
 
 @st.cache_resource
-def load_model(local_path=None, hf_model_name=None, gdrive_url=None):
+def get_gemini_verifier(api_key):
+    """整個程序共用一個 Gemini 驗證器，重複使用模型連線並累計使用統計"""
+    if GEMINI_BACKEND == 'stub':
+        backend = StubBackend()
+    else:
+        backend = GeminiBackend(GEMINI_MODEL, api_key=api_key)
+    return GeminiVerifier(
+        backend,
+        verdict_cache=get_verdict_cache(PROMPT_HASH),
+        timeout=GEMINI_TIMEOUT,
+        max_retries=GEMINI_MAX_RETRIES,
+        retry_backoff=GEMINI_RETRY_BACKOFF,
+        max_workers=GEMINI_CONCURRENCY,
+        batch_size=GEMINI_BATCH_SIZE,
+        input_price_per_million=GEMINI_INPUT_PRICE_PER_M,
+        output_price_per_million=GEMINI_OUTPUT_PRICE_PER_M,
+    )
+
+def build_model(local_path=None, hf_model_name=None, gdrive_url=None, backend=MODEL_BACKEND, notify=None):
     """
     載入 Sentence Transformer 模型
     優先使用本地模型，如果不存在則從其他來源下載
     
+    在背景執行緒中執行，不能操作 Streamlit 元件；進度與錯誤透過 notify(level, message) 回報。
+    
     Args:
         local_path: 本地模型路徑
         hf_model_name: Hugging Face 模型名稱
         gdrive_url: Google Drive 分享連結（選用）
+        backend: 推論後端（torch / int8 / onnx）
+        notify: 回報訊息的函數，None 時直接印出
     """
+    notify = notify or (lambda level, message: print(message))
     # 先嘗試載入本地模型
     if local_path and os.path.exists(local_path):
         try:
-            st.info(f"📦 載入本地模型: {local_path}")
-            return SentenceTransformer(local_path)
+            notify('info', f"📦 載入本地模型: {local_path}（後端 {backend}）")
+            return _tag_model(load_sentence_transformer(local_path, backend), local_model_id(local_path), backend)
         except Exception as e:
-            st.warning(f"⚠️ 本地模型載入失敗: {e}")
+            notify('warning', f"⚠️ 本地模型載入失敗: {e}")
+    
+    # 下載的模型先查本地快取，沒有時才下載；多個 worker 同時啟動時只有一個會下載
+    model_cache = ModelArtifactCache(MODEL_CACHE_DIR)
     
     # 如果有 Google Drive 連結，先嘗試從 Google Drive 下載
     if gdrive_url:
         try:
-            import gdown
-            import zipfile
-            import shutil
-            
-            st.info(f"🌐 從 Google Drive 下載模型...")
-            
-            # 下載到暫存資料夾
-            download_path = "temp_model.zip"
-            extract_path = "temp_model"
-            
-            gdown.download(gdrive_url, download_path, quiet=False, fuzzy=True)
+            source = f"gdrive:{gdrive_url}"
             
-            # 解壓縮
-            with zipfile.ZipFile(download_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_path)
-            
-            # 載入模型
-            model = SentenceTransformer(extract_path)
+            def fetch_gdrive(staging_dir):
+                import gdown
+                
+                download_path = os.path.join(staging_dir, "model.zip")
+                gdown.download(gdrive_url, download_path, quiet=False, fuzzy=True)
+                return download_path
             
-            # 清理暫存檔案
-            os.remove(download_path)
-            shutil.rmtree(extract_path)
+            if model_cache.lookup(source):
+                notify('info', "📦 從本地快取載入 Google Drive 模型")
+            else:
+                notify('info', f"🌐 從 Google Drive 下載模型...")
+            model_dir = model_cache.resolve(source, fetch_gdrive, expected_sha256=GDRIVE_MODEL_SHA256)
+            model = load_sentence_transformer(model_dir, backend)
             
-            st.success("✅ 從 Google Drive 下載並載入成功！")
-            return model
+            notify('success', "✅ Google Drive 模型載入成功！")
+            # 快取目錄名稱即為模型內容的 sha256，來源更新後識別隨之改變
+            return _tag_model(model, f"{source}@{os.path.basename(model_dir)[:12]}", backend)
         except Exception as e:
-            st.warning(f"⚠️ 從 Google Drive 下載失敗: {e}")
+            notify('warning', f"⚠️ 從 Google Drive 下載失敗: {e}")
     
     # 如果本地模型不存在或載入失敗，從 Hugging Face 下載
     if hf_model_name:
         try:
-            st.info(f"🌐 從 Hugging Face 下載模型: {hf_model_name}（首次下載需要幾分鐘）")
-            model = SentenceTransformer(hf_model_name)
-            st.success("✅ 模型下載並載入成功！")
-            return model
+            source = f"hf:{hf_model_name}"
+            
+            def fetch_hf(staging_dir):
+                from huggingface_hub import snapshot_download
+                
+                return snapshot_download(hf_model_name, local_dir=os.path.join(staging_dir, "snapshot"))
+            
+            if model_cache.lookup(source):
+                notify('info', f"📦 從本地快取載入模型: {hf_model_name}")
+            else:
+                notify('info', f"🌐 從 Hugging Face 下載模型: {hf_model_name}（首次下載需要幾分鐘）")
+            model_dir = model_cache.resolve(source, fetch_hf)
+            model = load_sentence_transformer(model_dir, backend)
+            notify('success', "✅ 模型下載並載入成功！")
+            return _tag_model(model, f"{source}@{os.path.basename(model_dir)[:12]}", backend)
         except Exception as e:
-            st.error(f"❌ 模型下載失敗: {e}")
+            notify('error', f"❌ 模型下載失敗: {e}")
             return None
     
-    st.error("❌ 無法載入模型：本地模型不存在且未指定其他來源")
+    notify('error', "❌ 無法載入模型：本地模型不存在且未指定其他來源")
     return None
 
-@st.cache_data
-def load_local_data():
-    """載入本地預設資料"""
-    # 先嘗試從根目錄讀取
+@st.cache_resource
+def get_startup_timer():
+    """整個程序共用的啟動計時（匯入套件、載入模型、暖機）"""
+    return StartupTimer()
+
+@st.cache_resource
+def get_model_loader():
+    """
+    程序第一次執行頁面時就在背景執行緒匯入 torch / sentence_transformers 並載入模型，
+    歡迎頁與商品選單不必等待，只有比對時才需要模型；
+    設定 EMBEDDING_SERVICE_URL 時不載入模型（也不匯入 torch），改為連線本地向量服務
+    """
+    timer = get_startup_timer()
+
+    def connect_service(notify):
+        client = EmbeddingServiceClient(EMBEDDING_SERVICE_URL)
+        notify('info', f"🔌 連線向量服務: {EMBEDDING_SERVICE_URL}")
+        with timer.stage('連線向量服務'):
+            client.connect()
+        notify('success', f"✅ 向量服務已就緒（{client.matcher_model_id}）")
+        if GEMINI_BACKEND != 'stub':
+            timer.timed_import('google.generativeai')
+        return client
+
+    def warm_up(notify):
+        timer.timed_import('torch')
+        timer.timed_import('sentence_transformers')
+        with timer.stage('建立模型'):
+            model = build_model(MODEL_PATH, HUGGINGFACE_MODEL_NAME, GDRIVE_MODEL_URL, MODEL_BACKEND, notify)
+        if model is not None:
+            # 第一次推論需要初始化，先編碼一筆文字，使用者的第一次比對不必多等
+            with timer.stage('模型暖機'):
+                model.encode(["query: warm up"])
+        if GEMINI_BACKEND != 'stub':
+            timer.timed_import('google.generativeai')
+        return model
+
+    return BackgroundLoader('模型', connect_service if EMBEDDING_SERVICE_URL else warm_up, timer=timer).start()
+
+def load_model():
+    """
+    取得背景載入的模型；尚未載入完成時在 spinner 下等待，載入失敗時顯示原因並回傳 None
+    （下一次呼叫會重新載入）
+    """
+    loader = get_model_loader().start()
+    if not loader.ready:
+        with st.spinner("模型載入中，請稍候..."):
+            loader.wait()
+    if loader.result is None:
+        for level, message in loader.messages:
+            if level in ('warning', 'error'):
+                getattr(st, level)(message)
+    return loader.result
+
+def require_model():
+    """比對時才等待背景載入的模型；載入失敗時停止執行"""
+    model = load_model()
+    if model is None:
+        st.error("❌ 無法載入模型，請檢查設定或網路連線")
+        st.stop()
+    return model
+
+def find_catalog_csvs():
+    """先找根目錄的 CSV，沒有時改用 dataset/test/"""
     momo_path = "momo.csv"
     pchome_path = "pchome.csv"
-    
-    # 如果根目錄沒有，再試 dataset/test/
     if not os.path.exists(momo_path):
         momo_path = os.path.join("dataset", "test", "momo.csv")
         pchome_path = os.path.join("dataset", "test", "pchome.csv")
+    return momo_path, pchome_path
+
+def save_products(products, platform, query_keyword, append_mode=True):
+    """依 CATALOG_BACKEND 將爬蟲結果寫入 CSV、SQLite 或 Parquet 目錄，回傳寫入的資料列"""
+    if CATALOG_BACKEND == 'sqlite':
+        return get_catalog_store().upsert_products(platform, products, query_keyword, replace=not append_mode)
+    if CATALOG_BACKEND == 'parquet':
+        # Parquet 目錄只追加分割檔，不支援覆蓋模式
+        return get_parquet_catalog().append_products(platform, products, query_keyword)
+    return save_to_csv(products, f"{platform}.csv", query_keyword, append_mode=append_mode)
+
+def get_known_skus(platform, query_keyword):
+    """某個類別已存檔的 SKU"""
+    if CATALOG_BACKEND == 'sqlite':
+        return get_catalog_store().known_skus(platform, query_keyword)
+    if CATALOG_BACKEND == 'parquet':
+        return get_parquet_catalog().known_skus(platform, query_keyword)
+    return load_known_skus(f"{platform}.csv", query_keyword)
+
+@st.cache_data
+def load_local_data():
+    """載入本地預設資料"""
+    if CATALOG_BACKEND == 'sqlite':
+        store = get_catalog_store()
+        momo_df, pchome_df = store.load('momo'), store.load('pchome')
+        if momo_df.empty or pchome_df.empty:
+            return pd.DataFrame(), pd.DataFrame()
+        return momo_df, pchome_df
+    
+    momo_path, pchome_path = find_catalog_csvs()
     
     try:
         # 檢查檔案是否為空
@@ -342,65 +572,427 @@ def load_local_data():
         st.error(traceback.format_exc())
         return pd.DataFrame(), pd.DataFrame()
 
+@st.cache_resource
+def load_shared_catalog():
+    """
+    從 Parquet 目錄載入商品（只讀取頁面用到的欄位，標題與類別為 categorical）
+
+    以 cache_resource 快取，所有 session 共用同一份 DataFrame，不會像 cache_data 一樣每個 session 各複製一份；
+    呼叫端只讀取、不修改這兩個 DataFrame，有新商品時由 refresh_catalog 換成合併後的新 DataFrame。
+    """
+    catalog = get_parquet_catalog()
+    return {'momo': catalog.load('momo'), 'pchome': catalog.load('pchome'), 'lock': threading.Lock()}
+
+def load_catalog():
+    """依 CATALOG_BACKEND 載入 MOMO 與 PChome 商品"""
+    if CATALOG_BACKEND == 'parquet':
+        shared = load_shared_catalog()
+        if shared['momo'].empty or shared['pchome'].empty:
+            return pd.DataFrame(), pd.DataFrame()
+        return shared['momo'], shared['pchome']
+    return load_local_data()
+
+def merge_catalog_rows(df, rows):
+    """
+    將新寫入的資料列（save_products 的回傳值）併入已載入的目錄，同 id 的舊資料列以新的取代
+
+    只轉換這一批資料列，不重新讀取目錄；categorical 欄位只加入新出現的類別。
+    不修改傳入的 DataFrame（Parquet 目錄的 DataFrame 由多個 session 共用）。
+    """
+    if not rows:
+        return df
+    delta = pd.DataFrame(rows)
+    if df.empty:
+        delta['price'] = pd.to_numeric(delta['price'], errors='coerce')
+        return delta.reset_index(drop=True)
+
+    delta = delta.reindex(columns=df.columns)
+    kept = df[~df['id'].isin(delta['id'])] if 'id' in df.columns else df
+    new_columns = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            values = delta[col].astype(str)
+            added = pd.Index(values.unique()).difference(dtype.categories)
+            categories = dtype.categories.append(added) if len(added) else dtype.categories
+            if len(added):
+                new_columns[col] = kept[col].cat.add_categories(added)
+            delta[col] = pd.Categorical(values, categories=categories)
+        elif col == 'price':
+            delta[col] = pd.to_numeric(delta[col], errors='coerce')
+        else:
+            try:
+                delta[col] = delta[col].astype(dtype)
+            except (ValueError, TypeError):
+                pass
+    if new_columns:
+        kept = kept.assign(**new_columns)
+    return pd.concat([kept, delta], ignore_index=True)
+
+def refresh_catalog(momo_rows, pchome_rows, append_mode=True):
+    """
+    爬蟲寫入新商品後更新已載入的目錄
+
+    追加模式下只把這次寫入的資料列併入目前的 DataFrame，所需時間與新增筆數成正比；
+    只清除 load_local_data 的快取（其他 session 下次載入時重新讀取），不影響其他快取的函式。
+    覆蓋模式或目前沒有載入任何資料時才重新讀取整個目錄。
+
+    Returns:
+        tuple: (momo_df, pchome_df)
+    """
+    if CATALOG_BACKEND == 'parquet':
+        shared = load_shared_catalog()
+        with shared['lock']:
+            shared['momo'] = merge_catalog_rows(shared['momo'], momo_rows)
+            shared['pchome'] = merge_catalog_rows(shared['pchome'], pchome_rows)
+        return load_catalog()
+
+    load_local_data.clear()
+    momo_df, pchome_df = st.session_state.momo_df, st.session_state.pchome_df
+    if not append_mode or momo_df.empty or pchome_df.empty:
+        return load_local_data()
+    return merge_catalog_rows(momo_df, momo_rows), merge_catalog_rows(pchome_df, pchome_rows)
+
 def prepare_text(title, platform):
     return ("query: " if platform == 'momo' else "passage: ") + str(title)
 
 def get_single_embedding(model, text):
-    return model.encode([text], convert_to_tensor=True).cpu()
+    return get_batch_embeddings(model, [text])
 
 def get_batch_embeddings(model, texts):
-    return model.encode(texts, convert_to_tensor=True).cpu()
-
-def gemini_verify_match(momo_title, pchome_title, similarity_score):
-    prompt = f"""你是一個電商產品匹配專家。請判斷以下兩個商品是否為同一個產品。
-
-商品 A (Momo)：{momo_title}
-商品 B (PChome)：{pchome_title}
-第一階段相似度：{similarity_score:.4f}
-
-請嚴格依照以下規則判斷：
-
-**核心匹配規則**：
-1. **品牌與型號**：必須完全一致（注意：不同語言的品牌名稱，如 "Logitech" 和 "羅技" 是同一品牌）。
-2. **規格變體**：主要規格（如容量 128G vs 256G）不同視為「不同商品」。
-3. **顏色差異**：**相同產品的不同顏色，一律視為「相同商品」**（例如：黑色 iPhone 和白色 iPhone 視為同一商品，請忽略顏色差異）。
-
-**嚴格排除規則（以下情況視為不同商品，絕對不可匹配）**：
-1. **組合包 vs 單品**：
-   - 單品 ≠ 組合包/套組/多入組
-   - 關鍵字識別：「組合」「套組」「×2」「×3」「多入」「+」「贈」「送」
-2. **原廠 vs 副廠/相容配件**：
-   - 原廠商品 ≠ 副廠/相容/通用商品
-   - 關鍵字識別：「副廠」「相容」「適用」「通用」「compatible」
-3. **限量/特殊版本 vs 一般版本**：
-   - 一般商品 ≠ 限量/福利品/特殊版本
-   - 即使兩邊都是福利品，也建議視為不同商品（狀況可能不同）
-
-請回傳純 JSON 格式：
-{{
-    "is_match": true 或 false,
-    "confidence": "high" 或 "medium" 或 "low",
-    "reasoning": "請用繁體中文簡述判斷理由 (30字以內)"
-}}
-"""
-    try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0].strip()
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0].strip()
-        return json.loads(text)
-    except Exception as e:
-        return {"is_match": False, "confidence": "low", "reasoning": f"API 錯誤: {str(e)}"}
+    """
+    計算文字向量，優先使用持久化快取，只對未命中的文字呼叫模型
+
+    model 可以是 SentenceTransformer 或 EmbeddingServiceClient（兩者的 encode 用法相同）。
+
+    Returns:
+        np.ndarray: (N x dim) 的 float32 向量，順序與 texts 相同
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    cache = get_embedding_cache()
+    model_id = get_model_identity(model)
+    vectors = cache.get_many(model_id, texts)
+
+    # 未命中的文字去重後一次編碼
+    missing_texts = list(dict.fromkeys(texts[i] for i in range(len(texts)) if i not in vectors))
+    if missing_texts:
+        new_vectors = model.encode(missing_texts, convert_to_numpy=True)
+        cache.put_many(model_id, missing_texts, new_vectors)
+        encoded = dict(zip(missing_texts, new_vectors))
+        for i, text in enumerate(texts):
+            if i not in vectors:
+                vectors[i] = encoded[text]
+
+    return np.stack([vectors[i] for i in range(len(texts))]).astype(np.float32)
+
+def index_pchome_rows(model, pchome_rows, refresh=False):
+    """
+    將 PChome 商品的向量增量寫入全目錄 ANN 索引（PChome 向量只存在這個索引中）
+
+    Args:
+        model: SentenceTransformer 模型
+        pchome_rows (pd.DataFrame): PChome 商品（需有 id、title 欄位）
+        refresh (bool): 已收錄的商品也重新寫入向量（爬蟲剛寫入的商品，同一 id 的標題可能已改變）；
+            向量取自向量快取，標題沒變的商品不需重新推論
+    """
+    index = get_ann_index()
+    model_id = get_model_identity(model)
+    if index.model_id != model_id:
+        index.reset(model_id)
+
+    ids = pchome_rows['id'].astype(np.int64).to_numpy()
+    known = np.fromiter((index.contains(i) for i in ids), dtype=bool, count=len(ids))
+    pending = np.ones(len(ids), dtype=bool) if refresh else ~known
+    added = updated = 0
+    if pending.any():
+        titles = pchome_rows['title'].to_numpy()[pending]
+        vectors = normalize_rows(get_batch_embeddings(model, [prepare_text(t, 'pchome') for t in titles]))
+        existing = known[pending]
+        if existing.any():
+            updated = index.update(ids[pending][existing], vectors[existing])
+        if not existing.all():
+            added = index.add(ids[pending][~existing], vectors[~existing])
+    if added or updated:
+        index.save()
+        print(f"ANN 索引新增 {added} 筆、更新 {updated} 筆，目前共 {len(index)} 筆")
+    return index
+
+def prune_ann_index(pchome_df):
+    """從 ANN 索引移除已不在 PChome 目錄中的商品（覆蓋模式寫入後使用）"""
+    index = get_ann_index()
+    indexed_ids, _ = index.snapshot()
+    removed = index.remove(indexed_ids[~np.isin(indexed_ids, pchome_df['id'].astype(np.int64).to_numpy())])
+    if removed:
+        index.save()
+        print(f"ANN 索引移除 {removed} 筆，目前共 {len(index)} 筆")
+
+def sync_title_block_index(pchome_df):
+    """載入目錄或爬蟲寫入後同步品牌 / 型號索引（只重建標題有變動的商品），比對時不再逐次同步"""
+    if TITLE_BLOCKING and not pchome_df.empty:
+        get_title_block_index().sync(pchome_df)
+
+def search_title_block(ann_index, momo_vec, block_ids, threshold):
+    """
+    只在品牌 / 型號區塊內計算相似度（區塊通常只有數件到數十件，直接計算精確 cosine）
+
+    Args:
+        ann_index (IVFIndex): 全目錄 ANN 索引，區塊內商品的向量取自索引，不重新編碼
+        momo_vec (np.ndarray): 已正規化的 MOMO 商品向量
+        block_ids (set): 區塊內的 PChome 商品 id
+        threshold (float): 相似度門檻
+
+    Returns:
+        dict: {PChome id: 相似度}，最多 ANN_TOP_K 筆；區塊內的商品都不在索引中時為空
+    """
+    ids, vectors = ann_index.vectors_of(sorted(block_ids))
+    if len(ids) == 0:
+        return {}
+    scores = vectors @ momo_vec
+    ranked = sorted(zip(ids.tolist(), scores.tolist()), key=lambda x: x[1], reverse=True)
+    return {pchome_id: similarity for pchome_id, similarity in ranked[:ANN_TOP_K] if similarity >= threshold}
+
+def ensure_ann_index(model, pchome_df):
+    """ANN 索引尚未收錄整個 PChome 目錄（或由其他模型建立）時補上缺少的商品"""
+    ann_index = get_ann_index()
+    if len(ann_index) < len(pchome_df) or ann_index.model_id != get_model_identity(model):
+        ann_index = index_pchome_rows(model, pchome_df)
+    return ann_index
+
+def pchome_catalog_vectors(model, pchome_df):
+    """
+    整個 PChome 目錄的向量（取自全目錄 ANN 索引，不重新編碼）
+
+    Returns:
+        tuple: (ids, matrix)；索引中已不在目錄內的商品會被排除
+    """
+    ids, matrix = ensure_ann_index(model, pchome_df).snapshot()
+    live = np.isin(ids, pchome_df['id'].astype(np.int64).to_numpy())
+    if not live.all():
+        rows = np.flatnonzero(live)
+        return ids[rows], matrix[rows]
+    return ids, matrix
+
+def pchome_catalog_digest(pchome_df):
+    """整個 PChome 目錄的 catalog_digest；同一份 DataFrame 只計算一次，目錄更新後才重新計算"""
+    cached = st.session_state.get('pchome_digest')
+    if cached is None or cached[0] is not pchome_df:
+        cached = (pchome_df, catalog_digest(pchome_df))
+        st.session_state.pchome_digest = cached
+    return cached[1]
+
+def neighbor_table_meta(model, momo_digest, pchome_digest):
+    """
+    鄰居表的建表條件，任何一項改變都代表需要重新計算
+
+    Args:
+        momo_digest (str): 該類別 MOMO 商品的 catalog_digest
+        pchome_digest (str): 整個 PChome 目錄的 catalog_digest（鄰居來自所有類別）
+    """
+    return {
+        'model_id': get_model_identity(model),
+        'momo_digest': momo_digest,
+        'pchome_digest': pchome_digest,
+        'top_k': NEIGHBOR_TOP_K,
+    }
+
+def embed_momo_rows(model, rows):
+    return normalize_rows(get_batch_embeddings(model, [prepare_text(t, 'momo') for t in rows['title']]))
+
+def build_neighbor_table(model, momo_df, pchome_df, query):
+    """
+    批次比對某個類別：將該類別的 MOMO 商品各編碼一次，分塊計算與整個 PChome 目錄的相似度，
+    並寫入每件 MOMO 商品的前 NEIGHBOR_TOP_K 個鄰居（與即時比對相同，不限同類別）
+
+    Returns:
+        bool: 是否成功建立鄰居表
+    """
+    if momo_df.empty or pchome_df.empty:
+        return False
+    momo_rows = momo_df[momo_df['query'] == query]
+    if momo_rows.empty:
+        return False
+
+    pchome_ids, pchome_matrix = pchome_catalog_vectors(model, pchome_df)
+    table = compute_neighbor_table(
+        momo_rows['id'].to_numpy(), embed_momo_rows(model, momo_rows), pchome_ids, pchome_matrix, top_k=NEIGHBOR_TOP_K
+    )
+    get_neighbor_store().save(
+        query, table, neighbor_table_meta(model, catalog_digest(momo_rows), pchome_catalog_digest(pchome_df))
+    )
+    return True
+
+def update_neighbor_table(model, momo_df, pchome_df, query, momo_delta_ids, pchome_delta_ids, previous_digests,
+                          rebuild=True):
+    """
+    爬蟲寫入商品後增量更新某個類別的鄰居表
+
+    重新計算「新增或更新的 MOMO 商品 x 整個 PChome 目錄」、「鄰居中含有被更新的 PChome 商品的 MOMO 商品
+    x 整個目錄」與「其餘 MOMO 商品 x 這次寫入的 PChome 商品」，再與原本的前 NEIGHBOR_TOP_K 名合併。
+    鄰居已不在目錄中（覆蓋模式寫入後被移除）的 MOMO 商品也整列重算。
+    沒有可沿用的鄰居表（不存在、模型不同，或建表後資料另有變動）時改為 build_neighbor_table 完整重建。
+
+    Args:
+        momo_df, pchome_df (pd.DataFrame): 已併入新商品的目錄
+        query (str): 商品類別
+        momo_delta_ids, pchome_delta_ids (list): 這次寫入的商品 id
+        previous_digests (tuple): 寫入前 (該類別 MOMO 商品, 整個 PChome 目錄) 的 catalog_digest
+        rebuild (bool): 沒有可沿用的鄰居表時是否完整重建；False 時直接回傳 False
+
+    Returns:
+        bool: 是否成功建立或更新鄰居表
+    """
+    if momo_df.empty or pchome_df.empty:
+        return False
+    momo_rows = momo_df[momo_df['query'] == query]
+    if momo_rows.empty:
+        return False
+
+    store = get_neighbor_store()
+    loaded = store.load_table(query)
+    expected = neighbor_table_meta(model, *previous_digests)
+    if loaded is None or any(loaded[0].get(key) != value for key, value in expected.items()):
+        return build_neighbor_table(model, momo_df, pchome_df, query) if rebuild else False
+    if not len(momo_delta_ids) and not len(pchome_delta_ids):
+        return True
+
+    _, table = loaded
+    pchome_ids, pchome_matrix = pchome_catalog_vectors(model, pchome_df)
+    # 被更新或已移除的 PChome 商品相似度已改變，原本以它為鄰居的 MOMO 商品整列重算
+    stale = table['pchome_id'].isin(pchome_delta_ids) | ~table['pchome_id'].isin(pchome_df['id'])
+    affected = table.loc[stale, 'momo_id']
+    recompute = momo_rows['id'].isin(momo_delta_ids) | momo_rows['id'].isin(affected)
+    parts = [table[~table['momo_id'].isin(momo_rows.loc[recompute, 'id']) & table['momo_id'].isin(momo_rows['id'])]]
+
+    if recompute.any():
+        rows = momo_rows[recompute]
+        parts.append(compute_neighbor_table(
+            rows['id'].to_numpy(), embed_momo_rows(model, rows), pchome_ids, pchome_matrix, top_k=NEIGHBOR_TOP_K
+        ))
+    new_pchome = np.flatnonzero(np.isin(pchome_ids, np.asarray(pchome_delta_ids, dtype=np.int64)))
+    old_momo = momo_rows[~recompute]
+    if len(new_pchome) and not old_momo.empty:
+        # 既有 MOMO 商品的向量來自向量快取，不需重新推論
+        parts.append(compute_neighbor_table(
+            old_momo['id'].to_numpy(), embed_momo_rows(model, old_momo), pchome_ids[new_pchome],
+            pchome_matrix[new_pchome], top_k=NEIGHBOR_TOP_K
+        ))
+
+    store.save(
+        query, merge_neighbor_tables(parts, NEIGHBOR_TOP_K),
+        neighbor_table_meta(model, catalog_digest(momo_rows), pchome_catalog_digest(pchome_df))
+    )
+    return True
+
+def propagate_pchome_delta(model, momo_df, pchome_df, scraped_query, pchome_delta_ids, previous_pchome_digest):
+    """
+    爬蟲寫入 PChome 商品後，更新其他類別已儲存的鄰居表
+
+    鄰居來自整個 PChome 目錄，新寫入的商品可能成為任何類別的鄰居，而每個鄰居表都記錄整個目錄的雜湊；
+    只更新被爬取的類別會讓其他類別的鄰居表全部過期。這裡對其他類別做「MOMO 商品 x 這次寫入的 PChome 商品」的
+    增量合併（MOMO 向量來自向量快取）。寫入前就已過期的鄰居表不在這裡重建，查詢時改走 ANN 搜尋。
+
+    Returns:
+        int: 更新的鄰居表數量
+    """
+    if not len(pchome_delta_ids) or momo_df.empty:
+        return 0
+    updated = 0
+    for query in get_neighbor_store().queries():
+        if query == scraped_query:
+            continue
+        # 這次只寫入 scraped_query 的 MOMO 商品，其他類別的 MOMO 商品沒有變動
+        momo_digest = catalog_digest(momo_df[momo_df['query'] == query])
+        updated += update_neighbor_table(
+            model, momo_df, pchome_df, query, [], pchome_delta_ids, (momo_digest, previous_pchome_digest),
+            rebuild=False
+        )
+    return updated
+
+gemini_verifier = get_gemini_verifier(GEMINI_API_KEY)
+
+def verify_candidates_concurrently(momo_title, candidates):
+    """
+    同時驗證第一階段的候選商品
+
+    Args:
+        momo_title (str): MOMO 商品標題
+        candidates (pd.DataFrame): 第一階段候選（需有 title、similarity 欄位）
+
+    Yields:
+        tuple: (候選在 candidates 中的位置, 驗證結果)，依完成順序回傳
+    """
+    pairs = list(zip(candidates['title'].tolist(), candidates['similarity'].tolist()))
+    yield from gemini_verifier.verify_many(momo_title, pairs)
+
+def render_gemini_stats(container):
+    """顯示 Gemini 呼叫的累計統計（次數、token、費用、延遲）"""
+    stats = gemini_verifier.stats()
+    slowest = stats['slowest']
+    slowest_text = f"{slowest['latency']:.2f} 秒（{slowest['kind']}）" if slowest else "—"
+    container.markdown(
+        f"**📈 AI 使用統計**（{gemini_verifier.model_name}）  \n"
+        f"呼叫 {stats['calls']} 次｜失敗 {stats['errors']} 次｜快取命中 {stats['cache_hits']} 次  \n"
+        f"Token：輸入 {stats['input_tokens']:,}／輸出 {stats['output_tokens']:,}  \n"
+        f"估計費用：US$ {stats['cost']:.4f}  \n"
+        f"平均延遲 {stats['avg_latency']:.2f} 秒｜最慢 {slowest_text}"
+    )
+
+def render_match_card(container, row, result=None):
+    """在指定容器中顯示 PChome 候選商品卡片；result 為 None 時顯示比對中狀態"""
+    if result is None:
+        card_style = "border-left: 6px solid #a0aec0; background: #f7fafc;" # Gray pending
+        icon = "⏳ 比對中..."
+        text_color = "#718096"
+        reasoning = "AI 正在判斷是否為相同商品..."
+    elif result.get('is_match'):
+        card_style = "border-left: 6px solid #48bb78; background: #f0fff4;" # Green match
+        icon = "✅ 配對成功 (MATCH)"
+        text_color = "#2f855a"
+        reasoning = result.get('reasoning', '無詳細理由')
+    else:
+        card_style = "border-left: 6px solid #f56565; background: #fff5f5;" # Red mismatch
+        icon = "❌ 未配對 (Mismatch)"
+        text_color = "#c53030"
+        reasoning = result.get('reasoning', '無詳細理由')
+
+    # 結果卡片渲染
+    container.markdown(f"""
+    <div class="product-card" style="{card_style} padding: 20px; display: flex; align-items: start; gap: 20px; margin-bottom: 15px;">
+        <div style="width: 120px; flex-shrink: 0; text-align: center;">
+            <div class="badge badge-pchome" style="margin-bottom: 5px;">PChome</div>
+            <img src="{row.get('image', '')}" style="width: 100%; border-radius: 4px; object-fit: contain;" onerror="this.src='https://via.placeholder.com/100'">
+        </div>
+        <div style="flex-grow: 1;">
+            <div style="display: flex; justify-content: space-between; align-items: start;">
+                <h4 style="margin: 0; font-size: 1.1rem; color: #2d3748;">{row['title']}</h4>
+                <span style="font-weight: bold; color: {text_color}; white-space: nowrap; margin-left: 10px;">{icon}</span>
+            </div>
+            <div style="margin-top: 8px; display: flex; gap: 15px; font-size: 0.9rem; color: #4a5568;">
+                <span>💰 <strong>NT$ {row.get('price', 'N/A')}</strong></span>
+                <span>📊 相似度: {row['similarity']:.4f}</span>
+            </div>
+            <div class="ai-reasoning-box">
+                <strong>💡 判斷理由：</strong>{reasoning}
+            </div>
+            <div style="margin-top: 8px; text-align: right;">
+                <a href="{row.get('url', '#')}" target="_blank" style="color: #3182ce; text-decoration: none; font-size: 0.85rem;">查看商品詳情 &rarr;</a>
+            </div>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
 
 # ============= 初始化 Session State =============
 if 'momo_df' not in st.session_state:
-    st.session_state.momo_df, st.session_state.pchome_df = load_local_data()
+    st.session_state.momo_df, st.session_state.pchome_df = load_catalog()
+    sync_title_block_index(st.session_state.pchome_df)
 if 'scraping_done' not in st.session_state:
     st.session_state.scraping_done = False
 
+# 在背景載入模型（整個程序只啟動一次），頁面不等待模型即可顯示
+model_loader = get_model_loader()
+
 # ============= 搜尋商品 Dialog 函數 =============
 @st.dialog("🔍 搜尋商品", width="large")
 def search_products_dialog():
@@ -436,51 +1028,115 @@ def search_products_dialog():
         else:
             st.markdown("---")
             
-            # MOMO 爬蟲
-            st.markdown("#### 📦 正在 MOMO 購物網搜尋商品...")
-            momo_progress_bar = st.progress(0)
-            momo_status = st.empty()
+            # 兩個網站互不相依，同時在背景執行緒爬取；
+            # 背景執行緒不能直接操作 Streamlit 元件，進度透過佇列交回主執行緒更新
+            col_momo, col_pchome = st.columns(2)
+            with col_momo:
+                st.markdown("#### 📦 MOMO 購物網")
+                momo_progress_bar = st.progress(0)
+                momo_status = st.empty()
+            with col_pchome:
+                st.markdown("#### 📦 PChome 購物網")
+                pchome_progress_bar = st.progress(0)
+                pchome_status = st.empty()
             
-            def momo_callback(current, total, message):
-                progress = min(current / total, 1.0)
-                momo_progress_bar.progress(progress)
-                momo_status.info(message)
-            
-            with st.spinner("在 MOMO 搜尋中，請稍候..."):
-                momo_products = fetch_products_for_momo(keyword, max_products, momo_callback)
-                save_to_csv(momo_products, "momo.csv", english_keyword, append_mode=append_mode)
-            
-            if momo_products:
-                st.success(f"✅ MOMO: 找到 {len(momo_products)} 件商品")
-            else:
-                st.warning("⚠️ MOMO: 沒有找到相關商品")
+            progress_widgets = {
+                'momo': (momo_progress_bar, momo_status),
+                'pchome': (pchome_progress_bar, pchome_status),
+            }
+            progress_queue = queue.Queue()
             
-            st.markdown("---")
+            def make_callback(platform):
+                def callback(current, total, message):
+                    progress_queue.put((platform, current, total, message))
+                return callback
             
-            # PChome 爬蟲
-            st.markdown("#### 📦 正在 PChome 購物網搜尋商品...")
-            pchome_progress_bar = st.progress(0)
-            pchome_status = st.empty()
+            def drain_progress():
+                while True:
+                    try:
+                        platform, current, total, message = progress_queue.get_nowait()
+                    except queue.Empty:
+                        return
+                    progress_bar, status = progress_widgets[platform]
+                    progress_bar.progress(min(current / total, 1.0))
+                    status.info(message)
             
-            def pchome_callback(current, total, message):
-                progress = min(current / total, 1.0)
-                pchome_progress_bar.progress(progress)
-                pchome_status.info(message)
+            # 追加模式下略過此類別已存檔的 SKU，重新搜尋時只抓新商品；
+            # SQLite 目錄會以重新抓到的資料更新同一 SKU 的價格與標題，因此不略過（CSV / Parquet 只能追加）
+            skip_known = append_mode and CATALOG_BACKEND != 'sqlite'
+            momo_known = get_known_skus('momo', english_keyword) if skip_known else None
+            pchome_known = get_known_skus('pchome', english_keyword) if skip_known else None
             
-            with st.spinner("在 PChome 搜尋中，請稍候..."):
-                pchome_products = fetch_products_for_pchome(keyword, max_products, pchome_callback)
-                save_to_csv(pchome_products, "pchome.csv", english_keyword, append_mode=append_mode)
+            with st.spinner("正在同時搜尋 MOMO 與 PChome，請稍候..."):
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    momo_future = executor.submit(
+                        fetch_products_for_momo, keyword, max_products, make_callback('momo'), known_skus=momo_known
+                    )
+                    pchome_future = executor.submit(
+                        fetch_products_for_pchome, keyword, max_products, make_callback('pchome'), known_skus=pchome_known
+                    )
+                    while not (momo_future.done() and pchome_future.done()):
+                        drain_progress()
+                        time.sleep(0.2)
+                    drain_progress()
+                    momo_products = momo_future.result()
+                    pchome_products = pchome_future.result()
+                
+                momo_rows = save_products(momo_products, 'momo', english_keyword, append_mode=append_mode)
+                pchome_rows = save_products(pchome_products, 'pchome', english_keyword, append_mode=append_mode)
+                # 已存檔，下次搜尋同一關鍵字時不再從檢查點繼續
+                clear_scrape_checkpoint('momo', keyword)
+                clear_scrape_checkpoint('pchome', keyword)
             
-            if pchome_products:
-                st.success(f"✅ PChome: 找到 {len(pchome_products)} 件商品")
-            else:
-                st.warning("⚠️ PChome: 沒有找到相關商品")
+            with col_momo:
+                if momo_products:
+                    st.success(f"✅ MOMO: 找到 {len(momo_products)} 件商品")
+                elif momo_known:
+                    st.info(f"ℹ️ MOMO: 沒有新商品（已略過 {len(momo_known)} 件已存檔的商品）")
+                else:
+                    st.warning("⚠️ MOMO: 沒有找到相關商品")
+            with col_pchome:
+                if pchome_products:
+                    st.success(f"✅ PChome: 找到 {len(pchome_products)} 件商品")
+                elif pchome_known:
+                    st.info(f"ℹ️ PChome: 沒有新商品（已略過 {len(pchome_known)} 件已存檔的商品）")
+                else:
+                    st.warning("⚠️ PChome: 沒有找到相關商品")
             
             st.markdown("---")
+
+            # 寫入前的目錄雜湊：鄰居表與其一致時才能增量更新
+            previous_digests = (
+                catalog_digest(st.session_state.momo_df[st.session_state.momo_df['query'] == english_keyword])
+                if not st.session_state.momo_df.empty else catalog_digest(None),
+                pchome_catalog_digest(st.session_state.pchome_df),
+            )
+
+            # 只將這次寫入的商品併入已載入的目錄，不重新讀取整個目錄
+            st.session_state.momo_df, st.session_state.pchome_df = refresh_catalog(
+                momo_rows, pchome_rows, append_mode=append_mode
+            )
+            sync_title_block_index(st.session_state.pchome_df)
             
-            # 重新載入資料
-            st.cache_data.clear()
-            st.session_state.momo_df, st.session_state.pchome_df = load_local_data()
+            # 為新寫入的 PChome 商品建立向量（只編碼新增的列），並以新增的商品增量更新該類別的鄰居表
+            if momo_rows or pchome_rows:
+                with st.spinner("正在建立商品向量與比對表..."):
+                    model = load_model()
+                    if model is not None:
+                        if pchome_rows:
+                            index_pchome_rows(model, pd.DataFrame(pchome_rows), refresh=True)
+                        if not append_mode and not st.session_state.pchome_df.empty:
+                            # 覆蓋模式：目錄已被取代，一併移除索引中已不存在的商品
+                            prune_ann_index(st.session_state.pchome_df)
+                        pchome_ids = [row['id'] for row in pchome_rows]
+                        update_neighbor_table(
+                            model, st.session_state.momo_df, st.session_state.pchome_df, english_keyword,
+                            [row['id'] for row in momo_rows], pchome_ids, previous_digests
+                        )
+                        propagate_pchome_delta(
+                            model, st.session_state.momo_df, st.session_state.pchome_df, english_keyword,
+                            pchome_ids, previous_digests[1]
+                        )
             
             if not st.session_state.momo_df.empty or not st.session_state.pchome_df.empty:
                 st.success("✅ 搜尋完成！正在重新載入頁面...")
@@ -496,10 +1152,14 @@ with col_header_1:
     st.markdown("# 🛒 購物比價小幫手")
     st.markdown("### 幫您在 MOMO 和 PChome 找到相同商品")
 with col_header_2:
-    st.markdown("""
+    if model_loader.failed:
+        status_color, status_text = ("#e53e3e", "模型載入失敗，比對時重試")
+    else:
+        status_color, status_text = ("#48bb78", "運作中") if model_loader.ready else ("#ed8936", "模型載入中")
+    st.markdown(f"""
     <div style="text-align: right; color: #718096;">
         <small>系統狀態</small><br>
-        <span style="color: #48bb78; font-weight: bold;">● 運作中</span>
+        <span style="color: {status_color}; font-weight: bold;">● {status_text}</span>
     </div>
     """, unsafe_allow_html=True)
 
@@ -521,18 +1181,6 @@ if momo_df.empty:
     
     st.stop()
 
-# 載入資源
-with st.spinner("系統準備中，請稍候..."):
-    model = load_model(
-        local_path=MODEL_PATH, 
-        hf_model_name=HUGGINGFACE_MODEL_NAME,
-        gdrive_url=GDRIVE_MODEL_URL
-    )
-
-if model is None:
-    st.error("❌ 無法載入模型，請檢查設定或網路連線")
-    st.stop()
-
 # ============= 側邊欄設計 =============
 with st.sidebar:
     st.image("https://cdn-icons-png.flaticon.com/512/2331/2331966.png", width=60)
@@ -565,7 +1213,6 @@ with st.sidebar:
     
     # 篩選該類別的 Momo 商品
     momo_products_in_query = momo_df[momo_df['query'] == selected_query].reset_index(drop=True)
-    pchome_candidates_pool = pchome_df[pchome_df['query'] == selected_query].reset_index(drop=True)
     
     if momo_products_in_query.empty:
         st.warning("這個類別沒有商品")
@@ -576,6 +1223,27 @@ with st.sidebar:
     # 固定相似度門檻為 0.739465
     threshold = 0.739465
     st.info(f"🎯 比對精準度：{threshold:.2%}")
+    
+    # 批次比對：預先計算整個類別的比對表，之後選擇商品時直接查表
+    if st.button("⚡ 預先比對此類別", use_container_width=True, help="一次計算此類別所有商品的相似商品，之後選擇商品時不需重新計算"):
+        model = require_model()
+        with st.spinner("正在批次比對此類別..."):
+            if build_neighbor_table(model, momo_df, pchome_df, selected_query):
+                st.success("✅ 批次比對完成")
+            else:
+                st.warning("此類別缺少 MOMO 或 PChome 商品，無法批次比對")
+    
+    if st.button("🗑️ 清除 AI 判斷快取", use_container_width=True, help="清除後所有商品組合會重新交由 Gemini 判斷"):
+        gemini_verifier.verdict_cache.clear()
+        st.session_state.last_matched_product = None
+        st.success("✅ 已清除 AI 判斷快取")
+    
+    st.markdown("---")
+    gemini_stats_box = st.empty()
+    render_gemini_stats(gemini_stats_box)
+    
+    with st.expander("⏱️ 啟動計時"):
+        st.text(get_startup_timer().report())
 
 # ============= 主內容區 =============
 
@@ -647,42 +1315,69 @@ with col_main_right:
     should_auto_match = (st.session_state.last_matched_product != current_product_id)
     
     if should_auto_match:
+        # 只有比對需要模型，尚未載入完成時在這裡等待
+        model = require_model()
         # 自動開始比對
         st.session_state.last_matched_product = current_product_id
         
-        # 準備資料
-        pchome_candidates = pchome_candidates_pool.copy()
-        if len(pchome_candidates) > 100:
-            pchome_candidates = pchome_candidates.head(100)
-
         # 進度容器
         with st.container():
             # Stage 1
             progress_text = "第一階段：快速篩選相似商品..."
             my_bar = st.progress(0, text=progress_text)
             
-            # 計算 Embedding
-            momo_text = prepare_text(selected_momo_row['title'], 'momo')
-            pchome_texts = [prepare_text(row['title'], 'pchome') for _, row in pchome_candidates.iterrows()]
+            # 優先查詢批次比對產生的鄰居表（O(1) 查表，不需模型推論）
+            neighbors = get_neighbor_store().lookup(
+                selected_query,
+                selected_momo_row['id'],
+                neighbor_table_meta(model, catalog_digest(momo_products_in_query), pchome_catalog_digest(pchome_df))
+            )
             
-            # 模擬進度條動畫效果
-            my_bar.progress(20, text="正在分析商品特徵...")
-            momo_emb = get_single_embedding(model, momo_text)
-            pchome_embs = get_batch_embeddings(model, pchome_texts)
+            # 以品牌 / 型號 / 容量找出候選區塊（索引已在載入目錄時同步），只對區塊內的商品計算相似度並送交 Gemini
+            block_ids = None
+            if TITLE_BLOCKING:
+                block_ids, _ = get_title_block_index().candidates(selected_momo_row['title'])
             
-            my_bar.progress(60, text="正在比對商品相似度...")
-            momo_emb = torch.nn.functional.normalize(momo_emb, p=2, dim=1)
-            pchome_embs = torch.nn.functional.normalize(pchome_embs, p=2, dim=1)
-            similarities = torch.mm(momo_emb, pchome_embs.T).numpy().flatten()
+            hits = {}
+            if neighbors is not None:
+                my_bar.progress(60, text="正在讀取預先比對結果...")
+                hits = {pchome_id: similarity for pchome_id, similarity in neighbors if similarity >= threshold}
+                if block_ids is not None:
+                    # 區塊內沒有任何鄰居時保留整個鄰居表的結果，不因分區漏掉相同商品
+                    hits = {pchome_id: similarity for pchome_id, similarity in hits.items() if pchome_id in block_ids} or hits
+            elif block_ids is not None:
+                my_bar.progress(20, text=f"正在分析商品特徵（依品牌與型號縮小至 {len(block_ids)} 件候選）...")
+                momo_vec = normalize_rows(get_single_embedding(model, prepare_text(selected_momo_row['title'], 'momo')))[0]
+                
+                my_bar.progress(60, text="正在比對商品相似度...")
+                hits = search_title_block(ensure_ann_index(model, pchome_df), momo_vec, block_ids, threshold)
             
-            pchome_candidates['similarity'] = similarities
-            stage1_matches = pchome_candidates[pchome_candidates['similarity'] >= threshold].sort_values(by='similarity', ascending=False)
+            if neighbors is None and not hits:
+                # 沒有分區，或區塊內沒有超過門檻的商品時，改以全目錄 ANN 索引搜尋
+                # 計算 Embedding（PChome 向量來自全目錄 ANN 索引，不限類別與筆數）
+                momo_text = prepare_text(selected_momo_row['title'], 'momo')
+                
+                # 模擬進度條動畫效果
+                my_bar.progress(20, text="正在分析商品特徵...")
+                momo_vec = normalize_rows(get_single_embedding(model, momo_text))[0]
+                ann_index = ensure_ann_index(model, pchome_df)
+                
+                my_bar.progress(60, text="正在比對商品相似度...")
+                hits = dict(ann_index.search(momo_vec, top_k=ANN_TOP_K, threshold=threshold))
+            
+            if hits:
+                stage1_matches = pchome_df[pchome_df['id'].isin(list(hits))].copy()
+                stage1_matches['similarity'] = stage1_matches['id'].map(hits)
+                stage1_matches = stage1_matches.sort_values(by='similarity', ascending=False)
+            else:
+                stage1_matches = pd.DataFrame()
             
             my_bar.progress(100, text="第一階段完成！")
             time.sleep(0.5)
             my_bar.empty()
 
         # 顯示結果區
+        verified_count = 0
         if stage1_matches.empty:
             st.warning("⚠️ 第一階段沒有找到相似的商品。")
         else:
@@ -694,53 +1389,23 @@ with col_main_right:
             </div>
             """, unsafe_allow_html=True)
 
-            # Stage 2 Loop
-            verified_count = 0
+            # Stage 2：同時送出多個驗證請求，結果依相似度順序填入預留的位置
             overall_progress = st.progress(0, text="第二階段：仔細比對每件商品...")
+            candidate_rows = [row for _, row in candidates_to_verify.iterrows()]
+            slots = [st.empty() for _ in candidate_rows]
+            for slot, row in zip(slots, candidate_rows):
+                render_match_card(slot, row)
             
-            for i, (_, row) in enumerate(candidates_to_verify.iterrows()):
-                overall_progress.progress((i + 1) / len(candidates_to_verify), text=f"🤖 正在詳細比對商品 ({i+1}/{len(candidates_to_verify)})...")
-                
-                result = gemini_verify_match(selected_momo_row['title'], row['title'], row['similarity'])
-
-                # 根據結果顯示不同樣式
+            for done, (position, result) in enumerate(
+                verify_candidates_concurrently(selected_momo_row['title'], candidates_to_verify), start=1
+            ):
+                overall_progress.progress(done / len(candidate_rows), text=f"🤖 正在詳細比對商品 ({done}/{len(candidate_rows)})...")
                 if result.get('is_match'):
                     verified_count += 1
-                    card_style = "border-left: 6px solid #48bb78; background: #f0fff4;" # Green match
-                    icon = "✅ 配對成功 (MATCH)"
-                    text_color = "#2f855a"
-                else:
-                    card_style = "border-left: 6px solid #f56565; background: #fff5f5;" # Red mismatch
-                    icon = "❌ 未配對 (Mismatch)"
-                    text_color = "#c53030"
-
-                # 結果卡片渲染
-                st.markdown(f"""
-                <div class="product-card" style="{card_style} padding: 20px; display: flex; align-items: start; gap: 20px; margin-bottom: 15px;">
-                    <div style="width: 120px; flex-shrink: 0; text-align: center;">
-                        <div class="badge badge-pchome" style="margin-bottom: 5px;">PChome</div>
-                        <img src="{row.get('image', '')}" style="width: 100%; border-radius: 4px; object-fit: contain;" onerror="this.src='https://via.placeholder.com/100'">
-                    </div>
-                    <div style="flex-grow: 1;">
-                        <div style="display: flex; justify-content: space-between; align-items: start;">
-                            <h4 style="margin: 0; font-size: 1.1rem; color: #2d3748;">{row['title']}</h4>
-                            <span style="font-weight: bold; color: {text_color}; white-space: nowrap; margin-left: 10px;">{icon}</span>
-                        </div>
-                        <div style="margin-top: 8px; display: flex; gap: 15px; font-size: 0.9rem; color: #4a5568;">
-                            <span>💰 <strong>NT$ {row.get('price', 'N/A')}</strong></span>
-                            <span>📊 相似度: {row['similarity']:.4f}</span>
-                        </div>
-                        <div class="ai-reasoning-box">
-                            <strong>💡 判斷理由：</strong>{result.get('reasoning', '無詳細理由')}
-                        </div>
-                        <div style="margin-top: 8px; text-align: right;">
-                            <a href="{row.get('url', '#')}" target="_blank" style="color: #3182ce; text-decoration: none; font-size: 0.85rem;">查看商品詳情 &rarr;</a>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+                render_match_card(slots[position], candidate_rows[position], result)
             
             overall_progress.empty()
+            render_gemini_stats(gemini_stats_box)
 
         if verified_count == 0:
             st.info("👀 已檢查所有商品，但沒有找到完全相同的商品。")
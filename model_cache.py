@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只能在同一個程序內互斥
+    fcntl = None
+
+
+MANIFEST_NAME = '.manifest.json'
+
+# 這個程序中已重新計算 sha256 確認過的模型目錄，之後的查詢只檢查檔案大小
+_verified_objects = set()
+_verified_lock = threading.Lock()
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def directory_manifest(root):
+    """
+    目錄內每個檔案的相對路徑、大小與 sha256（略過 huggingface_hub 的 .cache 目錄與 manifest 本身）
+
+    Returns:
+        dict: 相對路徑 -> {'size': int, 'sha256': str}
+    """
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != '.cache')
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+            if rel_path == MANIFEST_NAME:
+                continue
+            manifest[rel_path] = {'size': os.path.getsize(path), 'sha256': sha256_file(path)}
+    return manifest
+
+
+def manifest_digest(manifest):
+    """整個目錄內容的雜湊（檔案路徑與各檔案 sha256 組成）"""
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ModelArtifactCache:
+    """
+    以內容雜湊定址的本地模型快取
+
+        root/objects/<sha256>/        解壓縮後的模型目錄（含 .manifest.json）
+        root/sources/<來源雜湊>.json   來源（Google Drive 連結、Hugging Face 模型名稱）-> sha256
+        root/locks/<來源雜湊>.lock     下載時的檔案鎖
+
+    - 壓縮檔以檔案本身的 sha256 定址，目錄以所有檔案的 sha256 定址；可與預期的 checksum 比對
+    - 下載與解壓縮都在暫存目錄完成，最後以 rename 一次放到位，其他程序不會讀到一半的模型
+    - 以檔案鎖確保同一個來源只有一個 worker 下載，其他 worker 等待後直接使用結果
+    - 讀取時檢查檔案大小是否與安裝時的 manifest 一致；每個程序第一次使用時另外重新計算 sha256，
+      與 manifest 及定址的雜湊比對，不一致時重新下載
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._objects_dir = os.path.join(root_dir, 'objects')
+        self._sources_dir = os.path.join(root_dir, 'sources')
+        self._locks_dir = os.path.join(root_dir, 'locks')
+        self._tmp_dir = os.path.join(root_dir, 'tmp')
+        self._thread_lock = threading.Lock()
+        for path in (self._objects_dir, self._sources_dir, self._locks_dir, self._tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def _source_key(self, source):
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    def _object_dir(self, digest):
+        return os.path.join(self._objects_dir, digest)
+
+    @contextmanager
+    def _locked(self, source):
+        """同一個來源的下載在程序內以 threading.Lock、跨程序以 fcntl 檔案鎖互斥"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            lock_path = os.path.join(self._locks_dir, self._source_key(source) + '.lock')
+            with open(lock_path, 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _check_object(self, digest):
+        """
+        模型目錄存在且每個檔案大小與 manifest 相同；這個程序第一次檢查時另外重新計算每個檔案的 sha256
+
+        壓縮檔安裝的目錄以壓縮檔的 sha256 定址，無法從解壓縮後的檔案重算，因此比對的是 manifest 中各檔案的 sha256。
+        """
+        object_dir = self._object_dir(digest)
+        manifest_path = os.path.join(object_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return False
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            manifest = stored['files']
+        except (OSError, ValueError, KeyError):
+            return False
+        if stored.get('sha256') != digest:
+            return False
+        for rel_path, info in manifest.items():
+            path = os.path.join(object_dir, rel_path)
+            if not os.path.exists(path) or os.path.getsize(path) != info['size']:
+                return False
+
+        with _verified_lock:
+            if object_dir in _verified_objects:
+                return True
+        current = directory_manifest(object_dir)
+        if current != manifest:
+            return False
+        with _verified_lock:
+            _verified_objects.add(object_dir)
+        return True
+
+    def lookup(self, source):
+        """
+        查詢某個來源是否已在快取中
+
+        Returns:
+            str | None: 模型目錄路徑；不在快取、檔案不完整或內容與 sha256 不符時回傳 None
+        """
+        index_path = os.path.join(self._sources_dir, self._source_key(source) + '.json')
+        if not os.path.exists(index_path):
+            return None
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                digest = json.load(f)['sha256']
+        except (OSError, ValueError, KeyError):
+            return None
+        if not self._check_object(digest):
+            print(f"⚠️ 快取中的模型檔案不完整或已損毀，將重新下載: {source}")
+            return None
+        return self._object_dir(digest)
+
+    def resolve(self, source, fetch_fn, expected_sha256=None):
+        """
+        取得某個來源的模型目錄：在快取中就直接回傳，否則呼叫 fetch_fn 下載並安裝
+
+        Args:
+            source (str): 來源識別（例如 "gdrive:<連結>"、"hf:<模型名稱>"）
+            fetch_fn (function): 接收暫存目錄，下載後回傳 .zip 檔或模型目錄的路徑（需在暫存目錄內）
+            expected_sha256 (str): 預期的 sha256（壓縮檔本身，或目錄的 manifest 雜湊），None 表示不比對
+
+        Returns:
+            str: 模型目錄路徑
+        """
+        path = self.lookup(source)
+        if path is not None:
+            return path
+
+        with self._locked(source):
+            # 等待鎖的期間其他 worker 可能已經下載完成
+            path = self.lookup(source)
+            if path is not None:
+                return path
+
+            staging_dir = os.path.join(self._tmp_dir, uuid.uuid4().hex)
+            os.makedirs(staging_dir)
+            try:
+                start = time.monotonic()
+                fetched = fetch_fn(staging_dir)
+                digest = self._install(fetched, staging_dir, expected_sha256)
+                self._write_source(source, digest)
+                print(f"✅ 模型已存入快取（{digest[:12]}，{time.monotonic() - start:.1f}s）: {source}")
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            return self._object_dir(digest)
+
+    def _install(self, fetched, staging_dir, expected_sha256):
+        if os.path.isfile(fetched):
+            digest = sha256_file(fetched)
+            self._verify(digest, expected_sha256)
+            if self._check_object(digest):
+                return digest
+            model_dir = os.path.join(staging_dir, 'extracted')
+            with zipfile.ZipFile(fetched, 'r') as zip_ref:
+                zip_ref.extractall(model_dir)
+            model_dir = self._unwrap(model_dir)
+            manifest = directory_manifest(model_dir)
+        else:
+            model_dir = fetched
+            manifest = directory_manifest(model_dir)
+            digest = manifest_digest(manifest)
+            self._verify(digest, expected_sha256)
+            if self._check_object(digest):
+                return digest
+
+        with open(os.path.join(model_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump({'sha256': digest, 'files': manifest}, f)
+
+        object_dir = self._object_dir(digest)
+        if os.path.exists(object_dir):
+            # 之前安裝到一半留下的目錄
+            shutil.rmtree(object_dir)
+        os.replace(model_dir, object_dir)
+        with _verified_lock:
+            # 剛計算過 manifest，這個程序不必再重算
+            _verified_objects.add(object_dir)
+        return digest
+
+    @staticmethod
+    def _verify(digest, expected_sha256):
+        if expected_sha256 and digest.lower() != expected_sha256.strip().lower():
+            raise ValueError(f"模型 checksum 不符：預期 {expected_sha256}，實際 {digest}")
+
+    @staticmethod
+    def _unwrap(model_dir):
+        """壓縮檔內只有一個資料夾時，以該資料夾作為模型目錄"""
+        entries = [name for name in os.listdir(model_dir) if not name.startswith('__MACOSX')]
+        if len(entries) == 1 and os.path.isdir(os.path.join(model_dir, entries[0])):
+            return os.path.join(model_dir, entries[0])
+        return model_dir
+
+    def _write_source(self, source, digest):
+        index_path = os.path.join(self._sources_dir, self._source_key(source) + '.json')
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': source, 'sha256': digest, 'installed_at': time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 為選用套件，只有 CATALOG_BACKEND=parquet 時需要
+    pa = pq = None
+
+from catalog_store import CATALOG_COLUMNS
+
+
+# 比對頁面實際用到的欄位；讀取時只載入這些欄位
+APP_COLUMNS = ['id', 'sku', 'title', 'image', 'url', 'platform', 'price', 'query']
+# 以字典編碼讀取，轉成 pandas 後為 categorical，重複的字串只存一份
+CATEGORICAL_COLUMNS = ['title', 'query', 'platform']
+
+
+def _schema():
+    fields = []
+    for name in CATALOG_COLUMNS:
+        if name == 'id':
+            fields.append(pa.field(name, pa.int64()))
+        elif name == 'price':
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+class ParquetCatalog:
+    """
+    以 Parquet 欄式格式儲存的商品目錄，依 platform / query 分割目錄
+
+        root/platform=momo/query=dyson/part-<uuid>.parquet
+
+    - 新增商品時只寫入一個新的分割檔（O(batch)），不會重寫既有資料
+    - 讀取時依 platform / query 只開啟需要的目錄，並只載入需要的欄位
+    - 以 memory map 讀檔，標題、類別、平台轉成 categorical 降低常駐記憶體
+    """
+
+    def __init__(self, root_dir):
+        if pa is None:
+            raise ImportError("Parquet 目錄需要 pyarrow，請執行 pip install pyarrow")
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        self._meta_path = os.path.join(root_dir, '_meta.json')
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _partition_dir(self, platform, query=None):
+        path = os.path.join(self.root_dir, f"platform={quote(str(platform), safe='')}")
+        if query is not None:
+            path = os.path.join(path, f"query={quote(str(query), safe='')}")
+        return path
+
+    def _read_meta(self):
+        if not os.path.exists(self._meta_path):
+            return {}
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def queries(self, platform):
+        """某平台已有的類別"""
+        platform_dir = self._partition_dir(platform)
+        if not os.path.isdir(platform_dir):
+            return []
+        return sorted(
+            unquote(name.split('=', 1)[1]) for name in os.listdir(platform_dir) if name.startswith('query=')
+        )
+
+    def _files(self, platform, query=None):
+        queries = [query] if query is not None else self.queries(platform)
+        files = []
+        for q in queries:
+            partition = self._partition_dir(platform, q)
+            if os.path.isdir(partition):
+                files.extend(
+                    os.path.join(partition, name) for name in sorted(os.listdir(partition)) if name.endswith('.parquet')
+                )
+        return files
+
+    def append_rows(self, platform, query_keyword, rows):
+        """
+        寫入已整理好的資料列（欄位同 CSV），成為該類別的一個新分割檔
+
+        Returns:
+            int: 寫入的筆數
+        """
+        if not rows:
+            return 0
+        df = pd.DataFrame(rows).reindex(columns=CATALOG_COLUMNS)
+        for name in CATALOG_COLUMNS:
+            if name == 'id':
+                df[name] = df[name].astype('int64')
+            elif name == 'price':
+                df[name] = pd.to_numeric(df[name], errors='coerce')
+            else:
+                df[name] = df[name].fillna('').astype(str)
+        table = pa.Table.from_pandas(df, schema=_schema(), preserve_index=False)
+
+        partition = self._partition_dir(platform, query_keyword)
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, f"part-{uuid.uuid4().hex}.parquet")
+        pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return len(df)
+
+    def append_products(self, platform, products, query_keyword):
+        """
+        寫入爬蟲抓到的商品（格式同 fetch_products_for_* 的回傳值），同類別已存在的 SKU 會被略過
+
+        Returns:
+            list: 實際寫入的資料列（欄位同 CSV，含 id）
+        """
+        if not products:
+            return []
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        with self._lock:
+            known = self.known_skus(platform, query_keyword)
+            meta = self._read_meta()
+            next_id = int(meta.get(platform, 0)) + 1
+            rows = []
+            for product in products:
+                sku = str(product.get('sku') or '')
+                if sku and sku in known:
+                    continue
+                if sku:
+                    known.add(sku)
+                rows.append({
+                    'id': next_id,
+                    'sku': sku,
+                    'title': product['title'],
+                    'image': product.get('image_url', '') or '',
+                    'url': product.get('url', '') or '',
+                    'platform': platform,
+                    'connect': '',
+                    'price': float(product['price']),
+                    'uncertainty_problem': '0',
+                    'query': query_keyword,
+                    'annotator': 'model_prediction',
+                    'created_at': now,
+                    'updated_at': now,
+                })
+                next_id += 1
+            if rows:
+                self.append_rows(platform, query_keyword, rows)
+                meta[platform] = next_id - 1
+                self._write_meta(meta)
+        print(f"✅ {platform} Parquet 目錄：新增 {len(rows)} 筆（類別 {query_keyword}）")
+        return rows
+
+    def load(self, platform, query_keyword=None, columns=APP_COLUMNS):
+        """
+        讀取商品目錄
+
+        Args:
+            platform (str): 平台名稱
+            query_keyword (str): 只讀取此類別的分割目錄，None 表示全部
+            columns (list): 要載入的欄位，None 表示全部
+
+        Returns:
+            pd.DataFrame: 依 id 排序；title / query / platform 為 categorical
+        """
+        columns = list(columns) if columns is not None else list(CATALOG_COLUMNS)
+        files = self._files(platform, query_keyword)
+        if not files:
+            return pd.DataFrame(columns=columns)
+
+        read_dictionary = [c for c in CATEGORICAL_COLUMNS if c in columns]
+        tables = [
+            pq.read_table(path, columns=columns, memory_map=True, read_dictionary=read_dictionary)
+            for path in files
+        ]
+        # 各分割檔的字典不同，合併後統一字典才能轉成單一 categorical
+        table = pa.concat_tables(tables).unify_dictionaries()
+        df = table.to_pandas(self_destruct=True, split_blocks=True)
+        if 'id' in df.columns:
+            df = df.sort_values('id', kind='stable').reset_index(drop=True)
+        return df
+
+    def known_skus(self, platform, query_keyword):
+        """某個類別已存在的 SKU（只讀取 sku 欄）"""
+        files = self._files(platform, query_keyword)
+        skus = set()
+        for path in files:
+            column = pq.read_table(path, columns=['sku'], memory_map=True).column('sku')
+            skus.update(s for s in column.to_pylist() if s)
+        return skus
+
+    def import_frame(self, df, platform):
+        """
+        匯入既有目錄（例如 momo.csv 讀成的 DataFrame），依類別各寫成一個分割檔
+
+        Returns:
+            int: 匯入的筆數
+        """
+        if df.empty:
+            return 0
+        df = df.reindex(columns=CATALOG_COLUMNS).copy()
+        df['platform'] = platform
+        df['id'] = pd.to_numeric(df['id'], errors='coerce')
+        df = df.dropna(subset=['id'])
+        if df.empty:
+            return 0
+        total = 0
+        with self._lock:
+            for query, rows in df.groupby('query', sort=False):
+                total += self.append_rows(platform, query, rows.to_dict('records'))
+            meta = self._read_meta()
+            meta[platform] = max(int(meta.get(platform, 0)), int(df['id'].max()))
+            self._write_meta(meta)
+        print(f"✅ 已匯入 {total} 筆 {platform} 商品至 Parquet 目錄")
+        return total
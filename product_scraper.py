@@ -7,12 +7,33 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import time
-import random
 from urllib.parse import quote
 import re
 import warnings
 import logging
 import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from webdriver_pool import get_pool
+from scrape_checkpoint import ScrapeCheckpoint
+from scrape_pacing import (
+    AdaptivePacer,
+    JobTimer,
+    robots_crawl_delay,
+    wait_for_network_idle,
+    wait_for_stable_count,
+    wait_for_staleness,
+)
+from request_blocking import (
+    DEFAULT_BLOCK_CATEGORIES,
+    apply_request_blocking,
+    count_blocked_requests,
+    enable_performance_log,
+    resolve_block_patterns,
+)
 
 # 在文件開頭添加這些行來抑制所有警告和日誌
 warnings.filterwarnings("ignore")
@@ -23,7 +44,610 @@ logging.getLogger('urllib3').setLevel(logging.CRITICAL)
 os.environ['WDM_LOG_LEVEL'] = '0'
 os.environ['WDM_PRINT_FIRST_LINE'] = 'False'
 
-def fetch_products_for_momo(keyword, max_products=50, progress_callback=None):
+# 先以 HTTP 直接抓取列表頁（不需瀏覽器），失敗時才改用 Selenium
+SCRAPER_HTTP_FIRST = os.getenv('SCRAPER_HTTP_FIRST', '1') == '1'
+SCRAPER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 瀏覽器池：重複使用溫熱的 Chrome，達到頁數或記憶體上限時回收
+SCRAPER_POOL_SIZE = int(os.getenv('SCRAPER_POOL_SIZE', '1'))
+SCRAPER_DRIVER_MAX_PAGES = int(os.getenv('SCRAPER_DRIVER_MAX_PAGES', '50'))
+SCRAPER_DRIVER_MAX_RSS_MB = float(os.getenv('SCRAPER_DRIVER_MAX_RSS_MB', '1500'))
+
+# 瀏覽器請求封鎖：以逗號分隔的類別（images, fonts, media, stylesheets, trackers）與額外 URL 規則
+SCRAPER_BLOCK_PATTERNS = resolve_block_patterns(
+    os.getenv('SCRAPER_BLOCK_CATEGORIES', DEFAULT_BLOCK_CATEGORIES),
+    os.getenv('SCRAPER_BLOCK_EXTRA_PATTERNS', ''),
+)
+
+# 請求間隔：依實際回應時間自動調整，限制在此範圍內（下限不低於 robots.txt 的 Crawl-delay）
+SCRAPER_MIN_DELAY = float(os.getenv('SCRAPER_MIN_DELAY', '1.0'))
+SCRAPER_MAX_DELAY = float(os.getenv('SCRAPER_MAX_DELAY', '8.0'))
+
+# 爬蟲檢查點：每頁寫入進度，中斷後重新執行同一關鍵字時從斷點繼續
+SCRAPER_CHECKPOINTS = os.getenv('SCRAPER_CHECKPOINTS', '1') == '1'
+SCRAPER_CHECKPOINT_DIR = os.getenv('SCRAPER_CHECKPOINT_DIR', os.path.join('cache', 'scrape_checkpoints'))
+SCRAPER_CHECKPOINT_TTL_HOURS = float(os.getenv('SCRAPER_CHECKPOINT_TTL_HOURS', '24'))
+
+# MOMO 搜尋頁 URL 與列表選擇器（Selenium 與 HTTP 兩種抓法共用）
+MOMO_SEARCH_URL = "https://www.momoshop.com.tw/search/searchShop.jsp?keyword={keyword}&searchType=1&cateLevel=0&ent=k&sortType=1&curPage={page}"
+MOMO_ITEM_SELECTORS = [
+    "li.listAreaLi",
+    ".listAreaUl li.listAreaLi",
+    "li.goodsItemLi",
+    ".prdListArea .goodsItemLi",
+    ".searchPrdListArea li",
+    "li[data-gtm]",
+    ".goodsItemLi",
+    ".searchPrdList li"
+]
+MOMO_TITLE_SELECTORS = [
+    "h3.prdName",
+    ".prdNameTitle h3.prdName",
+    ".prdName",
+    "h3",
+    "a[title]",
+    "img[alt]",
+    ".goodsName",
+    ".goodsInfo h3",
+    "a"
+]
+MOMO_PRICE_SELECTORS = [
+    ".money .price b",
+    ".price b",
+    ".money b",
+    ".price",
+    ".money",
+    ".cost",
+    "b",
+    "strong",
+    ".goodsPrice",
+    ".priceInfo",
+    ".prodPrice",
+    ".prdPrice"
+]
+MOMO_LINK_SELECTORS = ["a.goods-img-url", "a[href*='/goods/']", "a[href]"]
+
+# PChome 新版網頁的商品卡片
+PCHOME_ITEM_SELECTOR = "li.c-listInfoGrid__item--gridCardGray5"
+
+# PChome 搜尋 API（網頁列表背後的 JSON 端點）
+PCHOME_SEARCH_API = "https://ecshweb.pchome.com.tw/search/v4.3/all/results?q={keyword}&page={page}&pageCount=40"
+PCHOME_IMAGE_HOST = "https://img.pchome.com.tw/cs"
+
+
+def extract_max_price(text):
+    """從文字中取出最大的數字作為價格（避免取到折扣百分比等小數字），找不到回傳 0"""
+    numbers = re.findall(r'\d+', (text or '').replace(',', ''))
+    potential_prices = [int(num) for num in numbers if int(num) > 10]
+    return max(potential_prices) if potential_prices else 0
+
+
+def normalize_momo_url(url):
+    """將 MOMO 的相對連結補成完整網址"""
+    if url and not url.startswith("http"):
+        url = "https://www.momoshop.com.tw" + url
+    return url or ""
+
+
+def momo_sku_from_url(url):
+    """從 MOMO 商品連結提取 i_code，沒有時取網址最後一段"""
+    if not url:
+        return ""
+    match = re.search(r'i_code=(\d+)', url)
+    if match:
+        return match.group(1)
+    url_parts = url.rstrip('/').split('/')
+    last_part = url_parts[-1] if url_parts else ""
+    if '?' in last_part:
+        last_part = last_part.split('?')[0]
+    if '.' in last_part:
+        last_part = last_part.split('.')[0]
+    return last_part
+
+
+def normalize_momo_image_url(image_url):
+    """處理 MOMO 圖片的相對路徑和協議相對路徑"""
+    if not image_url:
+        return ""
+    if image_url.startswith("//"):
+        return "https:" + image_url
+    if image_url.startswith("/"):
+        return "https://www.momoshop.com.tw" + image_url
+    if not image_url.startswith("http"):
+        # 如果是相對路徑但不以 / 開頭，假設是 momoshop 的圖片
+        if "momoshop" not in image_url:
+            return "https://cdn3.momoshop.com.tw/momoshop/upload/media/" + image_url
+        return "https://" + image_url
+    return image_url
+
+
+# ============= 瀏覽器池 =============
+
+def _create_momo_driver():
+    """建立 MOMO 用的 headless Chrome"""
+    # 設定 Chrome 選項
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # 啟用無頭模式（雲端部署必需）
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--disable-software-rasterizer')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_argument('--disable-plugins')
+    chrome_options.add_argument('--disable-background-timer-throttling')
+    chrome_options.add_argument('--disable-backgrounding-occluded-windows')
+    chrome_options.add_argument('--disable-renderer-backgrounding')
+    chrome_options.add_argument('--disable-web-security')
+    chrome_options.add_argument('--disable-features=VizDisplayCompositor')
+    chrome_options.add_argument('--disable-ipc-flooding-protection')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument(f'--user-agent={SCRAPER_USER_AGENT}')
+    
+    # 禁用圖片載入以提高速度
+    prefs = {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2
+    }
+    chrome_options.add_experimental_option("prefs", prefs)
+    enable_performance_log(chrome_options)
+    
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(30)
+    apply_request_blocking(driver, SCRAPER_BLOCK_PATTERNS)
+    return driver
+
+
+def _create_pchome_driver():
+    """建立 PChome 用的 headless Chrome"""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # 啟用無頭模式（雲端部署必需）
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument(f'--user-agent={SCRAPER_USER_AGENT}')
+    
+    prefs = {"profile.default_content_setting_values.notifications": 2}
+    chrome_options.add_experimental_option("prefs", prefs)
+    enable_performance_log(chrome_options)
+    
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(40)
+    apply_request_blocking(driver, SCRAPER_BLOCK_PATTERNS)
+    return driver
+
+
+def get_driver_pool(platform):
+    """取得指定平台的共用瀏覽器池（兩個平台的 Chrome 設定不同，分開管理）"""
+    factory = _create_momo_driver if platform == 'momo' else _create_pchome_driver
+    return get_pool(
+        platform,
+        factory,
+        max_size=SCRAPER_POOL_SIZE,
+        max_pages=SCRAPER_DRIVER_MAX_PAGES,
+        max_rss_mb=SCRAPER_DRIVER_MAX_RSS_MB,
+    )
+
+
+# ============= 節流與計時 =============
+
+def start_scrape_job(label, *urls):
+    """
+    建立一次爬蟲工作的計時器與自適應節流器
+
+    Args:
+        label (str): 工作名稱
+        urls (str): 這次工作實際請求的網址（HTTP 與 Selenium 可能是不同主機），套用各主機 Crawl-delay 中最嚴格者
+    """
+    timer = JobTimer(label)
+    pacer = AdaptivePacer(SCRAPER_MIN_DELAY, SCRAPER_MAX_DELAY, timer=timer)
+    for url in urls:
+        pacer.respect_crawl_delay(robots_crawl_delay(url, get_http_session()))
+    return timer, pacer
+
+
+def record_blocked_requests(driver, timer, page):
+    """統計這一頁被封鎖的請求數並累計到 timer"""
+    blocked = count_blocked_requests(driver)
+    if blocked:
+        total = sum(blocked.values())
+        detail = '、'.join(f"{kind} {n}" for kind, n in sorted(blocked.items(), key=lambda x: -x[1]))
+        print(f"第 {page} 頁封鎖了 {total} 個請求（{detail}）")
+        timer.count('封鎖請求', total)
+
+
+def get_scrape_checkpoint(platform, keyword):
+    """取得某平台、某關鍵字的檢查點；停用檢查點時回傳 None"""
+    if not SCRAPER_CHECKPOINTS:
+        return None
+    return ScrapeCheckpoint(SCRAPER_CHECKPOINT_DIR, platform, keyword, SCRAPER_CHECKPOINT_TTL_HOURS * 3600)
+
+
+def clear_scrape_checkpoint(platform, keyword):
+    """商品已存檔後刪除檢查點，下次搜尋同一關鍵字時重新開始"""
+    checkpoint = get_scrape_checkpoint(platform, keyword)
+    if checkpoint is not None:
+        checkpoint.clear()
+
+
+def _resume_state(checkpoint, known_skus):
+    """從檢查點取回已收集的商品，並建立要略過的 SKU 集合（含先前已存檔的 SKU）"""
+    products = list(checkpoint.products) if checkpoint else []
+    seen_skus = {str(sku) for sku in (known_skus or ()) if sku}
+    seen_skus.update(p['sku'] for p in products if p.get('sku'))
+    return products, seen_skus
+
+
+def finish_scrape_job(timer, stats=None):
+    """印出等待與處理時間的比例，並寫入呼叫端提供的 stats"""
+    print(timer.report())
+    if stats is not None:
+        stats.update(timer.summary())
+
+
+# ============= HTTP 抓取（不需瀏覽器）=============
+
+_http_local = threading.local()
+
+
+def get_http_session():
+    """
+    取得目前執行緒的 HTTP session（連線池與重試設定共用）
+
+    MOMO 與 PChome 會在不同執行緒同時抓取，每個執行緒各自持有 session。
+    """
+    session = getattr(_http_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            'User-Agent': SCRAPER_USER_AGENT,
+            'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
+        })
+        _http_local.session = session
+    return session
+
+
+def _momo_product_from_fields(title, price, url, sku, image_url):
+    """整理 MOMO 商品欄位（補完整網址、從連結推得 SKU），缺少必要欄位時回傳 None"""
+    url = normalize_momo_url(url)
+    if not sku:
+        sku = momo_sku_from_url(url)
+    if not url and sku:
+        url = f"https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code={sku}"
+    if not (title and price > 0 and url):
+        return None
+    return {"title": title, "price": price, "image_url": normalize_momo_image_url(image_url), "url": url, "sku": sku}
+
+
+def parse_momo_listing_html(html):
+    """
+    解析 MOMO 搜尋列表頁 HTML
+
+    Args:
+        html (str): 搜尋頁 HTML
+
+    Returns:
+        tuple: (商品元素數量, 商品列表)；商品包含 title, price, image_url, url, sku
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    items = []
+    for selector in MOMO_ITEM_SELECTORS:
+        items = soup.select(selector)
+        if items:
+            break
+
+    products = []
+    for item in items:
+        title = ""
+        for selector in MOMO_TITLE_SELECTORS:
+            title_elem = item.select_one(selector)
+            if title_elem is None:
+                continue
+            if selector == "img[alt]":
+                title = (title_elem.get("alt") or "").strip()
+            elif selector == "a[title]":
+                title = (title_elem.get("title") or "").strip()
+            else:
+                title = title_elem.get_text(" ", strip=True)
+            if title and len(title) > 5:  # 確保標題有足夠長度
+                break
+        if not title:
+            continue
+
+        price = 0
+        for selector in MOMO_PRICE_SELECTORS:
+            for price_elem in item.select(selector):
+                price = extract_max_price(price_elem.get_text(" ", strip=True))
+                if price > 0:
+                    break
+            if price > 0:
+                break
+        if price <= 0:
+            price = extract_max_price(item.get_text(" ", strip=True))
+        if price <= 0:
+            continue
+
+        url = ""
+        for selector in MOMO_LINK_SELECTORS:
+            link_elem = item.select_one(selector)
+            if link_elem is not None and link_elem.get("href"):
+                url = link_elem.get("href")
+                break
+
+        sku = ""
+        input_elem = item.select_one("input#viewProdId")
+        if input_elem is not None and input_elem.get("value"):
+            sku = input_elem.get("value")
+
+        img_elem = item.select_one("img.prdImg") or item.select_one("img")
+        image_url = ""
+        if img_elem is not None:
+            image_url = img_elem.get("src") or img_elem.get("data-original") or img_elem.get("data-src")
+
+        product = _momo_product_from_fields(title, price, url, sku, image_url)
+        if product:
+            products.append(product)
+    return len(items), products
+
+
+# 在瀏覽器內一次解析整頁商品卡片（與 parse_momo_listing_html 相同的備援選擇器邏輯），
+# 取代每個欄位各一次的 find_element 往返；同時回傳各欄位實際命中的選擇器次數
+MOMO_EXTRACT_JS = """
+var items = document.querySelectorAll(arguments[0]);
+var sels = arguments[1];
+var hits = {title: {}, price: {}, link: {}};
+var cards = [];
+
+function hit(field, sel) { hits[field][sel] = (hits[field][sel] || 0) + 1; }
+function maxPrice(text) {
+    var nums = (text || '').replace(/,/g, '').match(/\\d+/g) || [];
+    var best = 0;
+    for (var n = 0; n < nums.length; n++) {
+        var value = parseInt(nums[n], 10);
+        if (value > 10 && value > best) best = value;
+    }
+    return best;
+}
+
+for (var i = 0; i < items.length; i++) {
+    try {
+        var item = items[i];
+        var title = '', titleSel = null;
+        for (var t = 0; t < sels.title.length; t++) {
+            var titleEl = item.querySelector(sels.title[t]);
+            if (!titleEl) continue;
+            if (sels.title[t] === 'img[alt]') title = (titleEl.getAttribute('alt') || '').trim();
+            else if (sels.title[t] === 'a[title]') title = (titleEl.getAttribute('title') || '').trim();
+            else title = (titleEl.innerText || '').trim();
+            if (title && title.length > 5) { titleSel = sels.title[t]; break; }
+        }
+        if (!title) continue;
+
+        var price = 0;
+        for (var p = 0; p < sels.price.length && price <= 0; p++) {
+            var priceEls = item.querySelectorAll(sels.price[p]);
+            for (var e = 0; e < priceEls.length; e++) {
+                var priceText = priceEls[e].innerText || '';
+                if (/\\d/.test(priceText)) {
+                    price = maxPrice(priceText);
+                    if (price > 0) { hit('price', sels.price[p]); break; }
+                }
+            }
+        }
+        if (price <= 0) price = maxPrice(item.innerText);
+        if (price <= 0) continue;
+
+        var url = '';
+        for (var l = 0; l < sels.link.length; l++) {
+            var linkEl = item.querySelector(sels.link[l]);
+            if (linkEl && linkEl.getAttribute('href')) { url = linkEl.href || linkEl.getAttribute('href'); hit('link', sels.link[l]); break; }
+        }
+
+        var skuEl = item.querySelector('input#viewProdId');
+        var img = item.querySelector('img.prdImg') || item.querySelector('img');
+        if (titleSel) hit('title', titleSel);
+        cards.push({
+            title: title,
+            price: price,
+            url: url,
+            sku: skuEl ? (skuEl.getAttribute('value') || '') : '',
+            image_url: img ? (img.src || img.getAttribute('data-original') || img.getAttribute('data-src') || '') : ''
+        });
+    } catch (err) {
+        continue;
+    }
+}
+return {count: items.length, cards: cards, hits: hits};
+"""
+
+# 各欄位最近一次最常命中的選擇器，下一頁（與下一次搜尋）優先嘗試
+_momo_selector_memo = {}
+
+
+def _memo_first(field, selectors):
+    """把上次命中的選擇器排到最前面，其餘維持原本的優先順序"""
+    best = _momo_selector_memo.get(field)
+    if best not in selectors:
+        return list(selectors)
+    return [best] + [s for s in selectors if s != best]
+
+
+def extract_momo_products(driver, item_selector):
+    """
+    以一次 execute_script 取出整頁 MOMO 商品
+
+    Args:
+        driver: Selenium WebDriver
+        item_selector (str): 商品卡片的 CSS 選擇器
+
+    Returns:
+        tuple: (商品元素數量, 商品列表)；商品包含 title, price, image_url, url, sku
+    """
+    result = driver.execute_script(MOMO_EXTRACT_JS, item_selector, {
+        'title': _memo_first('title', MOMO_TITLE_SELECTORS),
+        'price': _memo_first('price', MOMO_PRICE_SELECTORS),
+        'link': _memo_first('link', MOMO_LINK_SELECTORS),
+    }) or {}
+
+    for field, counts in (result.get('hits') or {}).items():
+        if counts:
+            _momo_selector_memo[field] = max(counts, key=counts.get)
+    _momo_selector_memo['item'] = item_selector
+
+    products = []
+    for card in result.get('cards') or []:
+        product = _momo_product_from_fields(
+            card.get('title', ''), int(card.get('price') or 0), card.get('url', ''),
+            card.get('sku', ''), card.get('image_url', '')
+        )
+        if product:
+            products.append(product)
+    return int(result.get('count') or 0), products
+
+
+def parse_pchome_search_json(payload):
+    """
+    解析 PChome 搜尋 API 的 JSON 回應（相容 v3 小寫與 v4 大寫欄位名稱）
+
+    Args:
+        payload (dict): API 回應
+
+    Returns:
+        tuple: (總頁數, 商品列表)；商品包含 title, price, image_url, url, sku
+    """
+    prods = payload.get('Prods') or payload.get('prods') or []
+    total_pages = int(payload.get('TotalPage') or payload.get('totalPage') or 0)
+
+    products = []
+    for prod in prods:
+        prod_id = str(prod.get('Id') or prod.get('id') or '')
+        # 商品 Id 可能帶規格後綴（例如 -000），與網頁連結的 SKU 對齊只保留前兩段
+        sku_match = re.match(r'^[A-Za-z0-9]+-[A-Za-z0-9]+', prod_id)
+        sku = sku_match.group(0) if sku_match else prod_id
+        title = str(prod.get('Name') or prod.get('name') or '').strip()
+        try:
+            price = int(float(prod.get('Price') or prod.get('price') or 0))
+        except (TypeError, ValueError):
+            price = 0
+        pic = prod.get('PicS') or prod.get('picS') or prod.get('PicB') or prod.get('picB') or ''
+        image_url = pic if pic.startswith('http') else (PCHOME_IMAGE_HOST + pic if pic else '')
+
+        if sku and title and price > 0:
+            products.append({
+                "title": title,
+                "price": price,
+                "image_url": image_url,
+                "url": f"https://24h.pchome.com.tw/prod/{sku}",
+                "sku": sku,
+            })
+    return total_pages, products
+
+
+def _collect_http_products(platform, label, fetch_page, max_products, progress_callback, pacer=None,
+                           checkpoint=None, known_skus=None, max_pages=20):
+    """
+    逐頁呼叫 fetch_page(page) -> (是否還有下一頁, 商品列表)，去除重複 SKU 並編號
+
+    有提供 pacer 時，頁與頁之間依回應時間節流，並把請求時間記為等待時間。
+    有提供 checkpoint 時從斷點的頁碼繼續，並在每頁結束後寫入進度；known_skus 中的商品會被略過。
+
+    Returns:
+        list: 商品資訊列表（格式與 Selenium 抓取結果相同）
+    """
+    products, seen_skus = _resume_state(checkpoint, known_skus)
+    start_page = checkpoint.start_page('http') if checkpoint else 1
+    for page in range(start_page, max_pages + 1):
+        if len(products) >= max_products:
+            break
+        if progress_callback:
+            progress_callback(len(products), max_products, f'📄 {label} 第 {page} 頁載入中... (已收集 {len(products)}/{max_products} 筆)')
+        if pacer is None:
+            has_more, page_products = fetch_page(page)
+        else:
+            if page > start_page:
+                pacer.pause()
+            load_start = time.monotonic()
+            with pacer.timer.waiting('頁面載入'):
+                has_more, page_products = fetch_page(page)
+            pacer.observe(time.monotonic() - load_start)
+            pacer.timer.pages += 1
+        for product in page_products:
+            if len(products) >= max_products:
+                break
+            if product['sku'] and product['sku'] in seen_skus:
+                continue
+            if product['sku']:
+                seen_skus.add(product['sku'])
+            products.append({"id": len(products) + 1, **product, "platform": platform})
+        if progress_callback:
+            progress_callback(len(products), max_products, f'📦 {label}: 已收集 {len(products)}/{max_products} 筆商品')
+        if checkpoint:
+            checkpoint.save('http', page + 1, products)
+        if len(products) >= max_products or not has_more or not page_products:
+            break
+    if checkpoint and products:
+        checkpoint.save('http', checkpoint.next_page, products, done=True)
+    return products
+
+
+def fetch_products_for_momo_http(keyword, max_products=50, progress_callback=None, pacer=None,
+                                 checkpoint=None, known_skus=None):
+    """
+    以 HTTP 直接抓取 MOMO 搜尋列表頁並解析（不啟動瀏覽器）
+
+    Returns:
+        list: 商品資訊列表；抓取或解析失敗時回傳空列表，由呼叫端改用 Selenium
+    """
+    session = get_http_session()
+
+    def fetch_page(page):
+        response = session.get(MOMO_SEARCH_URL.format(keyword=quote(keyword), page=page), timeout=15)
+        response.raise_for_status()
+        item_count, page_products = parse_momo_listing_html(response.text)
+        return item_count >= 5, page_products
+
+    try:
+        products = _collect_http_products(
+            'momo', 'MOMO', fetch_page, max_products, progress_callback, pacer, checkpoint, known_skus
+        )
+        print(f"MOMO HTTP 抓取取得 {len(products)} 個商品")
+        return products
+    except Exception as e:
+        print(f"MOMO HTTP 抓取失敗: {e}")
+        return []
+
+
+def fetch_products_for_pchome_http(keyword, max_products=50, progress_callback=None, pacer=None,
+                                   checkpoint=None, known_skus=None):
+    """
+    透過 PChome 搜尋 API 取得商品（不啟動瀏覽器）
+
+    Returns:
+        list: 商品資訊列表；失敗時回傳空列表，由呼叫端改用 Selenium
+    """
+    session = get_http_session()
+
+    def fetch_page(page):
+        response = session.get(PCHOME_SEARCH_API.format(keyword=quote(keyword), page=page), timeout=15)
+        response.raise_for_status()
+        total_pages, page_products = parse_pchome_search_json(response.json())
+        return page < total_pages, page_products
+
+    try:
+        products = _collect_http_products(
+            'pchome', 'PChome', fetch_page, max_products, progress_callback, pacer, checkpoint, known_skus
+        )
+        print(f"PChome HTTP 抓取取得 {len(products)} 個商品")
+        return products
+    except Exception as e:
+        print(f"PChome HTTP 抓取失敗: {e}")
+        return []
+
+def fetch_products_for_momo(keyword, max_products=50, progress_callback=None, stats=None, known_skus=None):
     """
     使用 Selenium 從 momo 購物網抓取商品資訊
     
@@ -31,61 +655,56 @@ def fetch_products_for_momo(keyword, max_products=50, progress_callback=None):
         keyword (str): 搜尋關鍵字
         max_products (int): 最大抓取商品數量
         progress_callback (function): 進度回調函式，接收 (current, total, message) 參數
+        stats (dict): 選用，結束時寫入等待與處理時間的統計（JobTimer.summary）
+        known_skus (set): 選用，先前已存檔的 SKU，這些商品會被略過（重新搜尋時只抓新商品）
     
     Returns:
         list: 商品資訊列表，每個商品包含 id, title, price, image_url, url, platform, sku
     """
+    timer, pacer = start_scrape_job('MOMO', MOMO_SEARCH_URL)
     
-    products = []
-    product_id = 1  # 順序編號
+    # 上次已抓完但尚未存檔（例如存檔前程式中斷）且商品數足夠時，直接沿用檢查點的結果
+    checkpoint = get_scrape_checkpoint('momo', keyword)
+    if checkpoint and checkpoint.covers(max_products):
+        finish_scrape_job(timer, stats)
+        return checkpoint.products[:max_products]
+    
+    # 優先使用 HTTP 抓取，沒有結果時才啟動瀏覽器
+    if SCRAPER_HTTP_FIRST:
+        products = fetch_products_for_momo_http(
+            keyword, max_products, progress_callback, pacer, checkpoint, known_skus
+        )
+        if products:
+            if progress_callback:
+                progress_callback(len(products), max_products, f'✅ MOMO 完成！共收集 {len(products)} 筆商品')
+            finish_scrape_job(timer, stats)
+            return products
+        print("MOMO HTTP 抓取沒有結果，改用 Selenium")
+    
+    # 從檢查點繼續（沒有檢查點時從第一頁開始）；seen_skus 追蹤已收集或已存檔的 SKU，避免重複
+    products, seen_skus = _resume_state(checkpoint, known_skus)
+    product_id = len(products) + 1  # 順序編號
     driver = None
-    page = 1  # 當前頁數
-    seen_skus = set()  # 追蹤已經收集的 SKU，避免重複
+    driver_healthy = True
+    page = checkpoint.start_page('selenium') if checkpoint else 1  # 當前頁數
     consecutive_empty_pages = 0  # 連續空白頁計數器
     
     try:
-        # 設定 Chrome 選項
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # 啟用無頭模式（雲端部署必需）
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--disable-software-rasterizer')
-        chrome_options.add_argument('--disable-extensions')
-        chrome_options.add_argument('--disable-plugins')
-        chrome_options.add_argument('--disable-background-timer-throttling')
-        chrome_options.add_argument('--disable-backgrounding-occluded-windows')
-        chrome_options.add_argument('--disable-renderer-backgrounding')
-        chrome_options.add_argument('--disable-web-security')
-        chrome_options.add_argument('--disable-features=VizDisplayCompositor')
-        chrome_options.add_argument('--disable-ipc-flooding-protection')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        # 禁用圖片載入以提高速度
-        prefs = {
-            "profile.managed_default_content_settings.images": 2,
-            "profile.default_content_setting_values.notifications": 2
-        }
-        chrome_options.add_experimental_option("prefs", prefs)
-        
-        # 初始化 WebDriver
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.set_page_load_timeout(30)
+        # 從瀏覽器池取得已啟動的 Chrome
+        pool = get_driver_pool('momo')
+        driver = pool.acquire()
+        count_blocked_requests(driver)  # 清掉上一個工作留下的紀錄
         print(f"正在搜尋 momo: {keyword}")
         
         # 📊 回報初始進度
         if progress_callback:
             progress_callback(0, max_products, f'🔍 正在搜尋 MOMO: {keyword}')
         
-        # 等待頁面載入
-        wait = WebDriverWait(driver, 15)
-        
         # 多頁抓取循環
         while len(products) < max_products:
             # 建構搜尋 URL（包含頁數）
             encoded_keyword = quote(keyword)
-            search_url = f"https://www.momoshop.com.tw/search/searchShop.jsp?keyword={encoded_keyword}&searchType=1&cateLevel=0&ent=k&sortType=1&curPage={page}"
+            search_url = MOMO_SEARCH_URL.format(keyword=encoded_keyword, page=page)
             
             print(f"正在抓取第 {page} 頁...")
             
@@ -96,281 +715,77 @@ def fetch_products_for_momo(keyword, max_products=50, progress_callback=None):
             # 頁面載入重試
             attempt = 1
             max_attempts = 3
-            product_elements = []
+            item_selector, item_count = None, 0
             while attempt <= max_attempts:
                 try:
-                    driver.get(search_url)
-                    time.sleep(3)  # 等待頁面載入
+                    load_start = time.monotonic()
+                    with timer.waiting('頁面載入'):
+                        driver.get(search_url)
+                        pool.note_page(driver)
+                        # 等到某個列表選擇器的商品數量穩定下來，而不是固定等待（上次命中的選擇器優先）
+                        item_selector, item_count = wait_for_stable_count(
+                            driver, _memo_first('item', MOMO_ITEM_SELECTORS), timeout=15
+                        )
                     
-                    # 嘗試查找商品元素
-                    selectors_to_try = [
-                        "li.listAreaLi",
-                        ".listAreaUl li.listAreaLi",
-                        "li.goodsItemLi",
-                        ".prdListArea .goodsItemLi",
-                        ".searchPrdListArea li",
-                        "li[data-gtm]",
-                        ".goodsItemLi",
-                        ".searchPrdList li"
-                    ]
-                    
-                    for selector in selectors_to_try:
-                        try:
-                            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                            product_elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                            if product_elements:
-                                #print(f"使用選擇器 '{selector}' 找到 {len(product_elements)} 個商品")
-                                break
-                        except TimeoutException:
-                            continue
-                    
-                    # 如果找到有效商品元素或商品數量少於 20 個但大於 0，則退出重試
-                    if product_elements:
+                    # 找到商品元素就退出重試
+                    if item_selector:
+                        pacer.observe(time.monotonic() - load_start)
+                        timer.pages += 1
+                        record_blocked_requests(driver, timer, page)
                         break
-                    # 如果未找到商品元素或商品數量少於 20 個，則重試
-                    print(f"第 {page} 頁未找到足夠商品元素（找到 {len(product_elements)} 個），重試 {attempt}/{max_attempts}")
+                    print(f"第 {page} 頁未找到商品元素，重試 {attempt}/{max_attempts}")
                     attempt += 1
-                    time.sleep(random.uniform(3, 6))  # 重試間隔
+                    pacer.backoff()  # 重試間隔
                 except TimeoutException:
                     print(f"第 {page} 頁載入超時，重試 {attempt}/{max_attempts}")
                     attempt += 1
-                    time.sleep(random.uniform(3, 6))
+                    pacer.backoff()
             
-            if not product_elements:
+            if not item_selector:
                 print("無法找到商品元素，可能頁面結構已改變或已到達最後一頁")
                 break
             
-            print(f"開始解析 {len(product_elements)} 個商品")
+            # 一次 execute_script 取回整頁商品，不再逐一 find_element
+            item_count, page_products = extract_momo_products(driver, item_selector)
+            print(f"開始解析 {item_count} 個商品")
             page_products_count = 0
             
-            # 解析每個商品
-            for i, element in enumerate(product_elements):
-                try:
-                    # 如果已經獲得足夠的商品，就停止
-                    if len(products) >= max_products:
-                        break
-                    
-                    # 提取商品標題
-                    title = ""
-                    title_selectors = [
-                        "h3.prdName",
-                        ".prdNameTitle h3.prdName",
-                        ".prdName",
-                        "h3",
-                        "a[title]",
-                        "img[alt]",
-                        ".goodsName",
-                        ".goodsInfo h3",
-                        "a"
-                    ]
-                    
-                    for selector in title_selectors:
-                        try:
-                            title_elem = element.find_element(By.CSS_SELECTOR, selector)
-                            if selector == "img[alt]":
-                                title = title_elem.get_attribute("alt").strip()
-                            elif selector == "a[title]":
-                                title = title_elem.get_attribute("title").strip()
-                            else:
-                                title = title_elem.text.strip()
-                            
-                            if title and len(title) > 5:  # 確保標題有足夠長度
-                                break
-                        except NoSuchElementException:
-                            continue
-                    
-                    # 如果沒有找到標題，跳過這個商品
-                    if not title:
-                        continue
-                    
-                    # 提取價格（先用多種選擇器，若失敗則用整個元素的文字做回退）
-                    price = 0
-                    price_selectors = [
-                        ".money .price b",
-                        ".price b",
-                        ".money b",
-                        ".price",
-                        ".money",
-                        ".cost",
-                        "b",
-                        "strong",
-                        ".goodsPrice",
-                        ".priceInfo",
-                        ".prodPrice",
-                        ".prdPrice"
-                    ]
-
-                    for selector in price_selectors:
-                        try:
-                            price_elements = element.find_elements(By.CSS_SELECTOR, selector)
-                            for price_elem in price_elements:
-                                price_text = price_elem.text
-                                if price_text and any(c.isdigit() for c in price_text):
-                                    # 提取數字
-                                    numbers = re.findall(r'\d+', price_text.replace(',', ''))
-                                    if numbers:
-                                        # 取最大的數字作為價格（避免取到折扣百分比等小數字）
-                                        potential_prices = [int(num) for num in numbers if int(num) > 10]
-                                        if potential_prices:
-                                            price = max(potential_prices)
-                                            break
-                            if price > 0:
-                                break
-                        except NoSuchElementException:
-                            continue
-
-                    # 回退策略：用整個元素的文本抓取數字（如果先前沒抓到價格）
-                    if price <= 0:
-                        try:
-                            full_text = element.text
-                            numbers = re.findall(r'\d+', full_text.replace(',', ''))
-                            if numbers:
-                                potential_prices = [int(num) for num in numbers if int(num) > 10]
-                                if potential_prices:
-                                    price = max(potential_prices)
-                        except Exception:
-                            price = 0
-
-                    # 如果還沒有找到價格，就跳過這個商品
-                    if price <= 0:
-                        continue
-                    
-                    # 提取商品連結
-                    url = ""
-                    try:
-                        link_elem = element.find_element(By.CSS_SELECTOR, "a.goods-img-url")
-                        url = link_elem.get_attribute("href")
-                        if not url.startswith("http"):
-                            url = "https://www.momoshop.com.tw" + url
-                    except NoSuchElementException:
-                        # 嘗試找其他可能的連結選擇器
-                        try:
-                            link_elem = element.find_element(By.CSS_SELECTOR, "a[href*='/goods/']")
-                            url = link_elem.get_attribute("href")
-                            if not url.startswith("http"):
-                                url = "https://www.momoshop.com.tw" + url
-                        except NoSuchElementException:
-                            # 嘗試找任何連結
-                            try:
-                                link_elem = element.find_element(By.CSS_SELECTOR, "a[href]")
-                                url = link_elem.get_attribute("href")
-                                if url and not url.startswith("http"):
-                                    url = "https://www.momoshop.com.tw" + url
-                            except NoSuchElementException:
-                                url = ""
-                    
-                    # 嘗試從隱藏 input 取得商品 id 作為 sku（momo 的 list 中常見）
-                    sku = ""
-                    try:
-                        input_elem = element.find_element(By.CSS_SELECTOR, "input#viewProdId")
-                        sku_val = input_elem.get_attribute("value")
-                        if sku_val:
-                            sku = sku_val
-                    except NoSuchElementException:
-                        sku = ""
-
-                    # 若仍無 sku，嘗試從 url 提取 i_code 或最後一段
-                    if not sku and url:
-                        match = re.search(r'i_code=(\d+)', url)
-                        if match:
-                            sku = match.group(1)
-                        else:
-                            url_parts = url.rstrip('/').split('/')
-                            if url_parts:
-                                last_part = url_parts[-1]
-                                if '?' in last_part:
-                                    last_part = last_part.split('?')[0]
-                                if '.' in last_part:
-                                    last_part = last_part.split('.')[0]
-                                sku = last_part
-                    # 如果有 sku 但沒有 url，可以用 momo 的商品頁樣式組成 url
-                    if not url and sku:
-                        url = f"https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code={sku}"
-                    
-                    # 提取商品圖片
-                    image_url = ""
-                    try:
-                        # 優先尋找第一個商品圖片
-                        img_elem = element.find_element(By.CSS_SELECTOR, "img.prdImg")
-                        # 優先使用 src，然後是 data-original，最後是 data-src
-                        image_url = (img_elem.get_attribute("src") or 
-                                   img_elem.get_attribute("data-original") or 
-                                   img_elem.get_attribute("data-src"))
-                        
-                        if image_url:
-                            # 處理相對路徑和協議相對路徑
-                            if image_url.startswith("//"):
-                                image_url = "https:" + image_url
-                            elif image_url.startswith("/"):
-                                image_url = "https://www.momoshop.com.tw" + image_url
-                            elif not image_url.startswith("http"):
-                                # 如果是相對路徑但不以 / 開頭，假設是 momoshop 的圖片
-                                if "momoshop" not in image_url:
-                                    image_url = "https://cdn3.momoshop.com.tw/momoshop/upload/media/" + image_url
-                                else:
-                                    image_url = "https://" + image_url
-                    except NoSuchElementException:
-                        # 如果找不到 prdImg，嘗試其他圖片選擇器
-                        try:
-                            img_elem = element.find_element(By.CSS_SELECTOR, "img")
-                            image_url = (img_elem.get_attribute("src") or 
-                                       img_elem.get_attribute("data-original") or 
-                                       img_elem.get_attribute("data-src"))
-                            
-                            if image_url:
-                                # 處理相對路徑和協議相對路徑
-                                if image_url.startswith("//"):
-                                    image_url = "https:" + image_url
-                                elif image_url.startswith("/"):
-                                    image_url = "https://www.momoshop.com.tw" + image_url
-                                elif not image_url.startswith("http"):
-                                    if "momoshop" not in image_url:
-                                        image_url = "https://cdn3.momoshop.com.tw/momoshop/upload/media/" + image_url
-                                    else:
-                                        image_url = "https://" + image_url
-                        except NoSuchElementException:
-                            image_url = ""
-                    
-                    # 確保所有必要欄位都有值才加入商品
-                    if title and price > 0 and url:
-                        # 檢查 SKU 是否重複
-                        if sku and sku in seen_skus:
-                            #print(f"跳過重複 SKU: {sku}")
-                            continue
-                        
-                        product = {
-                            "id": product_id,
-                            "title": title,
-                            "price": price,
-                            "image_url": image_url if image_url else "",
-                            "url": url,
-                            "platform": "momo",
-                            "sku": sku
-                        }
-                        products.append(product)
-                        if sku:
-                            seen_skus.add(sku)
-                        product_id += 1
-                        page_products_count += 1
-                        
-                        # 📊 回報即時進度（每抓到一個商品就更新）
-                        if progress_callback:
-                            progress_callback(
-                                len(products), 
-                                max_products, 
-                                f'📦 MOMO: 已收集 {len(products)}/{max_products} 筆商品'
-                            )
-                        
-                        #print(f"成功解析商品 {len(products)}: {title[:50]}... (NT$ {price:,})")
-                    
-                    # 避免過於頻繁的操作
-                    time.sleep(random.uniform(0.05, 0.1))
-                    
-                except Exception as e:
-                    print(f"解析第 {i+1} 個商品時發生錯誤: {e}")
+            for page_product in page_products:
+                # 如果已經獲得足夠的商品，就停止
+                if len(products) >= max_products:
+                    break
+                
+                # 檢查 SKU 是否重複
+                sku = page_product["sku"]
+                if sku and sku in seen_skus:
                     continue
+                
+                product = {
+                    "id": product_id,
+                    "title": page_product["title"],
+                    "price": page_product["price"],
+                    "image_url": page_product["image_url"],
+                    "url": page_product["url"],
+                    "platform": "momo",
+                    "sku": sku
+                }
+                products.append(product)
+                if sku:
+                    seen_skus.add(sku)
+                product_id += 1
+                page_products_count += 1
+                
+                # 📊 回報即時進度（每抓到一個商品就更新）
+                if progress_callback:
+                    progress_callback(
+                        len(products), 
+                        max_products, 
+                        f'📦 MOMO: 已收集 {len(products)}/{max_products} 筆商品'
+                    )
             
-            print(f"第 {page} 頁找到 {len(product_elements)} 個商品元素，成功解析 {page_products_count} 個有效商品，目前總計 {len(products)} 個商品")
+            print(f"第 {page} 頁找到 {item_count} 個商品元素，成功解析 {page_products_count} 個有效商品，目前總計 {len(products)} 個商品")
+            if checkpoint:
+                checkpoint.save('selenium', page + 1, products)
             
             # 🔧 改進：只有在「已達到目標數量」或「連續多頁都沒有商品」時才停止
             # 移除「商品數量少於 20 就停止」的限制，因為有些關鍵字本來商品就少
@@ -381,7 +796,7 @@ def fetch_products_for_momo(keyword, max_products=50, progress_callback=None):
                 print(f"⚠️ 第 {page} 頁沒有找到有效商品（連續 {consecutive_empty_pages} 頁為空）")
                 
                 # 🆕 只有在頁面商品元素也很少時才停止（真的沒商品了）
-                if len(product_elements) < 5:
+                if item_count < 5:
                     print("商品元素也很少，判定為真正的最後一頁，停止抓取")
                     break
                 # 如果連續3頁都沒有有效商品，也停止（避免無限循環）
@@ -393,6 +808,7 @@ def fetch_products_for_momo(keyword, max_products=50, progress_callback=None):
                     # 附加偵錯輸出：印出前 3 個商品元素的 outerHTML，幫助分析為何無法解析
                     try:
                         print("--- MOMO sample product_elements outerHTML (first 3) ---")
+                        product_elements = driver.find_elements(By.CSS_SELECTOR, item_selector)
                         for idx, pe in enumerate(product_elements[:3]):
                             try:
                                 outer = pe.get_attribute('outerHTML')
@@ -418,7 +834,7 @@ def fetch_products_for_momo(keyword, max_products=50, progress_callback=None):
             if len(products) < max_products:
                 page += 1
                 print(f"📄 準備抓取第 {page} 頁...")
-                time.sleep(random.uniform(2, 3))  # 頁面間隔
+                pacer.pause()  # 頁面間隔（依回應時間調整）
             else:
                 print(f"✅ 已達到目標數量 {max_products} 筆，停止抓取")
                 break
@@ -429,22 +845,23 @@ def fetch_products_for_momo(keyword, max_products=50, progress_callback=None):
         if progress_callback:
             progress_callback(len(products), max_products, f'✅ MOMO 完成！共收集 {len(products)} 筆商品')
         
+        if checkpoint and products:
+            checkpoint.save('selenium', checkpoint.next_page, products, done=True)
         return products
         
     except Exception as e:
         print(f"momo Selenium 爬蟲發生錯誤: {e}")
+        driver_healthy = False
         return []
     
     finally:
-        # 確保關閉瀏覽器
+        finish_scrape_job(timer, stats)
+        # 歸還瀏覽器：正常結束的會重設狀態後留在池中，發生錯誤的直接關閉
         if driver:
-            try:
-                driver.quit()
-            except:
-                pass
+            pool.release(driver, healthy=driver_healthy)
 
 
-def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None):
+def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None, stats=None, known_skus=None):
     """
     使用 Selenium 從 PChome 購物網抓取商品資訊，適應 2025年10月 的新版網頁結構。
     
@@ -452,31 +869,46 @@ def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None):
         keyword (str): 搜尋關鍵字
         max_products (int): 最大抓取商品數量
         progress_callback (function): 進度回調函式，接收 (current, total, message) 參數
+        stats (dict): 選用，結束時寫入等待與處理時間的統計（JobTimer.summary）
+        known_skus (set): 選用，先前已存檔的 SKU，這些商品會被略過（重新搜尋時只抓新商品）
     
     Returns:
         list: 商品資訊列表
     """
-    products = []
-    product_id = 1
+    # HTTP 抓取走搜尋 API 的主機，Selenium 備援則開啟 24h 商店頁面
+    timer, pacer = start_scrape_job('PChome', PCHOME_SEARCH_API, "https://24h.pchome.com.tw/")
+    
+    # 上次已抓完但尚未存檔（例如存檔前程式中斷）且商品數足夠時，直接沿用檢查點的結果
+    checkpoint = get_scrape_checkpoint('pchome', keyword)
+    if checkpoint and checkpoint.covers(max_products):
+        finish_scrape_job(timer, stats)
+        return checkpoint.products[:max_products]
+    
+    # 優先使用搜尋 API，沒有結果時才啟動瀏覽器
+    if SCRAPER_HTTP_FIRST:
+        products = fetch_products_for_pchome_http(
+            keyword, max_products, progress_callback, pacer, checkpoint, known_skus
+        )
+        if products:
+            if progress_callback:
+                progress_callback(len(products), max_products, f'✅ PChome 完成！共收集 {len(products)} 筆商品')
+            finish_scrape_job(timer, stats)
+            return products
+        print("PChome HTTP 抓取沒有結果，改用 Selenium")
+    
+    # PChome 網頁以點擊換頁，無法直接跳到斷點頁碼：沿用檢查點的商品，從第一頁重新走過並略過已收集的 SKU
+    products, seen_skus = _resume_state(checkpoint, known_skus)
+    product_id = len(products) + 1
     driver = None
+    driver_healthy = True
     page = 1
-    seen_skus = set()
     consecutive_empty_pages = 0  # 連續空白頁計數器
 
     try:
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # 啟用無頭模式（雲端部署必需）
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        prefs = {"profile.default_content_setting_values.notifications": 2}
-        chrome_options.add_experimental_option("prefs", prefs)
-        
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.set_page_load_timeout(40)
+        # 從瀏覽器池取得已啟動的 Chrome
+        pool = get_driver_pool('pchome')
+        driver = pool.acquire()
+        count_blocked_requests(driver)  # 清掉上一個工作留下的紀錄
         wait = WebDriverWait(driver, 20)
         print(f"正在搜尋 PChome: {keyword}")
         
@@ -486,8 +918,10 @@ def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None):
 
         encoded_keyword = quote(keyword)
         search_url = f"https://24h.pchome.com.tw/search/?q={encoded_keyword}"
-        driver.get(search_url)
-        time.sleep(2)
+        load_start = time.monotonic()
+        with timer.waiting('頁面載入'):
+            driver.get(search_url)
+            pool.note_page(driver)
 
         while len(products) < max_products:
             print(f"正在抓取 PChome 第 {page} 頁...")
@@ -497,15 +931,20 @@ def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None):
                 progress_callback(len(products), max_products, f'📄 PChome 第 {page} 頁載入中... (已收集 {len(products)}/{max_products} 筆)')
             
             try:
-                # 等待新結構的商品項目出現
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "li.c-listInfoGrid__item--gridCardGray5")))
-                
-                # 滾動頁面以確保所有商品都載入
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
+                with timer.waiting('頁面載入'):
+                    # 等待新結構的商品項目出現
+                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, PCHOME_ITEM_SELECTOR)))
+                    
+                    # 滾動頁面以觸發延遲載入，等到請求停止、商品數量不再增加
+                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                    wait_for_network_idle(driver, timeout=5)
+                    wait_for_stable_count(driver, PCHOME_ITEM_SELECTOR, timeout=5)
+                pacer.observe(time.monotonic() - load_start)
+                timer.pages += 1
+                record_blocked_requests(driver, timer, page)
                 
                 # 根據新結構獲取所有商品元素
-                product_elements = driver.find_elements(By.CSS_SELECTOR, "li.c-listInfoGrid__item--gridCardGray5")
+                product_elements = driver.find_elements(By.CSS_SELECTOR, PCHOME_ITEM_SELECTOR)
             except TimeoutException:
                 print("頁面加載超時或找不到新結構的商品容器 (li.c-listInfoGrid__item--gridCardGray5)。")
                 try:
@@ -634,6 +1073,8 @@ def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None):
                     continue
             
             print(f"第 {page} 頁找到 {len(product_elements)} 個商品元素，成功解析 {page_products_count} 個有效商品，目前總計 {len(products)} 個商品")
+            if checkpoint:
+                checkpoint.save('selenium', page + 1, products)
             
             # 🔧 改進：智慧停止判斷
             if page_products_count == 0:
@@ -663,16 +1104,21 @@ def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None):
             try:
                 # 先滾動到頁面底部，確保下一頁按鈕可見
                 driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(1)
                 
                 # 使用新的選擇器來找到下一頁按鈕
                 # 根據 HTML 結構，尋找包含向右箭頭圖示的元素
                 next_icon = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "i.o-iconFonts--arrowSolidRight")))
                 # 點擊圖示的父元素（應該是可點擊的按鈕）
                 next_page_button = next_icon.find_element(By.XPATH, "..")
+                pacer.pause()  # 頁面間隔（依回應時間調整）
+                load_start = time.monotonic()
                 driver.execute_script("arguments[0].click();", next_page_button)
+                pool.note_page(driver)
                 page += 1
-                time.sleep(random.uniform(3, 5))
+                # 等舊的商品列表被換掉，再回到迴圈開頭等待新列表穩定
+                if product_elements:
+                    with timer.waiting('頁面載入'):
+                        wait_for_staleness(driver, product_elements[0], timeout=15)
             except (TimeoutException, NoSuchElementException):
                 print("找不到下一頁按鈕，抓取結束。")
                 break
@@ -683,18 +1129,55 @@ def fetch_products_for_pchome(keyword, max_products=50, progress_callback=None):
         if progress_callback:
             progress_callback(len(products), max_products, f'✅ PChome 完成！共收集 {len(products)} 筆商品')
         
+        if checkpoint and products:
+            checkpoint.save('selenium', checkpoint.next_page, products, done=True)
         return products
 
     except Exception as e:
         print(f"PChome Selenium 爬蟲發生錯誤: {e}")
+        driver_healthy = False
         return []
 
     finally:
+        finish_scrape_job(timer, stats)
         if driver:
+            pool.release(driver, healthy=driver_healthy)
+
+
+def read_csv_catalog_keys(filename):
+    """
+    掃描既有 CSV，取得最大 id 與已存檔的 (query, sku) 組合
+
+    以 csv 模組逐行讀取（不建立 DataFrame），同時支援有表頭與沒有表頭的檔案。
+
+    Returns:
+        tuple: (最大 id, {(query, sku), ...})；檔案不存在時回傳 (0, set())
+    """
+    max_id, keys = 0, set()
+    if not os.path.exists(filename):
+        return max_id, keys
+    with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        id_col, sku_col, query_col = 0, 1, 9
+        for i, row in enumerate(reader):
+            if not row:
+                continue
+            if i == 0 and row[0].strip('"') == 'id':
+                id_col, sku_col, query_col = row.index('id'), row.index('sku'), row.index('query')
+                continue
             try:
-                driver.quit()
-            except:
+                max_id = max(max_id, int(float(row[id_col])))
+            except (ValueError, IndexError):
                 pass
+            if len(row) > max(sku_col, query_col) and row[sku_col]:
+                keys.add((row[query_col], row[sku_col]))
+    return max_id, keys
+
+
+def load_known_skus(filename, query_keyword):
+    """取得某個類別已存檔的 SKU，傳給爬蟲略過這些商品"""
+    _, keys = read_csv_catalog_keys(filename)
+    return {sku for query, sku in keys if query == query_keyword}
 
 
 def save_to_csv(products, filename, query_keyword, append_mode=True):
@@ -706,10 +1189,14 @@ def save_to_csv(products, filename, query_keyword, append_mode=True):
         filename (str): CSV檔案名稱
         query_keyword (str): 查詢關鍵字
         append_mode (bool): True=追加模式，False=覆蓋模式
+    
+    Returns:
+        list: 實際寫入的 CSV 行資料（含分配的 id），供後續建立向量索引使用；
+              追加模式下，同類別已存在的 SKU 不會重複寫入
     """
     if not products:
         print(f"沒有商品資料可以儲存到 {filename}")
-        return
+        return []
     
     # CSV欄位定義（與你的CSV格式一致）
     fieldnames = [
@@ -724,21 +1211,37 @@ def save_to_csv(products, filename, query_keyword, append_mode=True):
     # 檢查檔案是否存在，以及是否需要追加
     file_exists = os.path.exists(filename)
     
-    # 如果是追加模式且檔案存在，需要先讀取現有的最大 id
+    # 如果是追加模式且檔案存在，需要先讀取現有的最大 id 與已存檔的 SKU
     start_id = 1
+    stored_keys = set()
     if append_mode and file_exists:
         try:
-            import pandas as pd
-            existing_df = pd.read_csv(filename)
-            if not existing_df.empty and 'id' in existing_df.columns:
-                start_id = existing_df['id'].max() + 1
+            max_id, stored_keys = read_csv_catalog_keys(filename)
+            start_id = max_id + 1
         except Exception as e:
             print(f"讀取現有檔案失敗，將從 id=1 開始: {e}")
             start_id = 1
     
+    # 略過同類別已存檔的 SKU（以及這一批內重複的 SKU）
+    new_products = []
+    for product in products:
+        key = (query_keyword, str(product['sku']))
+        if product['sku'] and key in stored_keys:
+            continue
+        stored_keys.add(key)
+        new_products.append(product)
+    skipped = len(products) - len(new_products)
+    if skipped:
+        print(f"略過 {skipped} 筆重複或已存在於 {filename} 的商品")
+    products = new_products
+    if not products:
+        print(f"沒有新的商品需要儲存到 {filename}")
+        return []
+    
     # 決定開啟模式：追加或覆蓋
     mode = 'a' if (append_mode and file_exists) else 'w'
     
+    rows = []
     with open(filename, mode, newline='', encoding='utf-8') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         
@@ -764,8 +1267,10 @@ def save_to_csv(products, filename, query_keyword, append_mode=True):
                 'updated_at': current_time
             }
             writer.writerow(row)
+            rows.append(row)
     
     print(f"✅ 成功儲存 {len(products)} 筆商品至 {filename}")
+    return rows
 
 
 if __name__ == "__main__":
@@ -780,6 +1285,8 @@ if __name__ == "__main__":
     
     # 儲存 MOMO 商品至 CSV 檔案
     save_to_csv(momo_products, "momo.csv", english_keyword)
+    # 已存檔，下次以同一關鍵字執行時不再從檢查點繼續
+    clear_scrape_checkpoint('momo', keyword)
 
     if momo_products:
         print(f"\n找到 {len(momo_products)} 個 MOMO 商品：")
@@ -802,6 +1309,7 @@ if __name__ == "__main__":
     
     # 儲存 PChome 商品至 CSV 檔案
     save_to_csv(pchome_products, "pchome.csv", english_keyword)
+    clear_scrape_checkpoint('pchome', keyword)
 
     if pchome_products:
         print(f"\n找到 {len(pchome_products)} 個 PChome 商品：")
@@ -0,0 +1,101 @@
+import json
+
+from selenium.common.exceptions import WebDriverException
+
+
+# 依資源種類分組的封鎖規則（Chrome DevTools Protocol 的 URL 萬用字元格式）
+# 爬蟲只讀取 DOM 上的文字、連結與圖片網址，這些資源下載了也用不到
+BLOCK_CATEGORIES = {
+    'images': [
+        '*.jpg', '*.jpg?*', '*.jpeg', '*.jpeg?*', '*.png', '*.png?*', '*.gif', '*.gif?*',
+        '*.webp', '*.webp?*', '*.svg', '*.svg?*', '*.ico', '*.ico?*', '*.avif', '*.avif?*',
+    ],
+    'fonts': [
+        '*.woff', '*.woff?*', '*.woff2', '*.woff2?*', '*.ttf', '*.ttf?*', '*.otf', '*.otf?*', '*.eot', '*.eot?*',
+    ],
+    'media': ['*.mp4', '*.mp4?*', '*.webm', '*.webm?*', '*.mp3', '*.mp3?*'],
+    'stylesheets': ['*.css', '*.css?*'],
+    'trackers': [
+        '*google-analytics.com*', '*googletagmanager.com*', '*googleadservices.com*',
+        '*doubleclick.net*', '*googlesyndication.com*', '*connect.facebook.net*',
+        '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*', '*criteo.*', '*scorecardresearch.com*',
+        '*line-scdn.net/*tag*', '*tagtoo*', '*appier*', '*ad.ettoday*', '*yahoo.com/*pixel*',
+    ],
+}
+
+# 預設不封鎖 stylesheets：PChome 需要版面才能觸發捲動延遲載入與下一頁按鈕
+DEFAULT_BLOCK_CATEGORIES = 'images,fonts,media,trackers'
+
+
+def resolve_block_patterns(categories=DEFAULT_BLOCK_CATEGORIES, extra_patterns=''):
+    """
+    將設定字串轉為 URL 封鎖規則
+
+    Args:
+        categories (str): 以逗號分隔的類別名稱（見 BLOCK_CATEGORIES），空字串表示不封鎖
+        extra_patterns (str): 以逗號分隔的額外 URL 規則
+
+    Returns:
+        list: 去除重複後的 URL 規則
+    """
+    patterns = []
+    for name in (c.strip() for c in categories.split(',')):
+        if not name:
+            continue
+        if name not in BLOCK_CATEGORIES:
+            print(f"⚠️ 未知的封鎖類別: {name}（可用: {', '.join(BLOCK_CATEGORIES)}）")
+            continue
+        patterns.extend(BLOCK_CATEGORIES[name])
+    patterns.extend(p.strip() for p in extra_patterns.split(',') if p.strip())
+    return list(dict.fromkeys(patterns))
+
+
+def enable_performance_log(chrome_options):
+    """開啟 Chrome 的 performance log，用來統計被封鎖的請求"""
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def apply_request_blocking(driver, patterns):
+    """
+    透過 DevTools Protocol 封鎖符合規則的請求（設定在瀏覽器存活期間持續有效）
+
+    Returns:
+        bool: 是否成功套用
+    """
+    if not patterns:
+        return False
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        return True
+    except WebDriverException as e:
+        print(f"⚠️ 無法設定請求封鎖: {e}")
+        return False
+
+
+def count_blocked_requests(driver):
+    """
+    讀取並清空 performance log，統計自上次呼叫後被封鎖的請求
+
+    Returns:
+        dict: 資源類型 -> 被封鎖的數量（例如 {'Image': 30, 'Font': 4}）
+    """
+    try:
+        entries = driver.get_log('performance')
+    except Exception:
+        return {}
+
+    counts = {}
+    for entry in entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError, TypeError):
+            continue
+        if message.get('method') != 'Network.loadingFailed':
+            continue
+        params = message.get('params', {})
+        # setBlockedURLs 攔下的請求 blockedReason 為 inspector
+        if params.get('blockedReason') == 'inspector':
+            resource_type = params.get('type', 'Other')
+            counts[resource_type] = counts.get(resource_type, 0) + 1
+    return counts
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+
+class ScrapeCheckpoint:
+    """
+    單一平台、單一關鍵字的爬蟲進度檢查點
+
+    每抓完一頁就把「下一頁頁碼」與目前收集到的商品寫入 JSON，
+    程式中斷後重新執行同一個關鍵字時可以從斷點繼續，而不必從第一頁重抓。
+    商品成功存檔後呼叫 clear 刪除檢查點。
+    """
+
+    def __init__(self, root_dir, platform, keyword, ttl_seconds=24 * 3600):
+        """
+        Args:
+            root_dir (str): 檢查點目錄
+            platform (str): 平台名稱（momo / pchome）
+            keyword (str): 搜尋關鍵字
+            ttl_seconds (float): 超過此時間的檢查點視為過期，None 表示不過期
+        """
+        self.platform = platform
+        self.keyword = keyword
+        safe = re.sub(r'[^\w\-]+', '_', f"{platform}_{keyword}").strip('_') or platform
+        digest = hashlib.sha1(f"{platform}\x1f{keyword}".encode('utf-8')).hexdigest()[:8]
+        self.path = os.path.join(root_dir, f"{safe}_{digest}.json")
+        os.makedirs(root_dir, exist_ok=True)
+
+        self.source = None
+        self.next_page = 1
+        self.products = []
+        self.done = False
+        self._load(ttl_seconds)
+
+    def _load(self, ttl_seconds):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 檢查點讀取失敗，將重新開始: {e}")
+            return
+        if ttl_seconds is not None and time.time() - state.get('updated_at', 0) > ttl_seconds:
+            print(f"{self.platform} 的檢查點已過期，將重新開始")
+            return
+        self.source = state.get('source')
+        self.next_page = int(state.get('next_page', 1))
+        self.products = state.get('products', [])
+        self.done = bool(state.get('done', False))
+        print(f"📌 從檢查點繼續 {self.platform}「{self.keyword}」：已有 {len(self.products)} 筆，"
+              f"{'已完成' if self.done else f'下一頁為第 {self.next_page} 頁'}")
+
+    def start_page(self, source):
+        """取得要開始抓取的頁碼；不同抓取方式（http / selenium）的頁碼不通用，只沿用商品"""
+        return self.next_page if self.source == source else 1
+
+    def covers(self, max_products):
+        """
+        已抓完且商品數足夠這次搜尋
+
+        先前以較小的 max_products 抓完時商品數不足，需從斷點繼續抓，不能直接沿用。
+        """
+        return self.done and bool(self.products) and len(self.products) >= max_products
+
+    def save(self, source, next_page, products, done=False):
+        """寫入目前進度（先寫暫存檔再取代，避免中斷時留下損毀檔案）"""
+        self.source, self.next_page, self.products, self.done = source, next_page, list(products), done
+        state = {
+            'platform': self.platform,
+            'keyword': self.keyword,
+            'source': source,
+            'next_page': next_page,
+            'products': self.products,
+            'done': done,
+            'updated_at': time.time(),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """刪除檢查點（商品已存檔後呼叫）"""
+        self.source, self.next_page, self.products, self.done = None, 1, [], False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
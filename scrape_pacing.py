@@ -0,0 +1,250 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from selenium.common.exceptions import WebDriverException
+
+
+# 一次查詢多個選擇器的商品數與頁面載入狀態，避免每個選擇器各等一次逾時
+_COUNT_SELECTORS_JS = """
+var counts = [];
+for (var i = 0; i < arguments[0].length; i++) {
+    counts.push(document.querySelectorAll(arguments[0][i]).length);
+}
+return [document.readyState, counts];
+"""
+
+
+def wait_for_stable_count(driver, selectors, timeout=15, poll_interval=0.25, stable_polls=2, min_count=1):
+    """
+    等待商品列表載入完成：某個選擇器的元素數量達到 min_count，且連續 stable_polls 次輪詢都不再變動
+
+    取代固定的 time.sleep；頁面快的時候不必多等，慢的時候也不會太早開始解析。
+
+    Args:
+        driver: Selenium WebDriver
+        selectors (list): 依優先順序排列的 CSS 選擇器
+        timeout (float): 最長等待秒數
+        poll_interval (float): 輪詢間隔（秒）
+        stable_polls (int): 數量需連續幾次不變才視為穩定
+        min_count (int): 至少要有幾個元素
+
+    Returns:
+        tuple: (選擇器, 元素數量)；逾時仍沒有任何元素時回傳 (None, 0)
+    """
+    if isinstance(selectors, str):
+        selectors = [selectors]
+    deadline = time.monotonic() + timeout
+    last_counts, stable = None, 0
+    best = (None, 0)
+
+    while True:
+        try:
+            ready_state, counts = driver.execute_script(_COUNT_SELECTORS_JS, list(selectors))
+        except WebDriverException:
+            ready_state, counts = 'loading', [0] * len(selectors)
+
+        best = next(((s, c) for s, c in zip(selectors, counts) if c >= min_count), (None, 0))
+        if best[0] is not None and counts == last_counts and ready_state == 'complete':
+            stable += 1
+            if stable >= stable_polls:
+                return best
+        else:
+            stable = 0
+        last_counts = counts
+
+        if time.monotonic() >= deadline:
+            # 逾時但已有元素時仍回傳目前的結果，讓呼叫端先解析已載入的部分
+            return best
+        time.sleep(poll_interval)
+
+
+def wait_for_network_idle(driver, timeout=10, idle_time=0.5, poll_interval=0.25):
+    """
+    等待頁面在 idle_time 秒內沒有新的資源請求（以 Performance API 的資源數判斷）
+
+    Returns:
+        bool: 是否在逾時前達到閒置
+    """
+    deadline = time.monotonic() + timeout
+    last_count, idle_since = -1, time.monotonic()
+    while time.monotonic() < deadline:
+        try:
+            count = driver.execute_script("return performance.getEntriesByType('resource').length;")
+        except WebDriverException:
+            return False
+        now = time.monotonic()
+        if count != last_count:
+            last_count, idle_since = count, now
+        elif now - idle_since >= idle_time:
+            return True
+        time.sleep(poll_interval)
+    return False
+
+
+def wait_for_staleness(driver, element, timeout=15, poll_interval=0.2):
+    """等待舊的元素從 DOM 移除（例如換頁後舊的商品列表被替換），逾時回傳 False"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            element.is_enabled()
+        except WebDriverException:
+            return True
+        time.sleep(poll_interval)
+    return False
+
+
+class JobTimer:
+    """
+    記錄一次爬蟲工作中「等待」與「處理」各花了多少時間
+
+    等待時間依類別累計（頁面載入、節流間隔、重試退避等），其餘時間視為處理時間。
+    另外可用 count 累計其他數量（例如被封鎖的請求數）。
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self._start = time.monotonic()
+        self._waits = {}
+        self.pages = 0
+        self.counters = {}
+
+    @contextmanager
+    def waiting(self, category):
+        """以 with 包住等待的區塊，時間會累計到 category"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._waits[category] = self._waits.get(category, 0.0) + time.monotonic() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        elapsed = time.monotonic() - self._start
+        waited = sum(self._waits.values())
+        return {
+            'label': self.label,
+            'pages': self.pages,
+            'elapsed': elapsed,
+            'wait': waited,
+            'work': max(elapsed - waited, 0.0),
+            'wait_breakdown': dict(self._waits),
+            'counters': dict(self.counters),
+        }
+
+    def report(self):
+        s = self.summary()
+        breakdown = '、'.join(f"{name} {seconds:.1f}s" for name, seconds in s['wait_breakdown'].items())
+        report = (
+            f"⏱️ {s['label']}：{s['pages']} 頁，總耗時 {s['elapsed']:.1f}s，"
+            f"等待 {s['wait']:.1f}s（{breakdown or '無'}），處理 {s['work']:.1f}s"
+        )
+        if s['counters']:
+            report += '；' + '、'.join(f"{name} {value}" for name, value in s['counters'].items())
+        return report
+
+
+_crawl_delays = {}
+_crawl_delays_lock = threading.Lock()
+
+
+def robots_crawl_delay(url, session=None, user_agent='*'):
+    """
+    讀取網站 robots.txt 的 Crawl-delay（每個網域只讀一次）
+
+    Returns:
+        float | None: 建議的請求間隔秒數；沒有設定或讀取失敗時回傳 None
+    """
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    with _crawl_delays_lock:
+        if host in _crawl_delays:
+            return _crawl_delays[host]
+
+    delay = None
+    if session is not None:
+        try:
+            response = session.get(host + "/robots.txt", timeout=5)
+            if response.ok:
+                parser = RobotFileParser()
+                parser.parse(response.text.splitlines())
+                value = parser.crawl_delay(user_agent)
+                delay = float(value) if value is not None else None
+        except Exception:
+            delay = None
+
+    with _crawl_delays_lock:
+        _crawl_delays[host] = delay
+    return delay
+
+
+class AdaptivePacer:
+    """
+    依實際回應時間調整請求間隔
+
+    - 以指數移動平均追蹤頁面載入時間，間隔約為 factor 倍的平均載入時間
+      （網站變慢時自動放慢，回應快時不多等）
+    - 間隔限制在 [min_delay, max_delay]，min_delay 不低於 robots.txt 的 Crawl-delay
+    - 發生逾時或錯誤時 backoff 會加倍下一次的間隔，成功後逐步恢復
+    """
+
+    def __init__(self, min_delay=1.0, max_delay=8.0, factor=1.0, smoothing=0.3, jitter=0.2, timer=None):
+        """
+        Args:
+            min_delay (float): 最短間隔（秒）
+            max_delay (float): 最長間隔（秒）
+            factor (float): 間隔相對於平均載入時間的倍數
+            smoothing (float): 移動平均中新觀測值的權重
+            jitter (float): 隨機加長的比例上限，避免固定節奏
+            timer (JobTimer): 記錄等待時間，None 表示不記錄
+        """
+        self.min_delay = min_delay
+        self.max_delay = max(max_delay, min_delay)
+        self.factor = factor
+        self.smoothing = smoothing
+        self.jitter = jitter
+        self.timer = timer
+        self.avg_response = None
+        self._penalty = 1.0
+
+    def respect_crawl_delay(self, delay):
+        """套用 robots.txt 的 Crawl-delay 作為間隔下限"""
+        if delay:
+            self.min_delay = max(self.min_delay, delay)
+            self.max_delay = max(self.max_delay, self.min_delay)
+
+    def observe(self, seconds):
+        """記錄一次成功的頁面載入時間"""
+        if self.avg_response is None:
+            self.avg_response = seconds
+        else:
+            self.avg_response = (1 - self.smoothing) * self.avg_response + self.smoothing * seconds
+        self._penalty = max(1.0, self._penalty / 2)
+
+    def backoff(self):
+        """記錄一次失敗（逾時、被擋），並等待加長後的間隔"""
+        self._penalty = min(self._penalty * 2, 8.0)
+        self._sleep(self.next_delay(), '重試退避')
+
+    def next_delay(self):
+        base = self.min_delay if self.avg_response is None else self.avg_response * self.factor
+        delay = min(max(base, self.min_delay) * self._penalty, self.max_delay)
+        # 抖動只往上加，確保不低於 min_delay（Crawl-delay）
+        return delay * random.uniform(1, 1 + self.jitter)
+
+    def pause(self):
+        """兩次請求之間的間隔"""
+        self._sleep(self.next_delay(), '節流間隔')
+
+    def _sleep(self, seconds, category):
+        if self.timer is not None:
+            with self.timer.waiting(category):
+                time.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
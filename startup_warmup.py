@@ -0,0 +1,117 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """
+    記錄程序啟動各階段（匯入套件、載入模型、暖機）花費的時間
+
+    可在多個執行緒中使用，report 依完成順序列出各階段。
+    """
+
+    def __init__(self):
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self.stages = []  # (階段名稱, 秒數, 完成時距程序啟動的秒數)
+
+    @contextmanager
+    def stage(self, name):
+        """以 with 包住一個啟動階段"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self.stages.append((name, end - start, end - self._start))
+
+    def timed_import(self, module_name):
+        """匯入模組並記錄花費的時間（已匯入過的模組幾乎不花時間）"""
+        with self.stage(f"import {module_name}"):
+            return importlib.import_module(module_name)
+
+    def report(self):
+        with self._lock:
+            stages = list(self.stages)
+        if not stages:
+            return "⏱️ 啟動計時：尚無資料"
+        lines = [f"⏱️ 啟動計時（共 {len(stages)} 個階段）"]
+        lines.extend(f"  {name}: {seconds:.2f}s（啟動後 {at:.1f}s 完成）" for name, seconds, at in stages)
+        return '\n'.join(lines)
+
+
+class BackgroundLoader:
+    """
+    在背景執行緒執行耗時的載入工作（例如嵌入模型），頁面可以先顯示，需要結果時再 wait
+
+    load_fn 接收一個 notify(level, message) 函數回報進度；level 為 info / success / warning / error。
+    訊息會印在終端機並保留在 messages，主執行緒可以之後再顯示（背景執行緒不能操作 Streamlit 元件）。
+    載入失敗（拋出例外或回傳 None）時不保留結果，下一次 start / wait 會重新載入。
+    """
+
+    def __init__(self, name, load_fn, timer=None):
+        self.name = name
+        self._load_fn = load_fn
+        self._timer = timer
+        self._ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.result = None
+        self.error = None
+        self.messages = []
+
+    @property
+    def ready(self):
+        """載入是否已結束（成功或失敗）"""
+        return self._ready.is_set()
+
+    @property
+    def failed(self):
+        """載入已結束但沒有結果"""
+        return self._ready.is_set() and self.result is None
+
+    def start(self):
+        """啟動背景執行緒；載入中或已成功時不會啟動第二次，上次失敗時重新載入"""
+        with self._lock:
+            if self._thread is not None and self.failed:
+                # 例如網路暫時中斷，清除失敗狀態讓這次存取重試
+                self._thread = None
+                self._ready.clear()
+                self.error = None
+                self.messages = []
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"warmup-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def notify(self, level, message):
+        print(message)
+        self.messages.append((level, message))
+
+    def _run(self):
+        try:
+            if self._timer is not None:
+                with self._timer.stage(f"載入{self.name}"):
+                    self.result = self._load_fn(self.notify)
+            else:
+                self.result = self._load_fn(self.notify)
+        except Exception as e:
+            self.error = e
+            self.notify('error', f"❌ 背景載入{self.name}失敗: {e}")
+        finally:
+            self._ready.set()
+            if self._timer is not None:
+                print(self._timer.report())
+
+    def wait(self, timeout=None):
+        """
+        等待載入完成
+
+        Returns:
+            載入結果；失敗或逾時時回傳 None
+        """
+        self.start()
+        self._ready.wait(timeout)
+        return self.result
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 模組都放在專案根目錄，測試時直接匯入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
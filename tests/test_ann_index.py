@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex, stage1_recall
+
+
+def random_unit_vectors(n, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, ids, query, top_k):
+    scores = vectors @ query
+    order = np.argsort(-scores)[:top_k]
+    return [int(ids[i]) for i in order]
+
+
+@pytest.mark.parametrize('storage', ['float32', 'float16', 'int8'])
+def test_exact_search_matches_argsort(storage):
+    vectors = random_unit_vectors(500)
+    ids = np.arange(1000, 1500)
+    index = IVFIndex(storage=storage, min_train_size=10_000)
+    index.add(ids, vectors)
+
+    for query in random_unit_vectors(5, seed=1):
+        result = index.search(query, top_k=10)
+        assert [row_id for row_id, _ in result][:5] == exact_top_k(vectors, ids, query, 10)[:5]
+        scores = [score for _, score in result]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_search_threshold_and_duplicate_ids():
+    vectors = random_unit_vectors(50)
+    index = IVFIndex(min_train_size=10_000)
+    assert index.add(np.arange(50), vectors) == 50
+    assert index.add(np.arange(50), vectors) == 0
+
+    result = index.search(vectors[7], top_k=5, threshold=0.99)
+    assert result == [(7, pytest.approx(1.0, abs=1e-5))]
+
+
+def test_ivf_search_finds_indexed_vector():
+    vectors = random_unit_vectors(2000)
+    index = IVFIndex(nprobe=8, min_train_size=1000)
+    index.add(np.arange(2000), vectors)
+
+    # 查詢向量本身一定在最近的群集中
+    for row in (0, 500, 1999):
+        assert index.search(vectors[row], top_k=1)[0][0] == row
+
+
+@pytest.mark.parametrize('storage', ['float32', 'float16', 'int8'])
+def test_save_load_round_trip(tmp_path, storage):
+    path = str(tmp_path / 'ann.npz')
+    vectors = random_unit_vectors(1200)
+    index = IVFIndex(path, storage=storage, min_train_size=1000)
+    index.reset('model-a')
+    index.add(np.arange(1200), vectors)
+    index.save()
+
+    loaded = IVFIndex(path, storage=storage, min_train_size=1000)
+    assert len(loaded) == 1200 and loaded.model_id == 'model-a'
+    queries = random_unit_vectors(5, seed=2)
+    for query in queries:
+        assert loaded.search(query, top_k=10) == index.search(query, top_k=10)
+
+    # memory map 載入後仍可增量加入、更新與移除
+    replacement = random_unit_vectors(1, seed=3)
+    assert loaded.add([5000], replacement) == 1
+    assert loaded.update([3], replacement) == 1
+    assert loaded.remove([0, 1]) == 2
+    loaded.save()
+    reloaded = IVFIndex(path, storage=storage, min_train_size=1000)
+    assert len(reloaded) == 1199
+    assert not reloaded.contains(0) and reloaded.contains(5000)
+    assert {row_id for row_id, _ in reloaded.search(replacement[0], top_k=2)} == {3, 5000}
+
+
+def test_binary_shortlist_recall():
+    vectors = random_unit_vectors(3000)
+    reference = IVFIndex(min_train_size=10_000)
+    reference.add(np.arange(3000), vectors)
+    candidate = IVFIndex(min_train_size=10_000, binary_shortlist=1500)
+    candidate.add(np.arange(3000), vectors)
+    queries = random_unit_vectors(50, seed=4)
+
+    assert candidate.candidate_count(queries[0]) == 3000
+    result = stage1_recall(reference, candidate, queries, top_k=10)
+    assert result['queries'] == 50
+    assert result['recall'] > 0.95
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_matcher import (
+    NeighborTableStore,
+    blocked_top_k,
+    catalog_digest,
+    compute_neighbor_table,
+    merge_neighbor_tables,
+)
+
+
+def random_unit_vectors(n, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize('row_block, col_block', [(256, 4096), (7, 13), (1, 1)])
+def test_blocked_top_k_matches_full_argsort(row_block, col_block):
+    queries, targets = random_unit_vectors(40), random_unit_vectors(300, seed=1)
+    full = queries @ targets.T
+    expected_idx = np.argsort(-full, axis=1, kind='stable')[:, :10]
+
+    idx, scores = blocked_top_k(queries, targets, 10, row_block=row_block, col_block=col_block)
+
+    assert idx.shape == scores.shape == (40, 10)
+    np.testing.assert_array_equal(idx, expected_idx)
+    np.testing.assert_allclose(scores, np.take_along_axis(full, expected_idx, axis=1), rtol=1e-6)
+
+
+def test_blocked_top_k_with_fewer_targets_than_k():
+    queries, targets = random_unit_vectors(3), random_unit_vectors(4, seed=1)
+
+    idx, scores = blocked_top_k(queries, targets, 10)
+
+    assert idx.shape == (3, 4)
+    np.testing.assert_array_equal(np.sort(idx, axis=1), np.tile(np.arange(4), (3, 1)))
+    assert blocked_top_k(queries, targets[:0], 10)[0].shape == (3, 0)
+
+
+def test_merge_neighbor_tables_matches_single_table():
+    momo, pchome = random_unit_vectors(5), random_unit_vectors(60, seed=1)
+    momo_ids, pchome_ids = np.arange(5), np.arange(100, 160)
+    full = compute_neighbor_table(momo_ids, momo, pchome_ids, pchome, top_k=8)
+
+    halves = [
+        compute_neighbor_table(momo_ids, momo, pchome_ids[part], pchome[part], top_k=8)
+        for part in (slice(0, 25), slice(25, 60))
+    ]
+
+    merged = merge_neighbor_tables(halves, top_k=8)
+    pd.testing.assert_frame_equal(merged[['momo_id', 'rank', 'pchome_id']], full[['momo_id', 'rank', 'pchome_id']])
+    np.testing.assert_allclose(merged['similarity'], full['similarity'], rtol=1e-6)
+
+
+def test_catalog_digest_ignores_row_order_and_detects_retitles():
+    df = pd.DataFrame({'id': [1, 2, 3], 'title': ['a', 'b', 'c']})
+
+    assert catalog_digest(df) == catalog_digest(df.iloc[::-1])
+    assert catalog_digest(df) != catalog_digest(df.assign(title=['a', 'b', 'd']))
+    assert catalog_digest(None) == catalog_digest(df.iloc[:0])
+
+
+def test_neighbor_store_lookup_and_queries(tmp_path):
+    momo, pchome = random_unit_vectors(3), random_unit_vectors(10, seed=1)
+    table = compute_neighbor_table(np.arange(3), momo, np.arange(100, 110), pchome, top_k=4)
+    store = NeighborTableStore(str(tmp_path))
+    store.save('耳機 / earphone', table, {'model_id': 'm', 'top_k': 4})
+    store.save('dyson', table, {'model_id': 'm', 'top_k': 4})
+
+    assert sorted(store.queries()) == ['dyson', '耳機 / earphone']
+    neighbors = store.lookup('耳機 / earphone', 1, {'model_id': 'm'})
+    assert [pchome_id for pchome_id, _ in neighbors] == table.loc[table['momo_id'] == 1, 'pchome_id'].tolist()
+    assert store.lookup('耳機 / earphone', 1, {'model_id': 'other'}) is None
+    assert store.lookup('missing', 1, {'model_id': 'm'}) is None
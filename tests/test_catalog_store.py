@@ -0,0 +1,53 @@
+from catalog_store import CatalogStore
+
+
+def product(sku, title, price):
+    return {'sku': sku, 'title': title, 'price': price, 'image_url': f'https://img/{sku}.jpg', 'url': f'https://shop/{sku}'}
+
+
+def test_upsert_inserts_with_increasing_ids(tmp_path):
+    store = CatalogStore(str(tmp_path / 'catalog.sqlite'))
+
+    rows = store.upsert_products('momo', [product('A1', 'Dyson V8', 9900), product('A2', 'Dyson V10', 12900)], '吸塵器')
+
+    assert [(row['id'], row['sku']) for row in rows] == [(1, 'A1'), (2, 'A2')]
+    df = store.load('momo')
+    assert df['title'].tolist() == ['Dyson V8', 'Dyson V10']
+    assert df['image'].tolist() == ['https://img/A1.jpg', 'https://img/A2.jpg']
+    assert store.known_skus('momo', '吸塵器') == {'A1', 'A2'}
+
+
+def test_upsert_updates_same_sku_in_same_category(tmp_path):
+    store = CatalogStore(str(tmp_path / 'catalog.sqlite'))
+    first = store.upsert_products('momo', [product('A1', 'Dyson V8', 9900)], '吸塵器')
+
+    rows = store.upsert_products('momo', [product('A1', 'Dyson V8 SV25', 8800), product('A3', 'Dyson V12', 19900)], '吸塵器')
+
+    assert rows[0]['id'] == first[0]['id'] and rows[0]['created_at'] == first[0]['created_at']
+    assert rows[1]['id'] == 2
+    df = store.load('momo')
+    assert len(df) == 2
+    updated = df[df['sku'] == 'A1'].iloc[0]
+    assert updated['title'] == 'Dyson V8 SV25' and updated['price'] == 8800
+
+
+def test_upsert_keeps_platforms_and_categories_apart(tmp_path):
+    store = CatalogStore(str(tmp_path / 'catalog.sqlite'))
+    store.upsert_products('momo', [product('A1', 'Dyson V8', 9900)], '吸塵器')
+
+    store.upsert_products('momo', [product('A1', 'Dyson V8', 9900)], '無線吸塵器')
+    store.upsert_products('pchome', [product('A1', 'Dyson V8', 9800)], '吸塵器')
+
+    assert store.count('momo') == 2 and store.count('pchome') == 1
+    assert store.load('momo', '無線吸塵器')['id'].tolist() == [2]
+    assert store.load('pchome')['id'].tolist() == [1]
+
+
+def test_upsert_replace_and_empty_batch(tmp_path):
+    store = CatalogStore(str(tmp_path / 'catalog.sqlite'))
+    store.upsert_products('pchome', [product('B1', 'Panasonic MC-A10', 2590), product('B2', 'Sharp EC-A1', 3990)], '吸塵器')
+
+    assert store.upsert_products('pchome', [], '吸塵器') == []
+    store.upsert_products('pchome', [product('B3', 'Hitachi PV-X90', 6990)], '吸塵器', replace=True)
+
+    assert store.load('pchome')['sku'].tolist() == ['B3']
@@ -0,0 +1,71 @@
+from gemini_verifier import PROMPT_HASH, GeminiVerifier, StubBackend
+from verdict_cache import VerdictCache
+
+
+def batch_drops_second_candidate(prompt, schema):
+    """批次回應只判斷第 1 個候選（第 2 個無法解析），逐筆驗證一律回傳相同商品"""
+    if schema.get('type') == 'ARRAY':
+        return [{'index': 1, 'is_match': False, 'confidence': 'high', 'reasoning': '型號不同'},
+                {'index': 2, 'is_match': 'maybe'}]
+    return {'is_match': True, 'confidence': 'medium', 'reasoning': '逐筆判斷'}
+
+
+def make_verifier(responder, **kwargs):
+    return GeminiVerifier(StubBackend(responder), max_retries=0, retry_backoff=0, **kwargs)
+
+
+def test_verify_batch_leaves_unparsed_items_empty():
+    verifier = make_verifier(batch_drops_second_candidate)
+
+    results = verifier.verify_batch('Dyson V8', [('Dyson V8 SV25', 0.91), ('Dyson V10', 0.85)])
+
+    assert results[0] == {'is_match': False, 'confidence': 'high', 'reasoning': '型號不同'}
+    assert results[1] is None
+
+
+def test_verify_batch_invalid_json_returns_all_none():
+    verifier = make_verifier(lambda prompt, schema: 'not json')
+
+    assert verifier.verify_batch('Dyson V8', [('A', 0.9), ('B', 0.8)]) == [None, None]
+
+
+def test_verify_many_falls_back_to_single_pair_for_unparsed_items():
+    backend = StubBackend(batch_drops_second_candidate)
+    verifier = GeminiVerifier(backend, max_retries=0, retry_backoff=0, batch_size=8)
+
+    results = dict(verifier.verify_many('Dyson V8', [('Dyson V8 SV25', 0.91), ('Dyson V10', 0.85)]))
+
+    assert results[0]['is_match'] is False
+    assert results[1] == {'is_match': True, 'confidence': 'medium', 'reasoning': '逐筆判斷'}
+    # 一次批次請求，加上一次針對第 2 個候選的逐筆請求
+    assert len(backend.prompts) == 2
+    assert 'Dyson V10' in backend.prompts[1] and 'Dyson V8 SV25' not in backend.prompts[1]
+
+
+def test_verify_many_does_not_retry_pairs_after_api_failure():
+    def unavailable(prompt, schema):
+        raise RuntimeError('503 Service Unavailable')
+
+    backend = StubBackend(unavailable)
+    verifier = GeminiVerifier(backend, max_retries=2, retry_backoff=0, batch_size=8)
+
+    results = dict(verifier.verify_many('Dyson V8', [('Dyson V8 SV25', 0.91), ('Dyson V10', 0.85)]))
+
+    assert [results[i]['reasoning'] for i in (0, 1)] == ['API 錯誤: 503 Service Unavailable'] * 2
+    assert all(result['is_match'] is False for result in results.values())
+    # 只有批次請求本身的 1 + 2 次重試，沒有逐筆請求
+    assert len(backend.prompts) == 3
+    assert verifier.stats()['errors'] == 3
+
+
+def test_verify_many_uses_cache_before_calling_backend(tmp_path):
+    cache = VerdictCache(str(tmp_path / 'verdicts.sqlite'))
+    cache.put('stub', PROMPT_HASH, 'Dyson V8', 'Dyson V8 SV25', {'is_match': True, 'confidence': 'high', 'reasoning': '快取'})
+    backend = StubBackend()
+    verifier = GeminiVerifier(backend, verdict_cache=cache, max_retries=0, retry_backoff=0)
+
+    results = dict(verifier.verify_many('Dyson V8', [('Dyson V8 SV25', 0.91)]))
+
+    assert results[0]['reasoning'] == '快取'
+    assert backend.prompts == []
+    assert verifier.stats()['cache_hits'] == 1
@@ -0,0 +1,60 @@
+import os
+
+import scrape_checkpoint
+from scrape_checkpoint import ScrapeCheckpoint
+
+PRODUCTS = [{'sku': 'A1', 'title': 'Dyson V8', 'price': 9900}, {'sku': 'A2', 'title': 'Dyson V10', 'price': 12900}]
+
+
+def test_resume_from_saved_page(tmp_path):
+    checkpoint = ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器')
+    assert checkpoint.start_page('http') == 1
+    checkpoint.save('http', 3, PRODUCTS)
+
+    resumed = ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器')
+
+    assert resumed.products == PRODUCTS and not resumed.done
+    assert resumed.start_page('http') == 3
+    # 不同抓取方式的頁碼不通用
+    assert resumed.start_page('selenium') == 1
+
+
+def test_checkpoints_are_separate_per_platform_and_keyword(tmp_path):
+    ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器').save('http', 2, PRODUCTS)
+
+    assert ScrapeCheckpoint(str(tmp_path), 'pchome', '吸塵器').products == []
+    assert ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器/配件').products == []
+
+
+def test_covers_requires_done_and_enough_products(tmp_path):
+    checkpoint = ScrapeCheckpoint(str(tmp_path), 'pchome', '吸塵器')
+    checkpoint.save('http', 3, PRODUCTS)
+    assert not checkpoint.covers(2)
+
+    checkpoint.save('http', 3, PRODUCTS, done=True)
+    assert checkpoint.covers(2)
+    assert not checkpoint.covers(5)
+
+
+def test_expired_or_corrupt_checkpoint_starts_over(tmp_path, monkeypatch):
+    checkpoint = ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器', ttl_seconds=60)
+    checkpoint.save('http', 4, PRODUCTS)
+
+    now = scrape_checkpoint.time.time()
+    monkeypatch.setattr(scrape_checkpoint.time, 'time', lambda: now + 61)
+    assert ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器', ttl_seconds=60).next_page == 1
+
+    with open(checkpoint.path, 'w', encoding='utf-8') as f:
+        f.write('{broken')
+    assert ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器', ttl_seconds=None).products == []
+
+
+def test_clear_removes_file(tmp_path):
+    checkpoint = ScrapeCheckpoint(str(tmp_path), 'momo', '吸塵器')
+    checkpoint.save('http', 2, PRODUCTS)
+
+    checkpoint.clear()
+
+    assert not os.path.exists(checkpoint.path)
+    assert checkpoint.products == [] and checkpoint.next_page == 1
+    checkpoint.clear()
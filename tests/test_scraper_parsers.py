@@ -0,0 +1,57 @@
+import json
+import os
+
+from conftest import FIXTURES_DIR
+from product_scraper import parse_momo_listing_html, parse_pchome_search_json
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_parse_momo_listing_html():
+    count, products = parse_momo_listing_html(read_fixture('momo_listing.html'))
+
+    # 三張商品卡片，沒有價格的那一張被略過；價格區間取第一個價格元素
+    assert count == 3
+    assert [(p['sku'], p['title'], p['price'], p['url']) for p in products] == [
+        ('10203040', '【dyson 戴森】V8 SV25 Origin 無線吸塵器', 9900,
+         'https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=10203040&str_category_code=2000000000'),
+        ('55667788', '【Panasonic 國際牌】MC-A10 手持吸塵器', 2490,
+         'https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=55667788'),
+    ]
+    assert products[0]['image_url'] == 'https://i1.momoshop.com.tw/1700000000/goodsimg/0010/203/040/10203040_R.webp'
+    assert products[1]['image_url'] == 'https://i2.momoshop.com.tw/goodsimg/55667788_R.webp'
+
+
+def test_parse_momo_listing_html_empty():
+    assert parse_momo_listing_html(read_fixture('momo_listing_empty.html')) == (0, [])
+    assert parse_momo_listing_html('') == (0, [])
+
+
+def test_parse_pchome_search_json():
+    total_pages, products = parse_pchome_search_json(json.loads(read_fixture('pchome_search.json')))
+
+    assert total_pages == 5
+    # 商品 Id 的規格後綴被去掉，沒有價格的商品被略過
+    assert [(p['sku'], p['title'], p['price'], p['url']) for p in products] == [
+        ('DMAY1R-A900GZ3VA', 'Dyson V8 SV25 Origin 無線吸塵器', 9900, 'https://24h.pchome.com.tw/prod/DMAY1R-A900GZ3VA'),
+        ('DEAJ8Q-A900FBCX1', 'Panasonic 國際牌 MC-A10 手持吸塵器', 2590, 'https://24h.pchome.com.tw/prod/DEAJ8Q-A900FBCX1'),
+    ]
+    assert products[0]['image_url'] == 'https://img.pchome.com.tw/cs/items/DMAY1RA900GZ3VA/000001_1700000000.jpg'
+    assert products[1]['image_url'] == 'https://img.pchome.com.tw/cs/items/DEAJ8QA900FBCX1/000002.jpg'
+
+
+def test_parse_pchome_search_json_lowercase_fields():
+    payload = {'totalPage': 2, 'prods': [{'id': 'DYAJ01-1900ABCDE-000', 'name': '羅技 MX Master 3S', 'price': 3290}]}
+
+    total_pages, products = parse_pchome_search_json(payload)
+
+    assert total_pages == 2
+    assert [(p['sku'], p['title'], p['price']) for p in products] == [('DYAJ01-1900ABCDE', '羅技 MX Master 3S', 3290)]
+
+
+def test_parse_pchome_search_json_empty():
+    assert parse_pchome_search_json(json.loads(read_fixture('pchome_search_empty.json'))) == (0, [])
+    assert parse_pchome_search_json({}) == (0, [])
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from title_blocking import TitleBlockIndex, blocking_recall, extract_title_tokens
+
+
+@pytest.mark.parametrize('title, brands, models, capacities', [
+    ('【dyson 戴森】V8 SV25 強勁無線吸塵器', {'dyson'}, {'v8', 'sv25'}, set()),
+    ('Dyson SV-25 吸塵器', {'dyson'}, {'sv25'}, set()),
+    ('【羅技】Logitech MX Master 3S 無線滑鼠', {'logitech'}, {'3s'}, set()),
+    ('Panasonic 國際牌 NC-EG3000 1.5公升 電熱水瓶', {'panasonic'}, {'eg3000'}, {'1.5l'}),
+    ('ＳＡＮＤＩＳＫ 128GB 記憶卡 2入', set(), set(), {'128gb'}),
+    ('象印 500ml 保溫杯', {'zojirushi'}, set(), {'500ml'}),
+    ('LGBT 彩虹旗', set(), set(), set()),
+])
+def test_extract_title_tokens(title, brands, models, capacities):
+    tokens = extract_title_tokens(title)
+
+    assert tokens == {'brands': brands, 'models': models, 'capacities': capacities}
+
+
+def test_capacity_units_are_normalized():
+    assert extract_title_tokens('2000cc 水壺')['capacities'] == {'2000ml'}
+    assert extract_title_tokens('1.50 L 水壺')['capacities'] == {'1.5l'}
+
+
+def test_block_index_candidates_and_sync():
+    index = TitleBlockIndex()
+    index.sync(pd.DataFrame({'id': [1, 2, 3, 4], 'title': [
+        'Dyson V8 SV25 吸塵器', 'Dyson V10 SV12 吸塵器', '戴森 V8 500ml 配件', 'Philips 飛利浦 HD9252 氣炸鍋',
+    ]}))
+
+    # 品牌相同且至少一個型號相同
+    assert index.candidates('【dyson 戴森】V8 SV25')[0] == {1, 3}
+    assert index.candidates('Dyson SV-12')[0] == {2}
+    # 容量明確不同的商品被排除，沒有寫容量的商品保留
+    assert index.candidates('戴森 V8 1000ml')[0] == {1}
+    # 沒有符合的型號時保留品牌區塊
+    assert index.candidates('Philips 飛利浦 HD9999')[0] == {4}
+    assert index.candidates('無品牌 手持 吸塵器')[0] is None
+
+    # 標題改變的商品重建索引，已不在目錄中的商品被移除
+    assert index.sync(pd.DataFrame({'id': [1, 2], 'title': ['Dyson V8 SV25 吸塵器', 'Dyson V8 SV10 吸塵器']})) == 1
+    assert len(index) == 2
+    assert index.candidates('Dyson V8')[0] == {1, 2}
+
+
+def test_blocking_recall_counts_hits_outside_the_block_and_fallbacks():
+    catalog_ids = np.array([1, 2, 3])
+    index = TitleBlockIndex()
+    index.sync(pd.DataFrame({'id': catalog_ids, 'title': ['Dyson V8 吸塵器', 'Dyson V10 吸塵器', '無品牌 吸塵器']}))
+    catalog = np.eye(3, dtype=np.float32)
+    queries = np.array([
+        [0.8, 0.0, 0.6],   # 區塊 {1}：找回 1，漏掉區塊外的 3
+        [0.0, 0.0, 1.0],   # 區塊 {2} 內沒有超過門檻的商品，改搜尋整個目錄
+        [0.0, 1.0, 0.0],   # 無法分區，直接搜尋整個目錄
+    ], dtype=np.float32)
+
+    r = blocking_recall(index, ['Dyson V8', 'Dyson V10', '手持吸塵器'], queries, catalog_ids, catalog, threshold=0.5)
+
+    assert r['expected'] == 4
+    assert r['recall'] == pytest.approx(3 / 4)
+    assert r['blocked'] == pytest.approx(2 / 3)
+    assert r['block_size'] == 1.0
+    assert r['fallback'] == pytest.approx(1 / 3)
@@ -0,0 +1,46 @@
+import verdict_cache
+from verdict_cache import VerdictCache, hash_prompt
+
+VERDICT = {'is_match': True, 'confidence': 'high', 'reasoning': '品牌型號相同'}
+
+
+def test_get_normalizes_titles(tmp_path):
+    cache = VerdictCache(str(tmp_path / 'verdicts.sqlite'))
+    cache.put('gemini', 'p1', 'Dyson  V8', 'ＤＹＳＯＮ V8 SV25', VERDICT)
+
+    assert cache.get('gemini', 'p1', 'dyson v8', 'dyson v8 sv25') == VERDICT
+    assert cache.get('other-model', 'p1', 'Dyson V8', 'DYSON V8 SV25') is None
+
+
+def test_ttl_expires_verdicts(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(verdict_cache.time, 'time', lambda: now[0])
+    cache = VerdictCache(str(tmp_path / 'verdicts.sqlite'), ttl_seconds=60)
+    cache.put('gemini', 'p1', 'A', 'B', VERDICT)
+
+    now[0] += 59
+    assert cache.get('gemini', 'p1', 'A', 'B') == VERDICT
+    now[0] += 2
+    assert cache.get('gemini', 'p1', 'A', 'B') is None
+    assert cache.purge_expired() == 1
+    assert len(cache) == 0
+
+
+def test_prompt_hash_change_invalidates_verdicts(tmp_path):
+    old_hash, new_hash = hash_prompt('舊的 prompt {momo_title}'), hash_prompt('新的 prompt {momo_title}')
+    assert old_hash != new_hash
+    cache = VerdictCache(str(tmp_path / 'verdicts.sqlite'))
+    cache.put('gemini', old_hash, 'A', 'B', VERDICT)
+    cache.put('gemini', new_hash, 'A', 'C', VERDICT)
+
+    assert cache.get('gemini', new_hash, 'A', 'B') is None
+    assert cache.invalidate_other_prompts(new_hash) == 1
+    assert cache.get('gemini', old_hash, 'A', 'B') is None
+    assert cache.get('gemini', new_hash, 'A', 'C') == VERDICT
+
+
+def test_verdicts_persist_across_connections(tmp_path):
+    path = str(tmp_path / 'verdicts.sqlite')
+    VerdictCache(path).put('gemini', 'p1', 'A', 'B', VERDICT)
+
+    assert VerdictCache(path).get('gemini', 'p1', 'A', 'B') == VERDICT
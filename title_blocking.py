@@ -0,0 +1,320 @@
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+
+# 標準品牌名稱 -> 標題中可能出現的別名（中文名稱、其他拼法）
+BRAND_ALIASES = {
+    'dyson': ('戴森',),
+    'logitech': ('羅技', 'logi'),
+    'panasonic': ('國際牌', '松下'),
+    'philips': ('飛利浦',),
+    'sony': ('索尼',),
+    'samsung': ('三星',),
+    'apple': ('蘋果',),
+    'asus': ('華碩',),
+    'acer': ('宏碁', '宏基'),
+    'lg': ('樂金',),
+    'hitachi': ('日立',),
+    'sharp': ('夏普',),
+    'toshiba': ('東芝',),
+    'tatung': ('大同',),
+    'sampo': ('聲寶',),
+    'tefal': ('特福',),
+    'tiger': ('虎牌',),
+    'zojirushi': ('象印',),
+    'xiaomi': ('小米',),
+    'braun': ('百靈',),
+    'electrolux': ('伊萊克斯',),
+    'delonghi': ('迪朗奇', "de'longhi"),
+    'irobot': (),
+    'coway': (),
+    'kinyo': ('耐嘉',),
+}
+
+# 容量 / 規格單位 -> 統一寫法
+_CAPACITY_UNITS = {
+    'ml': 'ml', 'cc': 'ml', 'l': 'l', '公升': 'l', '升': 'l',
+    'mb': 'mb', 'gb': 'gb', 'tb': 'tb', 'mah': 'mah',
+    'w': 'w', '瓦': 'w', 'kg': 'kg', '公斤': 'kg', 'g': 'g', '克': 'g',
+    'inch': '吋', '吋': '吋', '寸': '吋',
+}
+_CAPACITY_PATTERN = re.compile(
+    r'(?<![a-z0-9.])(\d+(?:\.\d+)?)\s*('
+    + '|'.join(sorted(map(re.escape, _CAPACITY_UNITS), key=len, reverse=True))
+    + r')(?![a-z])'
+)
+# 同時有英文字母與數字的詞視為型號（例如 sv25、hp10）；字母與數字之間的連字號先去掉，SV-25 與 SV25 視為相同
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+_HYPHEN_PATTERN = re.compile(r'(?<=[a-z])[-_](?=\d)|(?<=\d)[-_](?=[a-z])')
+_NOT_MODEL_PATTERN = re.compile(r'\d+in\d+|\d+(?:ml|cc|l|mb|gb|tb|mah|w|kg|g|inch|hz|mm|cm|m|v|k|p|x|入|件)')
+
+
+def normalize_title(title):
+    """全形轉半形、轉小寫並移除商標符號"""
+    text = unicodedata.normalize('NFKC', str(title)).lower()
+    return re.sub(r'[™®©]', ' ', text)
+
+
+def _build_brand_pattern(brand_aliases):
+    lookup = {}
+    for brand, aliases in brand_aliases.items():
+        for alias in (brand, *aliases):
+            lookup[normalize_title(alias)] = brand
+    # 英文別名需要完整的詞（避免 lg 比對到 lgbt），中文別名直接比對子字串
+    parts = [
+        re.escape(alias) if not alias.isascii() else rf'(?<![a-z0-9]){re.escape(alias)}(?![a-z0-9])'
+        for alias in sorted(lookup, key=len, reverse=True)
+    ]
+    return re.compile('|'.join(parts)), lookup
+
+
+def extract_title_tokens(title, brand_pattern=None):
+    """
+    從商品標題取出品牌、型號與容量
+
+    例如「【dyson 戴森】V8 SV25 強勁無線吸塵器」-> 品牌 {dyson}、型號 {v8, sv25}。
+
+    Args:
+        title (str): 商品標題
+        brand_pattern (tuple): _build_brand_pattern 的結果，None 表示使用 BRAND_ALIASES
+
+    Returns:
+        dict: {'brands': set, 'models': set, 'capacities': set}
+    """
+    pattern, lookup = brand_pattern or _DEFAULT_BRAND_PATTERN
+    text = normalize_title(title)
+
+    brands = {lookup[m.group(0)] for m in pattern.finditer(text)}
+    capacities = set()
+    for number, unit in _CAPACITY_PATTERN.findall(text):
+        number = number.rstrip('0').rstrip('.') if '.' in number else number
+        capacities.add(number + _CAPACITY_UNITS[unit])
+
+    models = set()
+    for word in _WORD_PATTERN.findall(_HYPHEN_PATTERN.sub('', text)):
+        if (len(word) >= 2 and not word.isdigit() and not word.isalpha()
+                and not _NOT_MODEL_PATTERN.fullmatch(word)):
+            models.add(word)
+    return {'brands': brands, 'models': models, 'capacities': capacities}
+
+
+_DEFAULT_BRAND_PATTERN = _build_brand_pattern(BRAND_ALIASES)
+
+
+class TitleBlockIndex:
+    """
+    品牌 / 型號 / 容量 -> PChome 商品 id 的倒排索引，用來在計算向量之前縮小候選範圍
+
+    候選區塊依序收斂，任何一步沒有符合的商品時保留上一步的結果：
+        1. 品牌相同的商品
+        2. 其中至少有一個型號相同的商品
+        3. 去掉容量明確不同的商品（標題沒有寫容量的商品保留）
+    查詢標題沒有任何可用的品牌與型號時回傳 None，由呼叫端搜尋整個目錄。
+    """
+
+    def __init__(self, brand_aliases=None):
+        """
+        Args:
+            brand_aliases (dict): 額外的品牌別名，與 BRAND_ALIASES 合併
+        """
+        self._brand_pattern = (
+            _build_brand_pattern({**BRAND_ALIASES, **brand_aliases}) if brand_aliases else _DEFAULT_BRAND_PATTERN
+        )
+        self._lock = threading.Lock()
+        self._titles = {}      # id -> 建立索引時的標題
+        self._tokens = {}      # id -> extract_title_tokens 的結果
+        self._postings = defaultdict(set)  # ('brand' | 'model', 詞) -> id
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _add(self, row_id, title):
+        tokens = extract_title_tokens(title, self._brand_pattern)
+        self._titles[row_id] = title
+        self._tokens[row_id] = tokens
+        for brand in tokens['brands']:
+            self._postings[('brand', brand)].add(row_id)
+        for model in tokens['models']:
+            self._postings[('model', model)].add(row_id)
+
+    def _remove(self, row_id):
+        tokens = self._tokens.pop(row_id)
+        del self._titles[row_id]
+        for kind, words in (('brand', tokens['brands']), ('model', tokens['models'])):
+            for word in words:
+                posting = self._postings[(kind, word)]
+                posting.discard(row_id)
+                if not posting:
+                    del self._postings[(kind, word)]
+
+    def sync(self, df):
+        """
+        讓索引與目錄一致：加入新商品、重建標題有變動的商品、移除已不存在的商品
+
+        Args:
+            df (pd.DataFrame): PChome 目錄（需有 id、title 欄位）
+
+        Returns:
+            int: 重新建立索引的商品數
+        """
+        ids = df['id'].astype(int).tolist()
+        titles = df['title'].astype(str).tolist()
+        with self._lock:
+            changed = [(i, t) for i, t in zip(ids, titles) if self._titles.get(i) != t]
+            for row_id, title in changed:
+                if row_id in self._titles:
+                    self._remove(row_id)
+                self._add(row_id, title)
+            if len(self._titles) > len(ids):
+                for row_id in set(self._titles) - set(ids):
+                    self._remove(row_id)
+        if changed:
+            print(f"品牌 / 型號索引更新 {len(changed)} 筆，目前共 {len(self._titles)} 筆")
+        return len(changed)
+
+    def candidates(self, title):
+        """
+        找出可能與標題相同的 PChome 商品
+
+        Returns:
+            tuple: (id 集合或 None, 查詢標題取出的詞)；None 表示無法分區，需搜尋整個目錄
+        """
+        tokens = extract_title_tokens(title, self._brand_pattern)
+        with self._lock:
+            block = None
+            brand_ids = set().union(*(self._postings.get(('brand', b), ()) for b in tokens['brands']))
+            if brand_ids:
+                block = brand_ids
+
+            model_ids = set().union(*(self._postings.get(('model', m), ()) for m in tokens['models']))
+            if block is not None:
+                model_ids &= block
+            if model_ids:
+                block = model_ids
+
+            if block is not None and tokens['capacities']:
+                compatible = {
+                    row_id for row_id in block
+                    if not self._tokens[row_id]['capacities'] or self._tokens[row_id]['capacities'] & tokens['capacities']
+                }
+                if compatible:
+                    block = compatible
+        return block, tokens
+
+
+def _top_hits(ids, scores, top_k, threshold):
+    """相似度不低於門檻的前 top_k 筆 id"""
+    keep = np.flatnonzero(scores >= threshold) if threshold is not None else np.arange(len(scores))
+    top = keep[np.argsort(-scores[keep], kind='stable')[:top_k]]
+    return set(ids[top].tolist())
+
+
+def blocking_recall(block_index, momo_titles, queries, catalog_ids, catalog, top_k=50, threshold=None):
+    """
+    比較分區與精確搜尋整個目錄的第一階段結果
+
+    與 matcher_app 相同：標題無法分區，或區塊內沒有超過門檻的商品時，改為搜尋整個目錄。
+
+    Args:
+        block_index (TitleBlockIndex): 已同步 PChome 目錄的倒排索引
+        momo_titles (list): MOMO 商品標題
+        queries (np.ndarray): 對應的已正規化 MOMO 向量 (N x dim)
+        catalog_ids (np.ndarray): PChome 商品 id
+        catalog (np.ndarray): 對應的已正規化 PChome 向量
+
+    Returns:
+        dict: recall（精確搜尋的結果中被找回的比例）、可分區的查詢比例、平均區塊大小，
+              以及分區後仍需搜尋整個目錄的查詢比例
+    """
+    catalog_ids = np.asarray(catalog_ids, dtype=np.int64)
+    row_of = {row_id: row for row, row_id in enumerate(catalog_ids.tolist())}
+    found = expected = blocked = fallback = block_size = 0
+    for title, query in zip(momo_titles, queries):
+        scores = catalog @ query
+        exact = _top_hits(catalog_ids, scores, top_k, threshold)
+        block, _ = block_index.candidates(title)
+        hits = set()
+        if block is not None:
+            blocked += 1
+            block_size += len(block)
+            rows = np.array([row_of[row_id] for row_id in block if row_id in row_of], dtype=np.int64)
+            hits = _top_hits(catalog_ids[rows], scores[rows], top_k, threshold)
+            fallback += not hits
+        if not hits:
+            hits = exact
+        found += len(exact & hits)
+        expected += len(exact)
+
+    n = max(len(momo_titles), 1)
+    return {
+        'queries': len(momo_titles),
+        'expected': expected,
+        'recall': found / expected if expected else 1.0,
+        'blocked': blocked / n,
+        'block_size': block_size / blocked if blocked else 0.0,
+        'fallback': fallback / n,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from ann_index import normalize_rows
+    from catalog_store import read_catalog_csv
+    from embedding_backend import MODEL_BACKENDS, backend_model_id, load_sentence_transformer
+    from embedding_cache import EmbeddingCache, local_model_id
+
+    parser = argparse.ArgumentParser(description="比較品牌 / 型號分區與精確搜尋整個目錄的第一階段結果（recall）")
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', os.path.join("models", "models20-multilingual-e5-large_fold_1")),
+                        help="本地模型路徑或 Hugging Face 模型名稱")
+    parser.add_argument('--backend', choices=MODEL_BACKENDS, default=os.getenv('MODEL_BACKEND', 'torch').lower())
+    parser.add_argument('--momo', default='momo.csv', help="MOMO CSV 路徑（查詢）")
+    parser.add_argument('--pchome', default='pchome.csv', help="PChome CSV 路徑（被搜尋的目錄）")
+    parser.add_argument('--cache', default=os.getenv('EMBEDDING_CACHE_PATH', os.path.join("cache", "embeddings.sqlite")),
+                        help="向量快取路徑（與 matcher_app 共用，已編碼過的標題不需重新推論）")
+    parser.add_argument('--top-k', type=int, default=int(os.getenv('ANN_TOP_K', '50')))
+    parser.add_argument('--threshold', type=float, default=0.739465, help="與 matcher_app 相同的相似度門檻")
+    args = parser.parse_args()
+
+    momo_titles = [t for t in read_catalog_csv(args.momo)['title'].tolist() if t]
+    pchome_df = read_catalog_csv(args.pchome)
+    pchome_df = pchome_df[pchome_df['title'] != '']
+    if not momo_titles or pchome_df.empty:
+        parser.error("CSV 中沒有任何標題")
+
+    source_id = local_model_id(args.model) if os.path.exists(args.model) else f"hf:{args.model}"
+    model_id = backend_model_id(source_id, args.backend)
+    cache = EmbeddingCache(args.cache)
+    model = None
+
+    def encode(texts):
+        # 與 matcher_app.get_batch_embeddings 相同：先查向量快取，只編碼未命中的文字
+        global model
+        vectors = cache.get_many(model_id, texts)
+        missing = [text for i, text in enumerate(texts) if i not in vectors]
+        if missing:
+            if model is None:
+                model = load_sentence_transformer(args.model, args.backend)
+            encoded = np.asarray(model.encode(missing, convert_to_numpy=True), dtype=np.float32)
+            cache.put_many(model_id, missing, encoded)
+            encoded = dict(zip(missing, encoded))
+            for i, text in enumerate(texts):
+                if i not in vectors:
+                    vectors[i] = encoded[text]
+        return normalize_rows(np.stack([vectors[i] for i in range(len(texts))]))
+
+    queries = encode(["query: " + t for t in momo_titles])
+    catalog = encode(["passage: " + t for t in pchome_df['title'].tolist()])
+    block_index = TitleBlockIndex()
+    block_index.sync(pchome_df)
+
+    r = blocking_recall(block_index, momo_titles, queries, pchome_df['id'].to_numpy(), catalog,
+                        args.top_k, args.threshold)
+    print(f"查詢 {r['queries']} 筆 MOMO 標題，目錄 {len(catalog)} 筆 PChome 標題（門檻 {args.threshold}）")
+    print(f"分區 recall {r['recall']:.2%}（精確搜尋共 {r['expected']} 筆），可分區的查詢 {r['blocked']:.2%}，"
+          f"平均區塊 {r['block_size']:.1f} 件，區塊內沒有超過門檻、改搜尋整個目錄的查詢 {r['fallback']:.2%}")
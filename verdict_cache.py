@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize_title(title):
+    """正規化商品標題：全形轉半形、轉小寫、合併空白"""
+    title = unicodedata.normalize('NFKC', str(title)).lower()
+    return re.sub(r'\s+', ' ', title).strip()
+
+
+def hash_prompt(template):
+    """計算 prompt 模板的雜湊，模板一改變，舊的判斷就不再命中"""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+
+class VerdictCache:
+    """
+    持久化的 Gemini 判斷快取（SQLite）
+
+    以 (模型名稱, prompt 模板雜湊, 正規化後的標題組合) 為鍵，
+    已判斷過的商品組合重新開啟時不需要再呼叫 LLM。
+    """
+
+    def __init__(self, db_path, ttl_seconds=30 * 24 * 3600):
+        """
+        Args:
+            db_path (str): SQLite 檔案路徑
+            ttl_seconds (float): 判斷結果的有效期限（秒），None 表示永久有效
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                momo_title TEXT NOT NULL,
+                pchome_title TEXT NOT NULL,
+                verdict TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_prompt ON verdicts (model, prompt_hash)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, prompt_hash, momo_title, pchome_title):
+        pair = normalize_title(momo_title) + '\x1f' + normalize_title(pchome_title)
+        return hashlib.sha256(f"{model}\x1f{prompt_hash}\x1f{pair}".encode('utf-8')).hexdigest()
+
+    def get(self, model, prompt_hash, momo_title, pchome_title):
+        """
+        查詢快取的判斷結果
+
+        Returns:
+            dict | None: 判斷結果；不存在或已過期時回傳 None
+        """
+        key = self.make_key(model, prompt_hash, momo_title, pchome_title)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verdict, created_at FROM verdicts WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        verdict, created_at = row
+        if self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds:
+            return None
+        return json.loads(verdict)
+
+    def put(self, model, prompt_hash, momo_title, pchome_title, verdict):
+        """寫入判斷結果（只應寫入成功解析的結果，API 錯誤不要快取）"""
+        key = self.make_key(model, prompt_hash, momo_title, pchome_title)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts "
+                "(cache_key, model, prompt_hash, momo_title, pchome_title, verdict, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_hash, str(momo_title), str(pchome_title),
+                 json.dumps(verdict, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def invalidate_other_prompts(self, prompt_hash):
+        """
+        刪除由其他版本 prompt 產生的判斷
+
+        Returns:
+            int: 刪除的筆數
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM verdicts WHERE prompt_hash != ?", (prompt_hash,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def purge_expired(self):
+        """刪除過期的判斷，回傳刪除筆數"""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def clear(self):
+        """清空所有判斷"""
+        with self._lock:
+            self._conn.execute("DELETE FROM verdicts")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
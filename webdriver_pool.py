@@ -0,0 +1,221 @@
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # psutil 為選用套件，沒有時改讀 /proc（僅限 Linux）
+    psutil = None
+
+
+def _proc_rss_mb(pid):
+    """讀取 /proc/<pid>/status 的 VmRSS（MB）"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+def process_tree_rss_mb(pid):
+    """
+    計算某個程序及其所有子程序的常駐記憶體（MB）
+
+    chromedriver 會啟動 Chrome 主程序與多個 renderer，需一併計算。
+    無法取得時回傳 0。
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes if p.is_running()) / (1024 * 1024)
+        except psutil.Error:
+            return 0.0
+
+    if not os.path.isdir('/proc'):
+        return 0.0
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # 第 4 個欄位為父程序 id（程序名稱可能含空白，從最後一個 ')' 之後切）
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0.0, [pid]
+    while stack:
+        current = stack.pop()
+        total += _proc_rss_mb(current)
+        stack.extend(children.get(current, []))
+    return total
+
+
+class WebDriverPool:
+    """
+    保持溫熱的 headless Chrome 池
+
+    - acquire / release 取得與歸還瀏覽器，歸還時清除 cookie、storage 與多餘分頁
+    - 使用超過 max_pages 頁，或記憶體超過 max_rss_mb 時，關閉並在下次需要時重新建立
+    - 同時使用中的瀏覽器不超過 max_size 個
+    """
+
+    def __init__(self, factory, max_size=1, max_pages=50, max_rss_mb=1500, name="chrome"):
+        """
+        Args:
+            factory (function): 建立新 WebDriver 的函式
+            max_size (int): 池中最多同時存在的瀏覽器數
+            max_pages (int): 每個瀏覽器最多載入幾頁後回收
+            max_rss_mb (float): 瀏覽器程序樹記憶體上限（MB），0 表示不檢查
+            name (str): 用於日誌的名稱
+        """
+        self.factory = factory
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.name = name
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []
+        self._pages = {}  # id(driver) -> 已載入頁數
+        self._closed = False
+
+    def acquire(self):
+        """取得一個瀏覽器；池中沒有閒置的瀏覽器時建立新的（達到上限時等待）"""
+        self._slots.acquire()
+        try:
+            with self._lock:
+                driver = self._idle.pop() if self._idle else None
+            if driver is None:
+                print(f"[{self.name}] 啟動新的瀏覽器")
+                driver = self.factory()
+                with self._lock:
+                    self._pages[id(driver)] = 0
+            return driver
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, healthy=True):
+        """
+        歸還瀏覽器
+
+        Args:
+            driver: acquire 取得的 WebDriver
+            healthy (bool): 工作是否正常結束；發生錯誤的瀏覽器直接關閉
+        """
+        try:
+            reason = None
+            if self._closed:
+                reason = "池已關閉"
+            elif not healthy:
+                reason = "工作發生錯誤"
+            elif self._pages.get(id(driver), 0) >= self.max_pages:
+                reason = f"已載入 {self._pages.get(id(driver), 0)} 頁"
+            elif self.max_rss_mb and self._driver_rss_mb(driver) > self.max_rss_mb:
+                reason = f"記憶體超過 {self.max_rss_mb} MB"
+
+            if reason is None:
+                try:
+                    self._reset(driver)
+                except Exception as e:
+                    reason = f"重設狀態失敗: {e}"
+
+            if reason is None:
+                with self._lock:
+                    self._idle.append(driver)
+            else:
+                print(f"[{self.name}] 回收瀏覽器（{reason}）")
+                self._quit(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        """以 with 語法取得瀏覽器，區塊內拋出例外時視為不健康並回收"""
+        driver = self.acquire()
+        healthy = False
+        try:
+            yield driver
+            healthy = True
+        finally:
+            self.release(driver, healthy=healthy)
+
+    def note_page(self, driver):
+        """記錄瀏覽器載入了一頁，供回收判斷使用"""
+        with self._lock:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+
+    def warm_up(self, count=1):
+        """預先啟動瀏覽器放入池中，讓第一次搜尋也不需等待啟動"""
+        drivers = [self.acquire() for _ in range(min(count, self.max_size))]
+        for driver in drivers:
+            self.release(driver)
+
+    def shutdown(self):
+        """關閉所有閒置的瀏覽器"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._quit(driver)
+
+    def _reset(self, driver):
+        """清除上一個工作留下的狀態"""
+        # 關閉多餘的分頁
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        # 清除目前網域的 storage，再透過 DevTools 清除所有網域的 cookie
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception:
+            pass
+        try:
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        except Exception:
+            driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def _driver_rss_mb(self, driver):
+        try:
+            return process_tree_rss_mb(driver.service.process.pid)
+        except Exception:
+            return 0.0
+
+    def _quit(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, factory, **kwargs):
+    """取得（或建立）指定名稱的共用瀏覽器池；程式結束時自動關閉"""
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = WebDriverPool(factory, name=name, **kwargs)
+        return _pools[name]
+
+
+@atexit.register
+def shutdown_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.shutdown()